@@ -26,6 +26,9 @@ import sglib
 import xmlobject
 import types
 import uuid
+import threading
+import time
+import json
 import os.path
 import sys
 import os
@@ -42,53 +45,142 @@ class IPSet(object):
     def __init__(self, setname, ips):
         self.ips = ips
         self.name = setname
-    
+        self.tmpname = str(uuid.uuid4()).replace('-', '')[0:30]
+
+    def restore_lines(self):
+        # fill a temporary set and swap it in, so the set never appears half loaded
+        maxelem = max(65536, len(self.ips))
+        lines = ['create %s %s maxelem %d' % (self.tmpname, self.IPSET_TYPE, maxelem)]
+        lines += ['add %s %s -exist' % (self.tmpname, ip) for ip in self.ips]
+        lines.append('create %s %s maxelem %d -exist' % (self.name, self.IPSET_TYPE, maxelem))
+        lines.append('swap %s %s' % (self.tmpname, self.name))
+        lines.append('destroy %s' % self.tmpname)
+        return lines
+
     def create(self):
-        tmpname = str(uuid.uuid4()).replace('-', '')[0:30]
-        sglib.ShellCmd('ipset -N %s %s' % (tmpname, self.IPSET_TYPE))()
+        IPSet.create_sets([self])
+
+    @staticmethod
+    def restore(lines):
+        if lines:
+            sglib.ShellCmd('ipset restore')(stdin_data='\n'.join(lines) + '\n')
+
+    @staticmethod
+    def create_sets(ipsets):
+        lines = []
+        for s in ipsets:
+            lines += s.restore_lines()
         try:
-            for ip in self.ips:
-                sglib.ShellCmd('ipset -A %s %s' % (tmpname, ip))()
-            
-            try:
-                sglib.ShellCmd('ipset -N %s %s' % (self.name, self.IPSET_TYPE))()
-                cherrypy.log('created new ipset: %s' % self.name)
-            except Exception:
-                cherrypy.log('%s already exists, no need to create new' % self.name)
-        finally:
-            sglib.ShellCmd('ipset -W %s %s' % (tmpname, self.name))()
-            sglib.ShellCmd('ipset -F %s' % tmpname)()
-            sglib.ShellCmd('ipset -X %s' % tmpname)()
-            
-    @staticmethod 
-    def destroy_sets(sets_to_keep):
-        sets = sglib.ShellCmd('ipset list')()
-        for s in sets.split('\n'):
-            if 'Name:' in s:
-                set_name = s.split(':', 1)[1].strip()
-                if not set_name in sets_to_keep:
-                    sglib.ShellCmd('ipset destroy %s' % set_name)()
-                    cherrypy.log('destroyed unused ipset: %s' % set_name)
-        
+            IPSet.restore(lines)
+        except Exception:
+            # ipset restore stops at the first failing line, drop the temporary sets it left behind
+            for s in ipsets:
+                sglib.ShellCmd('ipset destroy %s' % s.tmpname)(is_exception=False)
+            raise
+
+    @staticmethod
+    def list_names():
+        return sglib.ShellCmd('ipset list -n')().split()
+
+    @staticmethod
+    def destroy_sets(set_names):
+        IPSet.restore(['destroy %s' % name for name in set_names])
+        for name in set_names:
+            cherrypy.log('destroyed unused ipset: %s' % name)
+
+class IptablesBatch(object):
+    '''collects the chains and rules of the filter table and commits them with a single iptables-restore call'''
+    def __init__(self):
+        self.chains = []
+        self.rules = []
+
+    def chain(self, name):
+        # a declared chain is created, or flushed if it already exists, when the batch is committed
+        if name not in self.chains:
+            self.chains.append(name)
+
+    def add(self, rule):
+        self.rules.append(' '.join(rule))
+
+    def dump(self):
+        lines = ['*filter']
+        lines += [':%s - [0:0]' % c for c in self.chains]
+        lines += self.rules
+        lines.append('COMMIT')
+        return '\n'.join(lines) + '\n'
+
+    def commit(self):
+        sglib.ShellCmd('iptables-restore --noflush')(stdin_data=self.dump())
+
+class SGRuleset(object):
+    def __init__(self):
+        self.vm_name = None
+        self.vm_id = None
+        self.signature = None
+        self.sequence_number = None
+        self.ingress_rules = []
+        self.egress_rules = []
+        self.queued_at = None
+        self.error = None
+        # the newer ruleset of the same vm which was applied instead of this one
+        self.superseded_by = None
+        self.done = threading.Event()
+
+    def finish(self, error=None, superseded_by=None):
+        self.error = error
+        self.superseded_by = superseded_by
+        self.done.set()
+
+class LatencyStat(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        avg = 0.0
+        if self.count:
+            avg = self.total / self.count
+        return {'count': self.count, 'last': self.last, 'avg': avg, 'max': self.max}
+
 class SGAgent(object):
+    # rulesets of at most this many vms are programmed by one ipset restore/iptables-restore pair
+    MAX_BATCH_SIZE = 64
+    # seconds a set_rules request waits for its ruleset to be applied
+    APPLY_TIMEOUT = 600
+
     def __init__(self):
-        pass
+        self.cond = threading.Condition()
+        # vm id -> newest ruleset not yet picked up by the worker
+        self.pending = {}
+        self.applying = 0
+        self.worker = None
+        # vm id -> (signature, sequence number, ipset names) of the last rules applied, only used by the worker
+        self.applied = {}
+        self.counters = {'received': 0, 'coalesced': 0, 'skipped': 0, 'applied': 0, 'failed': 0, 'batches': 0}
+        self.batch_latency = LatencyStat()
+        self.apply_latency = LatencyStat()
     
     def _self_list(self, obj):
         if isinstance(obj, types.ListType):
             return obj
         else:
             return [obj]
-        
-    def set_rules(self, req):
-        body = req.body
+
+    def _parse_ruleset(self, body):
         doc = xmlobject.loads(body)
-        vm_name = doc.vmName.text_
-        vm_id = doc.vmId.text_
-        vm_ip = doc.vmIp.text_
-        vm_mac = doc.vmMac.text_
-        sig = doc.signature.text_
-        seq = doc.sequenceNumber.text_
+        rs = SGRuleset()
+        rs.vm_name = doc.vmName.text_
+        rs.vm_id = doc.vmId.text_
+        rs.signature = doc.signature.text_
+        rs.sequence_number = long(doc.sequenceNumber.text_)
         
         def parse_rules(rules, lst):
             for i in self._self_list(rules):
@@ -101,74 +193,225 @@ class SGAgent(object):
                         r.allowed_ips.append(ip.text_)
                 lst.append(r)
             
-        i_rules = []
         if hasattr(doc, 'ingressRules'):
-            parse_rules(doc.ingressRules, i_rules)
-            
-        e_rules = []
+            parse_rules(doc.ingressRules, rs.ingress_rules)
         if hasattr(doc, 'egressRules'):
-            parse_rules(doc.egressRules, e_rules)
-            
-        def create_chain(name):
-            try:
-                sglib.ShellCmd('iptables -F %s' % name)()
-            except Exception:
-                sglib.ShellCmd('iptables -N %s' % name)()
-            
-        def apply_rules(rules, chainname, direction, action, current_set_names):
-            create_chain(chainname)
-            for r in i_rules:
-                allow_any = False
-                if '0.0.0.0/0' in r.allowed_ips:
-                    allow_any = True
-                    r.allowed_ips.remove('0.0.0.0/0')
+            parse_rules(doc.egressRules, rs.egress_rules)
+        return rs
+
+    def _build_rules(self, rs, ipsets, batch):
+        def apply_rules(rules, chainname, direction, action):
+            batch.chain(chainname)
+            for r in rules:
+                # leave the queued ruleset untouched, it is built again if its batch has to be retried
+                allow_any = '0.0.0.0/0' in r.allowed_ips
+                ips = [ip for ip in r.allowed_ips if ip != '0.0.0.0/0']
                 
-                if r.allowed_ips:
+                if ips:
                     setname = '_'.join([chainname, r.protocol, r.start_port, r.end_port])
-                    ipset = IPSet(setname, r.allowed_ips)
-                    ipset.create()
-                    current_set_names.append(setname)
+                    ipsets.append(IPSet(setname, ips))
                     
                     if r.protocol == 'all':
-                        cmd = ['iptables -I', chainname, '-m state --state NEW -m set --set', setname, direction, '-j', action]
-                        sglib.ShellCmd(' '.join(cmd))()
+                        cmd = ['-A', chainname, '-m state --state NEW -m set --set', setname, direction, '-j', action]
+                        batch.add(cmd)
                     elif r.protocol != 'icmp':
                         port_range = ":".join([r.start_port, r.end_port])
-                        cmd = ['iptables', '-I', chainname, '-p', r.protocol, '-m', r.protocol, '--dport', port_range, '-m state --state NEW -m set --set', setname, direction, '-j', action]
-                        sglib.ShellCmd(' '.join(cmd))()
+                        cmd = ['-A', chainname, '-p', r.protocol, '-m', r.protocol, '--dport', port_range, '-m state --state NEW -m set --set', setname, direction, '-j', action]
+                        batch.add(cmd)
                     else:
                         port_range = "/".join([r.start_port, r.end_port])
                         if r.start_port == "-1":
                             port_range = "any"
-                        cmd = ['iptables', '-I', i_chain_name, '-p', 'icmp', '--icmp-type', port_range, '-m set --set', setname, direction, '-j', action]
-                        sglib.ShellCmd(' '.join(cmd))()
+                        cmd = ['-A', chainname, '-p', 'icmp', '--icmp-type', port_range, '-m set --set', setname, direction, '-j', action]
+                        batch.add(cmd)
                         
                     
                 if allow_any and r.protocol != 'all':
                     if r.protocol != 'icmp':
                         port_range = ":".join([r.start_port, r.end_port])
-                        cmd = ['iptables', '-I', chainname, '-p', r.protocol, '-m', r.protocol, '--dport', port_range, '-m', 'state', '--state', 'NEW', '-j', action]
-                        sglib.ShellCmd(' '.join(cmd))()
+                        cmd = ['-A', chainname, '-p', r.protocol, '-m', r.protocol, '--dport', port_range, '-m', 'state', '--state', 'NEW', '-j', action]
+                        batch.add(cmd)
                     else:
                         port_range = "/".join([r.start_port, r.end_port])
                         if r.start_port == "-1":
                             port_range = "any"
-                        cmd = ['iptables', '-I', i_chain_name, '-p', 'icmp', '--icmp-type', port_range, '-j', action]
-                        sglib.ShellCmd(' '.join(cmd))()
+                        cmd = ['-A', chainname, '-p', 'icmp', '--icmp-type', port_range, '-j', action]
+                        batch.add(cmd)
         
-        current_sets = []
-        i_chain_name = vm_name + '-in'
-        apply_rules(i_rules, i_chain_name, 'src', 'ACCEPT', current_sets)
-        e_chain_name = vm_name + '-eg'
-        apply_rules(e_rules, e_chain_name, 'dst', 'RETURN', current_sets)
+        i_chain_name = rs.vm_name + '-in'
+        apply_rules(rs.ingress_rules, i_chain_name, 'src', 'ACCEPT')
+        e_chain_name = rs.vm_name + '-eg'
+        apply_rules(rs.egress_rules, e_chain_name, 'dst', 'RETURN')
         
-        if e_rules:
-            sglib.ShellCmd('iptables -A %s -j RETURN' % e_chain_name)
+        # as on KVM: no egress rules lets all traffic out, otherwise only what the rules allow
+        if rs.egress_rules:
+            batch.add(['-A', e_chain_name, '-j', 'DROP'])
         else:
-            sglib.ShellCmd('iptables -A %s -j DROP' % e_chain_name)
+            batch.add(['-A', e_chain_name, '-j', 'RETURN'])
+        batch.add(['-A', i_chain_name, '-j', 'DROP'])
+
+    def _is_stale(self, rs):
+        last = self.applied.get(rs.vm_id)
+        if last and rs.sequence_number < last[1]:
+            cherrypy.log('skip rules of vm %s, sequence number %s is older than the applied %s' % (rs.vm_name, rs.sequence_number, last[1]))
+            return True
+        if last and rs.signature == last[0]:
+            cherrypy.log('skip rules of vm %s, signature %s is already applied' % (rs.vm_name, rs.signature))
+            self.applied[rs.vm_id] = (rs.signature, rs.sequence_number, last[2])
+            return True
+        return False
+
+    def _apply(self, rulesets):
+        ipsets = []
+        vm_sets = []
+        batch = IptablesBatch()
+        for rs in rulesets:
+            start = len(ipsets)
+            self._build_rules(rs, ipsets, batch)
+            vm_sets.append([s.name for s in ipsets[start:]])
+        
+        IPSet.create_sets(ipsets)
+        batch.commit()
+        
+        existing = None
+        unused = []
+        for rs, current_sets in zip(rulesets, vm_sets):
+            last = self.applied.get(rs.vm_id)
+            if last:
+                previous_sets = last[2]
+            else:
+                if existing is None:
+                    existing = IPSet.list_names()
+                prefixes = (rs.vm_name + '-in_', rs.vm_name + '-eg_')
+                previous_sets = [s for s in existing if s.startswith(prefixes)]
+            unused += [s for s in previous_sets if s not in current_sets]
+            self.applied[rs.vm_id] = (rs.signature, rs.sequence_number, current_sets)
+        try:
+            IPSet.destroy_sets(unused)
+        except Exception, e:
+            cherrypy.log('failed to destroy unused ipsets: %s' % e)
+
+    def _apply_batch(self, rulesets):
+        todo = []
+        for rs in rulesets:
+            if self._is_stale(rs):
+                self.counters['skipped'] += 1
+                rs.finish()
+            else:
+                todo.append(rs)
+        if not todo:
+            return
         
-        sglib.ShellCmd('iptables -A %s -j DROP' % i_chain_name)
-        IPSet.destroy_sets(current_sets)
+        try:
+            self._apply(todo)
+            failed = []
+        except Exception, e:
+            if len(todo) == 1:
+                failed = [(todo[0], e)]
+            else:
+                # do not let one broken ruleset hold back the other vms of the batch
+                cherrypy.log('failed to apply rules of %d vms in one batch, applying them one by one: %s' % (len(todo), e))
+                failed = []
+                for rs in todo:
+                    try:
+                        self._apply([rs])
+                    except Exception, e:
+                        failed.append((rs, e))
+        
+        now = time.time()
+        for rs in todo:
+            self.apply_latency.add(now - rs.queued_at)
+        errors = {}
+        for rs, e in failed:
+            cherrypy.log('failed to apply rules of vm %s: %s' % (rs.vm_name, e))
+            errors[rs.vm_id] = e
+        self.counters['failed'] += len(failed)
+        self.counters['applied'] += len(todo) - len(failed)
+        for rs in todo:
+            rs.finish(errors.get(rs.vm_id))
+
+    def _run(self):
+        while True:
+            self.cond.acquire()
+            try:
+                while not self.pending:
+                    self.cond.wait()
+                rulesets = sorted(self.pending.values(), key=lambda rs: rs.queued_at)[:self.MAX_BATCH_SIZE]
+                for rs in rulesets:
+                    del self.pending[rs.vm_id]
+                self.applying = len(rulesets)
+            finally:
+                self.cond.release()
+            
+            start = time.time()
+            try:
+                self._apply_batch(rulesets)
+            except Exception, e:
+                cherrypy.log('failed to apply rules: %s' % e)
+                for rs in rulesets:
+                    rs.finish(e)
+            self.batch_latency.add(time.time() - start)
+            
+            self.cond.acquire()
+            try:
+                self.counters['batches'] += 1
+                self.applying = 0
+            finally:
+                self.cond.release()
+
+    def _enqueue(self, rs):
+        rs.queued_at = time.time()
+        self.cond.acquire()
+        try:
+            self.counters['received'] += 1
+            queued = self.pending.get(rs.vm_id)
+            if queued and queued.sequence_number > rs.sequence_number:
+                # a newer ruleset of the vm is already waiting
+                self.counters['coalesced'] += 1
+                rs.finish(superseded_by=queued)
+                return
+            if queued:
+                self.counters['coalesced'] += 1
+                queued.finish(superseded_by=rs)
+            self.pending[rs.vm_id] = rs
+            if self.worker is None or not self.worker.isAlive():
+                self.worker = threading.Thread(target=self._run)
+                self.worker.setDaemon(True)
+                self.worker.start()
+            self.cond.notify()
+        finally:
+            self.cond.release()
+        
+    def set_rules(self, req):
+        rs = self._parse_ruleset(req.body)
+        self._enqueue(rs)
+        while True:
+            rs.done.wait(self.APPLY_TIMEOUT)
+            if not rs.done.isSet():
+                raise Exception('rules of vm %s were not applied in %s seconds' % (rs.vm_name, self.APPLY_TIMEOUT))
+            if rs.superseded_by is None:
+                break
+            # report the outcome of the ruleset which replaced this one
+            rs = rs.superseded_by
+        if rs.error is not None:
+            raise rs.error
+
+    def status(self, req=None):
+        self.cond.acquire()
+        try:
+            status = {
+                'queue_depth': len(self.pending),
+                'applying': self.applying,
+                'vms': len(self.applied),
+                'counters': dict(self.counters),
+                'batch_latency': self.batch_latency.to_dict(),
+                'apply_latency': self.apply_latency.to_dict(),
+            }
+        finally:
+            self.cond.release()
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        return json.dumps(status)
+    status.exposed = True
                 
         
     def echo(self, req):
@@ -191,6 +434,8 @@ class SGAgent(object):
         cherrypy.log.error_file = '/var/log/cs-securitygroup.log'
         cherrypy.server.socket_host = '0.0.0.0'
         cherrypy.server.socket_port = 9988
+        # set_rules requests wait for their rules to be applied, leave room for a burst of them to queue up
+        cherrypy.server.thread_pool = 50
         cherrypy.quickstart(SGAgent())
         
     @staticmethod 
@@ -62,8 +62,8 @@ class ShellCmd(object):
         self.stderr = None
         self.return_code = None
 
-    def __call__(self, is_exception=True):
-        (self.stdout, self.stderr) = self.process.communicate()
+    def __call__(self, is_exception=True, stdin_data=None):
+        (self.stdout, self.stderr) = self.process.communicate(stdin_data)
         if is_exception and self.process.returncode != 0:
             err = []
             err.append('failed to execute shell command: %s' % self.cmd)
@@ -0,0 +1,109 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'security_group_agent'))
+import cs_sg_agent
+import sglib
+
+class FakeShellCmd(object):
+    '''records ipset/iptables-restore input instead of running it, a restore mentioning a bad vm fails'''
+    restores = []
+
+    def __init__(self, cmd, workdir=None, pipe=True):
+        self.cmd = cmd
+
+    def __call__(self, is_exception=True, stdin_data=None):
+        if self.cmd.startswith('iptables-restore'):
+            FakeShellCmd.restores.append(stdin_data)
+            if 'i-bad' in stdin_data and is_exception:
+                raise sglib.ShellError('iptables-restore: line 3 failed')
+        return ''
+
+def ruleset(vm_name, sequence_number=1):
+    rs = cs_sg_agent.SGRuleset()
+    rs.vm_name = vm_name
+    rs.vm_id = vm_name
+    rs.signature = 'signature-%s' % vm_name
+    rs.sequence_number = sequence_number
+    rs.queued_at = time.time()
+    r = cs_sg_agent.SGRule()
+    r.protocol = 'tcp'
+    r.start_port = '22'
+    r.end_port = '22'
+    r.allowed_ips = ['0.0.0.0/0', '10.1.1.0/24']
+    rs.ingress_rules.append(r)
+    return rs
+
+class TestApplyBatch(unittest.TestCase):
+    def setUp(self):
+        self.shell_cmd = sglib.ShellCmd
+        sglib.ShellCmd = FakeShellCmd
+        FakeShellCmd.restores = []
+        self.agent = cs_sg_agent.SGAgent()
+
+    def tearDown(self):
+        sglib.ShellCmd = self.shell_cmd
+
+    def test_retry_keeps_allow_any_rules(self):
+        good = ruleset('i-good')
+        bad = ruleset('i-bad')
+        self.agent._apply_batch([good, bad])
+
+        # the batch, then each vm on its own
+        self.assertEqual(3, len(FakeShellCmd.restores))
+        retry = FakeShellCmd.restores[1]
+        self.assertTrue('i-good-in' in retry and 'i-bad' not in retry)
+        self.assertTrue('-A i-good-in -p tcp -m tcp --dport 22:22 -m state --state NEW -j ACCEPT' in retry)
+        self.assertEqual(['0.0.0.0/0', '10.1.1.0/24'], good.ingress_rules[0].allowed_ips)
+
+        self.assertTrue(good.error is None)
+        self.assertTrue(bad.error is not None)
+        self.assertTrue('i-good' in self.agent.applied)
+        self.assertFalse('i-bad' in self.agent.applied)
+        self.assertEqual(1, self.agent.counters['applied'])
+        self.assertEqual(1, self.agent.counters['failed'])
+
+class TestBuildRules(unittest.TestCase):
+    def build(self, rs):
+        batch = cs_sg_agent.IptablesBatch()
+        cs_sg_agent.SGAgent()._build_rules(rs, [], batch)
+        return batch.rules
+
+    def test_no_egress_rules_allow_all_egress(self):
+        rules = self.build(ruleset('i-1'))
+        self.assertEqual('-A i-1-eg -j RETURN', rules[-2])
+        self.assertEqual('-A i-1-in -j DROP', rules[-1])
+
+    def test_egress_rules_drop_other_egress(self):
+        rs = ruleset('i-1')
+        r = cs_sg_agent.SGRule()
+        r.protocol = 'all'
+        r.start_port = '0'
+        r.end_port = '65535'
+        r.allowed_ips = ['10.2.2.0/24']
+        rs.egress_rules.append(r)
+        rules = self.build(rs)
+        self.assertTrue('-A i-1-eg -m state --state NEW -m set --set i-1-eg_all_0_65535 dst -j RETURN' in rules)
+        self.assertEqual('-A i-1-eg -j DROP', rules[-2])
+
+if __name__ == '__main__':
+    unittest.main()
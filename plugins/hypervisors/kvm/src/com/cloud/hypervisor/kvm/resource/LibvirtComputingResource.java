@@ -305,6 +305,7 @@ public class LibvirtComputingResource extends ServerResourceBase implements Serv
     private String _createTmplPath;
     private String _heartBeatPath;
     private String _securityGroupPath;
+    private String _securityGroupDaemonPath;
     private String _ovsPvlanDhcpHostPath;
     private String _ovsPvlanVmPath;
     private String _routerProxyPath;
@@ -663,8 +664,13 @@ public class LibvirtComputingResource extends ServerResourceBase implements Serv
             throw new ConfigurationException("Unable to find the createtmplt.sh");
         }
 
-        _securityGroupPath = Script.findScript(networkScriptsDir, "security_group.py");
+        _securityGroupPath = Script.findScript(networkScriptsDir, "security_group_client.py");
         if (_securityGroupPath == null) {
+            throw new ConfigurationException("Unable to find the security_group_client.py");
+        }
+
+        _securityGroupDaemonPath = Script.findScript(networkScriptsDir, "security_group.py");
+        if (_securityGroupDaemonPath == null) {
             throw new ConfigurationException("Unable to find the security_group.py");
         }
 
@@ -906,6 +912,9 @@ public class LibvirtComputingResource extends ServerResourceBase implements Serv
         s_logger.debug("Found pif: " + _pifs.get("private") + " on " + _privBridgeName + ", pif: " + _pifs.get("public") + " on " + _publicBridgeName);
 
         _canBridgeFirewall = can_bridge_firewall(_pifs.get("public"));
+        if (_canBridgeFirewall) {
+            start_security_group_daemon();
+        }
 
         _localGateway = Script.runSimpleBashScript("ip route |grep default|awk '{print $3}'");
         if (_localGateway == null) {
@@ -4955,6 +4964,15 @@ public class LibvirtComputingResource extends ServerResourceBase implements Serv
         return true;
     }
 
+    private void start_security_group_daemon() {
+        Script cmd = new Script(_securityGroupDaemonPath, _timeout, s_logger);
+        cmd.add("daemon");
+        String result = cmd.execute();
+        if (result != null) {
+            s_logger.warn("Failed to start the security group daemon, security group commands will run on their own: " + result);
+        }
+    }
+
     protected boolean destroy_network_rules_for_vm(Connect conn, String vmName) {
         if (!_canBridgeFirewall) {
             return false;
@@ -43,6 +43,16 @@ ETC_HOSTS='/etc/hosts'
 HOSTNAME_FILE='/etc/sysconfig/network'
 OWNER_FILE_PREFIX='host_'
 OCFS2_CONF='/etc/ocfs2/cluster.conf'
+TEMPLATE_CACHE_DIR='seed_pool/cache'
+# fraction of a primary storage the template cache may take before unreferenced templates are evicted
+TEMPLATE_CACHE_BUDGET=0.3
+# seconds after which an untouched temporary copy in the template cache is considered abandoned
+TEMPLATE_CACHE_TMP_EXPIRE=3*3600
+COPY_BLOCK_SIZE=4*1024*1024
+SPARSE_CHUNK_SIZE=64*1024
+# bytes per second an image copy may read, 0 for no limit
+COPY_BANDWIDTH_LIMIT=0
+COPY_PROGRESS_INTERVAL=30
 
 logger = OvmLogger('OvmCommon')
 
@@ -50,6 +50,7 @@ errCode = {
        "OvmHost.fence":OvmHostErrCodeStub+7,
        "OvmHost.setupHeartBeat":OvmHostErrCodeStub+8,
        "OvmHost.pingAnotherHost":OvmHostErrCodeStub+9,
+       "OvmHost.getAllVmStats":OvmHostErrCodeStub+10,
        
        "OvmVm.create":OvmVmErrCodeStub+1,
        "OvmVm.stop":OvmVmErrCodeStub+2,
@@ -25,6 +25,7 @@ from OVSXMonitor import sys_perf_info
 from OVSDB import db_get_vm
 from OvmStoragePoolModule import OvmStoragePool
 from OvmHaHeartBeatModule import OvmHaHeartBeat
+from OVSXAPIUtil import XenAPIObject, session_login, session_logout
 import re
 
 logger = OvmLogger('OvmHost')
@@ -94,6 +95,30 @@ class OvmHost(OvmObject):
             if vmName == name: return id
         raise NoVmFoundException("No domain id for %s found"%vmName)
 
+    def _getVifStatsByDomainId(self):
+        '''
+        rx/tx kilobytes summed over the vifs of each domain, read straight from sysfs
+        '''
+        stats = {}
+        for dev in os.listdir('/sys/class/net'):
+            m = re.match(r'^vif(\d+)\.\d+$', dev)
+            if not m: continue
+            try:
+                counters = []
+                for name in ('rx_bytes', 'tx_bytes'):
+                    f = open(join('/sys/class/net', dev, 'statistics', name))
+                    try:
+                        counters.append(long(f.read()) / 1000)
+                    finally:
+                        f.close()
+            except IOError, e:
+                # the vif went away together with its domain
+                logger.debug(self._getVifStatsByDomainId, "Skip %s: %s"%(dev, e))
+                continue
+            (rxBytes, txBytes) = stats.get(m.group(1), (0, 0))
+            stats[m.group(1)] = (rxBytes + counters[0], txBytes + counters[1])
+        return stats
+
     @staticmethod
     def registerAsMaster(hostname, username="oracle", password="password", port=8899, isSsl=False):
         try:
@@ -237,6 +262,49 @@ class OvmHost(OvmObject):
             logger.error(OvmHost.getAllVms, errmsg)
             raise XmlRpcFault(toErrCode(OvmHost, OvmHost.getAllVms), errmsg)
     
+    @staticmethod
+    def getAllVmStats():
+        try:
+            host = OvmHost()
+            domains = host._getAllDomains()
+            nCpus = int(successToMap(xen_get_xm_info())['nr_cpus'])
+            vifStats = host._getVifStatsByDomainId()
+            dct = {}
+            session = session_login()
+            try:
+                for name, id in domains:
+                    try:
+                        refs = session.xenapi.VM.get_by_name_label(name)
+                        if len(refs) == 0:
+                            raise Exception("No ref for %s found in xenapi VM objects"%name)
+                        vm = XenAPIObject('VM', session, refs[0])
+                        VM_metrics = XenAPIObject("VM_metrics", session, vm.get_metrics())
+                        items = VM_metrics.get_VCPUs_utilisation().items()
+                        nvCpus = len(items)
+                        if nvCpus == 0:
+                            raise Exception("vm %s has 0 vcpus !!!"%name)
+                    except Exception, e:
+                        logger.debug(OvmHost.getAllVmStats, "Cannot get stats of %s, skip it: %s"%(name, e))
+                        continue
+                    
+                    totalUtils = 0.0
+                    for num, util in items:
+                        totalUtils += float(util)
+                    # CPU utlization of VM = (total cpu utilization of each vcpu) / number of physical cpu
+                    avgUtils = float(totalUtils/nCpus) * 100
+                    (rxBytes, txBytes) = vifStats.get(id, (0, 0))
+                    dct[name] = {"cpuNum":nvCpus, "cpuUtil":avgUtils, "rxBytes":rxBytes, "txBytes":txBytes}
+            finally:
+                session_logout()
+            
+            rs = toGson(dct)
+            logger.debug(OvmHost.getAllVmStats, rs)
+            return rs
+        except Exception, e:
+            errmsg = fmt_err_msg(e)
+            logger.error(OvmHost.getAllVmStats, errmsg)
+            raise XmlRpcFault(toErrCode(OvmHost, OvmHost.getAllVmStats), errmsg)
+    
     @staticmethod
     def fence(ip):
         # try 3 times to avoid race condition that read when heartbeat file is being written
@@ -21,6 +21,17 @@ from OVSXCluster import clusterm_set_ocfs2_cluster_conf, clusterm_start_o2cb_ser
 from OVSSiteRMServer import get_master_ip
 from OvmOCFS2Module import OvmOCFS2
 import re
+import errno
+import fcntl
+import time
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
+
+# lseek whence values from linux/fs.h, not in os module of python 2
+SEEK_DATA = 3
+SEEK_HOLE = 4
 
 class OvmStoragePoolDecoder(json.JSONDecoder):
     def decode(self, jStr):
@@ -110,7 +121,290 @@ class OvmStoragePool(OvmObject):
             doCmd(rmDirCmd)
         else:
             logger.warning(OvmStoragePool._umount, "Something wrong when umount %s, there are still files in directory:%s", mountpoint, " ".join(ls))
-         
+
+    def _getDataExtents(self, fd, size):
+        '''
+        Allocated (offset, length) ranges of fd found by SEEK_DATA/SEEK_HOLE,
+        None if the kernel or filesystem doesn't support them
+        '''
+        extents = []
+        offset = 0
+        try:
+            while offset < size:
+                try:
+                    start = os.lseek(fd, offset, SEEK_DATA)
+                except OSError, e:
+                    # no data after offset, the rest of the file is a hole
+                    if e.errno == errno.ENXIO: break
+                    raise
+                end = os.lseek(fd, start, SEEK_HOLE)
+                extents.append((start, end - start))
+                offset = end
+        except OSError, e:
+            if e.errno in (errno.EINVAL, errno.EOPNOTSUPP): return None
+            raise
+        return extents
+
+    def _sparseCopy(self, src, dst, withChecksum=False, bwLimit=COPY_BANDWIDTH_LIMIT):
+        '''
+        Copy src to dst reading only the allocated extents of src, COPY_BLOCK_SIZE at a time.
+        Holes and zero SPARSE_CHUNK_SIZE chunks are seeked over so dst stays sparse. Reads are
+        throttled to bwLimit bytes per second (0 means no limit) and progress is logged every
+        COPY_PROGRESS_INTERVAL seconds. Returns md5 of src if withChecksum, else None
+        '''
+        zero = '\0' * SPARSE_CHUNK_SIZE
+        zeroBlock = '\0' * COPY_BLOCK_SIZE
+        digest = None
+        if withChecksum: digest = md5()
+        size = os.path.getsize(src)
+        progress = {"copied":0, "start":time.time(), "lastLog":time.time()}
+
+        def hashZeros(length):
+            while length > 0:
+                n = min(length, COPY_BLOCK_SIZE)
+                digest.update(zeroBlock[:n])
+                length -= n
+
+        def account(n):
+            progress["copied"] += n
+            now = time.time()
+            if bwLimit:
+                ahead = float(progress["copied"]) / bwLimit - (now - progress["start"])
+                if ahead > 0:
+                    time.sleep(ahead)
+                    now = time.time()
+            if now - progress["lastLog"] >= COPY_PROGRESS_INTERVAL:
+                progress["lastLog"] = now
+                logger.info(OvmStoragePool._sparseCopy, "%s to %s: read %sM of %sM at %.1fM/s"%(src, dst,
+                    BytesToM(progress["copied"]), BytesToM(size), BytesToM(float(progress["copied"])) / max(now - progress["start"], 0.001)))
+
+        fin = open(src, 'rb')
+        try:
+            fout = open(dst, 'wb')
+            try:
+                extents = self._getDataExtents(fin.fileno(), size)
+                if extents is None: extents = [(0, size)]
+                pos = 0
+                for (start, length) in extents:
+                    if digest and start > pos: hashZeros(start - pos)
+                    fin.seek(start)
+                    pos = start
+                    end = start + length
+                    while pos < end:
+                        block = fin.read(min(COPY_BLOCK_SIZE, end - pos))
+                        if not block: break
+                        if digest: digest.update(block)
+                        # write runs of non zero chunks, skip the zero ones
+                        runStart = None
+                        for offset in range(0, len(block), SPARSE_CHUNK_SIZE):
+                            if block[offset:offset + SPARSE_CHUNK_SIZE] != zero:
+                                if runStart is None: runStart = offset
+                            elif runStart is not None:
+                                fout.seek(pos + runStart)
+                                fout.write(block[runStart:offset])
+                                runStart = None
+                        if runStart is not None:
+                            fout.seek(pos + runStart)
+                            fout.write(block[runStart:])
+                        pos += len(block)
+                        account(len(block))
+                if digest and size > pos: hashZeros(size - pos)
+                # extend dst to full size in case it ends with a hole
+                fout.truncate(size)
+            finally:
+                fout.close()
+        finally:
+            fin.close()
+
+        elapsed = max(time.time() - progress["start"], 0.001)
+        logger.info(OvmStoragePool._sparseCopy, "copied %s to %s: %sM of data in %sM image, %.1fs, %.1fM/s"%(src, dst,
+            BytesToM(progress["copied"]), BytesToM(size), elapsed, BytesToM(float(progress["copied"])) / elapsed))
+        if digest: return digest.hexdigest()
+        return None
+
+    def _copyImage(self, src, dst, bwLimit=COPY_BANDWIDTH_LIMIT):
+        '''
+        Reflink src to dst when both are on the same OCFS2 volume, the copy shares extents
+        with src until either is written. Otherwise, or if reflink fails, do a sparse copy
+        '''
+        if os.stat(src).st_dev == os.stat(dirname(dst)).st_dev:
+            try:
+                doCmd(['reflink', src, dst])
+                logger.info(OvmStoragePool._copyImage, "reflinked %s to %s"%(src, dst))
+                return
+            except Exception, e:
+                logger.warning(OvmStoragePool._copyImage, "reflink %s to %s failed, fall back to copy: %s"%(src, dst, e))
+                if exists(dst): os.remove(dst)
+        self._sparseCopy(src, dst, bwLimit=bwLimit)
+
+    def _lockTemplateCache(self, cacheDir):
+        if not exists(cacheDir):
+            os.makedirs(cacheDir)
+        fd = open(join(cacheDir, '.lock'), 'a')
+        # the cache is shared by every host of the pool, flock is cluster wide on OCFS2 while lockf is node local
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _unlockTemplateCache(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        fd.close()
+
+    def _cleanTemplateCacheTmp(self, cacheDir):
+        '''
+        Remove .<uuid> copy directories left by copies which died, a copy in progress keeps
+        writing its file so anything untouched for TEMPLATE_CACHE_TMP_EXPIRE seconds is stale
+        '''
+        now = time.time()
+        for name in os.listdir(cacheDir):
+            tmpDir = join(cacheDir, name)
+            if not name.startswith('.') or not os.path.isdir(tmpDir): continue
+            mtimes = [os.path.getmtime(tmpDir)] + [os.path.getmtime(join(tmpDir, f)) for f in os.listdir(tmpDir)]
+            if now - max(mtimes) < TEMPLATE_CACHE_TMP_EXPIRE: continue
+            logger.info(OvmStoragePool._cleanTemplateCacheTmp, "Remove %s left by an unfinished copy"%tmpDir)
+            doCmd(['rm', '-rf', tmpDir])
+
+    def _loadTemplateCacheIndex(self, cacheDir):
+        '''
+        sources maps a template on secondary storage to the md5 of its content,
+        entries maps md5 to the cached file, its size, reference count and last use
+        '''
+        indexPath = join(cacheDir, 'index')
+        if not exists(indexPath):
+            return {"sources":{}, "entries":{}}
+        fd = open(indexPath, 'r')
+        try:
+            return json.loads(fd.read(), object_hook=toAsciiHook)
+        finally:
+            fd.close()
+
+    def _saveTemplateCacheIndex(self, cacheDir, index):
+        tmpPath = join(cacheDir, 'index.tmp')
+        fd = open(tmpPath, 'w')
+        try:
+            fd.write(json.dumps(index))
+        finally:
+            fd.close()
+        os.rename(tmpPath, join(cacheDir, 'index'))
+
+    def _lookupTemplateCache(self, cacheDir, index, checksum):
+        entry = index['entries'].get(checksum)
+        if entry and not exists(join(cacheDir, checksum, entry['file'])):
+            logger.warning(OvmStoragePool._lookupTemplateCache, "Cached template %s has gone, drop it from index"%checksum)
+            self._dropCachedTemplate(cacheDir, index, checksum)
+            entry = None
+        return entry
+
+    def _dropCachedTemplate(self, cacheDir, index, checksum):
+        del index['entries'][checksum]
+        for source, c in index['sources'].items():
+            if c == checksum: del index['sources'][source]
+        entryDir = join(cacheDir, checksum)
+        if exists(entryDir):
+            doCmd(['rm', '-rf', entryDir])
+
+    def _evictTemplateCache(self, cacheDir, index, need):
+        '''
+        Remove unreferenced templates, least recently used first, until the cache plus
+        need bytes fits in TEMPLATE_CACHE_BUDGET of the storage and need bytes are free
+        '''
+        (totalSpace, freeSpace) = self._getSpaceinfoOfDir(cacheDir)
+        budget = long(totalSpace * TEMPLATE_CACHE_BUDGET)
+        used = 0
+        lru = []
+        for checksum, entry in index['entries'].items():
+            used += entry['allocated']
+            if entry['refs'] == 0:
+                lru.append((entry['lastUsed'], checksum))
+        lru.sort()
+        for lastUsed, checksum in lru:
+            if used + need <= budget and freeSpace >= need: break
+            allocated = index['entries'][checksum]['allocated']
+            logger.info(OvmStoragePool._evictTemplateCache, "Evict template %s (%s bytes) from %s"%(checksum, allocated, cacheDir))
+            self._dropCachedTemplate(cacheDir, index, checksum)
+            used -= allocated
+            freeSpace += allocated
+
+    def _cacheTemplate(self, priStorageMountPoint, templateSecPath, source):
+        '''
+        Return (installPath, templateSize) of templateSecPath in the template cache of the
+        primary storage, copying it in only if neither the same source nor the same content
+        is already cached. Every call takes a reference released by _releaseCachedTemplate
+        '''
+        def takeRef(index, checksum, entry):
+            entry['refs'] += 1
+            entry['lastUsed'] = time.time()
+            self._saveTemplateCacheIndex(cacheDir, index)
+            return (join(cacheDir, checksum, entry['file']), entry['size'])
+
+        cacheDir = join(priStorageMountPoint, TEMPLATE_CACHE_DIR)
+        st = os.stat(templateSecPath)
+        sourceKey = "%s:%s:%s"%(source, st.st_size, int(st.st_mtime))
+        fd = self._lockTemplateCache(cacheDir)
+        try:
+            index = self._loadTemplateCacheIndex(cacheDir)
+            checksum = index['sources'].get(sourceKey)
+            entry = self._lookupTemplateCache(cacheDir, index, checksum)
+            if entry:
+                logger.info(OvmStoragePool._cacheTemplate, "Template %s is cached as %s"%(source, checksum))
+                return takeRef(index, checksum, entry)
+            self._cleanTemplateCacheTmp(cacheDir)
+            self._evictTemplateCache(cacheDir, index, st.st_size)
+            self._saveTemplateCacheIndex(cacheDir, index)
+        finally:
+            self._unlockTemplateCache(fd)
+
+        # Although mgmt server will check the size, we check again for safety
+        self._checkDirSizeForImage(priStorageMountPoint, templateSecPath)
+        # copy without holding the lock, a concurrent copy of the same content is deduplicated below
+        tmpDir = join(cacheDir, '.' + get_uuid())
+        os.makedirs(tmpDir)
+        try:
+            templateFile = basename(templateSecPath)
+            tmpPath = join(tmpDir, templateFile)
+            logger.info(OvmStoragePool._cacheTemplate, "copy %s to %s"%(templateSecPath, tmpPath))
+            checksum = self._sparseCopy(templateSecPath, tmpPath, withChecksum=True)
+            fd = self._lockTemplateCache(cacheDir)
+            try:
+                index = self._loadTemplateCacheIndex(cacheDir)
+                entry = self._lookupTemplateCache(cacheDir, index, checksum)
+                if entry:
+                    logger.info(OvmStoragePool._cacheTemplate, "Content of %s is already cached as %s"%(source, checksum))
+                else:
+                    if exists(join(cacheDir, checksum)):
+                        # left over by a copy whose index update never happened
+                        doCmd(['rm', '-rf', join(cacheDir, checksum)])
+                    os.rename(tmpDir, join(cacheDir, checksum))
+                    entry = {"file":templateFile, "size":st.st_size, "refs":0,
+                             "allocated":os.stat(join(cacheDir, checksum, templateFile)).st_blocks * 512}
+                    index['entries'][checksum] = entry
+                index['sources'][sourceKey] = checksum
+                rs = takeRef(index, checksum, entry)
+                self._evictTemplateCache(cacheDir, index, 0)
+                self._saveTemplateCacheIndex(cacheDir, index)
+                return rs
+            finally:
+                self._unlockTemplateCache(fd)
+        finally:
+            if exists(tmpDir):
+                doCmd(['rm', '-rf', tmpDir])
+
+    def _releaseCachedTemplate(self, cacheDir, path):
+        '''
+        Drop a reference taken by _cacheTemplate, the file stays cached until evicted
+        '''
+        checksum = basename(dirname(path))
+        fd = self._lockTemplateCache(cacheDir)
+        try:
+            index = self._loadTemplateCacheIndex(cacheDir)
+            entry = index['entries'].get(checksum)
+            if not entry:
+                logger.warning(OvmStoragePool._releaseCachedTemplate, "%s is not in template cache %s"%(path, cacheDir))
+                return
+            entry['refs'] = max(entry['refs'] - 1, 0)
+            self._saveTemplateCacheIndex(cacheDir, index)
+        finally:
+            self._unlockTemplateCache(fd)
+
     @staticmethod
     def create(jStr):
         try:
@@ -182,18 +476,7 @@ class OvmStoragePool(OvmObject):
     
                 sr = OvmStoragePool()._getSrByNameLable(uuid)
                 priStorageMountPoint = sr.mountpoint
-                # Although mgmt server will check the size, we check again for safety
-                OvmStoragePool()._checkDirSizeForImage(priStorageMountPoint, templateSecPath)
-                seedDir = join(priStorageMountPoint, 'seed_pool', tmpUuid)
-                if exists(seedDir):
-                    raise Exception("%s already here, cannot override existing template" % seedDir)
-                os.makedirs(seedDir)
-    
-                tgt = join(seedDir, templateFile)
-                cpTemplateCmd = ['cp', templateSecPath, tgt]
-                logger.info(OvmStoragePool.downloadTemplate, " ".join(cpTemplateCmd))
-                doCmd(cpTemplateCmd)
-                templateSize = os.path.getsize(tgt) 
+                (tgt, templateSize) = OvmStoragePool()._cacheTemplate(priStorageMountPoint, templateSecPath, join(secPathDir, templateFile))
                 logger.info(OvmStoragePool.downloadTemplate, "primary_storage_download success:installPath:%s, templateSize:%s"%(tgt,templateSize))
                 rs = toGson({"installPath":tgt, "templateSize":templateSize})
                 return rs
@@ -339,7 +622,7 @@ if this doesn't resolve the problem, please check oracle manual to see how to of
             os.makedirs(destPath)
             newName = get_uuid() + ".raw"
             destName = join(destPath, newName)
-            doCmd(['cp', volumePath, destName])
+            OvmStoragePool()._copyImage(volumePath, destName)
             size = os.path.getsize(destName)
             resInstallPath = join(installPath, newName)
             OvmStoragePool()._umount(secMountPoint)
@@ -385,7 +668,7 @@ if this doesn't resolve the problem, please check oracle manual to see how to of
             os.makedirs(destPath)
             newName = get_uuid() + ".raw"
             destName = join(destPath, newName)
-            doCmd(['cp', volumePath, destName])
+            OvmStoragePool()._copyImage(volumePath, destName)
             return destName
         
         def copyToPrimary(secMountPoint, volumeFolderOnSecStorage, volumePath, primaryMountPath):
@@ -397,7 +680,7 @@ if this doesn't resolve the problem, please check oracle manual to see how to of
             destPath = join(primaryMountPath, "sharedDisk")
             newName = get_uuid() + ".raw"
             destName = join(destPath, newName)
-            doCmd(['cp', srcPath, destName])
+            OvmStoragePool()._copyImage(srcPath, destName)
             return destName
                       
         secMountPoint = ""
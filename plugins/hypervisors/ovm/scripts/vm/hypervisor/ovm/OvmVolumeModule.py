@@ -105,8 +105,7 @@ class OvmVolume(OvmObject):
             OvmStoragePool()._checkDirSizeForImage(volDir, templateUrl)
             volName = volUuid + '.raw'
             tgt = join(volDir, volName)
-            cpVolCmd = ['cp', templateUrl, tgt]
-            doCmd(cpVolCmd)
+            OvmStoragePool()._copyImage(templateUrl, tgt)
             volSize = os.path.getsize(tgt)
             vol = OvmVolume()
             vol.name = volName
@@ -125,10 +124,14 @@ class OvmVolume(OvmObject):
     @staticmethod
     def destroy(poolUuid, path):
         try:
-            OvmStoragePool()._getSrByNameLable(poolUuid)
+            sr = OvmStoragePool()._getSrByNameLable(poolUuid)
             if not exists(path): raise Exception("Cannot find %s"%path)
             dir = dirname(path)
-            if exists(join(dir, 'vm.cfg')):
+            cacheDir = join(sr.mountpoint, TEMPLATE_CACHE_DIR)
+            if os.path.normpath(dirname(dir)) == os.path.normpath(cacheDir):
+                # cached templates are shared by every download of the same content, only drop our reference
+                OvmStoragePool()._releaseCachedTemplate(cacheDir, path)
+            elif exists(join(dir, 'vm.cfg')):
                 # delete root disk
                 vmNamePath = join(dir, 'vmName')
                 if exists(vmNamePath):
@@ -768,7 +768,10 @@ public class OvmResourceBase implements ServerResource, HypervisorResource {
     }
 
     private VmStatsEntry getVmStat(String vmName) throws XmlRpcException {
-        Map<String, String> vmStat = OvmVm.getVmStats(_conn, vmName);
+        return toVmStatsEntry(vmName, OvmVm.getVmStats(_conn, vmName));
+    }
+
+    private VmStatsEntry toVmStatsEntry(String vmName, Map<String, String> vmStat) {
         int nvcpus = Integer.parseInt(vmStat.get("cpuNum"));
         float cpuUtil = Float.parseFloat(vmStat.get("cpuUtil"));
         long rxBytes = Long.parseLong(vmStat.get("rxBytes"));
@@ -798,7 +801,17 @@ public class OvmResourceBase implements ServerResource, HypervisorResource {
     protected GetVmStatsAnswer execute(GetVmStatsCommand cmd) {
         List<String> vmNames = cmd.getVmNames();
         HashMap<String, VmStatsEntry> vmStatsNameMap = new HashMap<String, VmStatsEntry>();
+        Map<String, Map<String, String>> allVmStats = null;
+        try {
+            allVmStats = OvmHost.getAllVmStats(_conn);
+        } catch (XmlRpcException e) {
+            s_logger.debug("Get stats of all vms failed, getting them one by one", e);
+        }
         for (String vmName : vmNames) {
+            if (allVmStats != null && allVmStats.containsKey(vmName)) {
+                vmStatsNameMap.put(vmName, toVmStatsEntry(vmName, allVmStats.get(vmName)));
+                continue;
+            }
             try {
                 VmStatsEntry e = getVmStat(vmName);
                 vmStatsNameMap.put(vmName, e);
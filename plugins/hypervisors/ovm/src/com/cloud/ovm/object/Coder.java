@@ -76,6 +76,12 @@ public class Coder {
         return s_mapGson.fromJson(str, Map.class);
     }
 
+    public static Map<String, Map<String, String>> mapOfMapsFromJson(String str) {
+        Type mapType = new TypeToken<Map<String, Map<String, String>>>() {
+        }.getType();
+        return s_gson.fromJson(str, mapType);
+    }
+
     public static List<String> listFromJson(String str) {
         Type listType = new TypeToken<List<String>>() {
         }.getType();
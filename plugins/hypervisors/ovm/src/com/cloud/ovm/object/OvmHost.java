@@ -73,6 +73,11 @@ public class OvmHost extends OvmObject {
         return Coder.mapFromJson(res);
     }
 
+    public static Map<String, Map<String, String>> getAllVmStats(Connection c) throws XmlRpcException {
+        String res = (String)c.call("OvmHost.getAllVmStats", Coder.s_emptyParams);
+        return Coder.mapOfMapsFromJson(res);
+    }
+
     public static void setupHeartBeat(Connection c, String poolUuid, String ip) throws XmlRpcException {
         Object[] params = {poolUuid, ip};
         c.call("OvmHost.setupHeartBeat", params);
@@ -23,6 +23,8 @@ import os
 import subprocess
 import simplejson as json
 import copy
+import fcntl
+import tempfile
 
 from time import localtime, asctime
 
@@ -282,6 +284,99 @@ def get_vif_name_from_macaddress(macaddress):
     vm_domain_id = do_cmd([XE_PATH, "vm-param-get", "uuid=%s" % vm_uuid,  "param-name=dom-id"])
     return "vif"+vm_domain_id+"."+vif_device_id
 
+def _ovsdb_value(value):
+    # ovs-vsctl --format=json encodes maps, sets and uuids as ["map", [[k, v], ..]], ["set", [..]], ["uuid", ".."]
+    if isinstance(value, list) and len(value) == 2:
+        if value[0] == "map":
+            return dict((str(k), _ovsdb_value(v)) for k, v in value[1])
+        if value[0] == "set":
+            return [_ovsdb_value(v) for v in value[1]]
+        if value[0] == "uuid":
+            return str(value[1])
+    if isinstance(value, unicode):
+        return str(value)
+    return value
+
+class OvsSnapshot(object):
+    """
+    Snapshot of the Open vSwitch interfaces (name, ofport, attached mac, external ids and options) taken with a
+    single ovs-vsctl call, so that looking up the ports of a bridge does not need an ovs-vsctl/xe call per port.
+    Lookups of interfaces missing from the snapshot (e.g. tunnels created after it was taken) fall back to querying
+    ovs-vsctl/xe.
+    """
+
+    def __init__(self):
+        output = do_cmd([VSCTL_PATH, '--format=json', '--columns=name,ofport,external_ids,options',
+                         'list', 'Interface'])
+        table = json.loads(output)
+        self.interfaces = {}
+        self.vifs_by_mac = {}
+        self.bridge_ports = {}
+        self.vif_network_ids = None
+        for row in table["data"]:
+            interface = dict(zip(table["headings"], [_ovsdb_value(value) for value in row]))
+            if isinstance(interface["ofport"], list):
+                # ofport is an empty set until the interface is attached to the datapath
+                interface["ofport"] = interface["ofport"] and interface["ofport"][0] or None
+            self.interfaces[interface["name"]] = interface
+            mac = interface["external_ids"].get("attached-mac")
+            if mac and interface["name"].startswith("vif"):
+                self.vifs_by_mac[mac.lower()] = interface["name"]
+
+    def get_ports(self, bridge):
+        if bridge not in self.bridge_ports:
+            vsctl_output = do_cmd([VSCTL_PATH, 'list-ports', bridge])
+            self.bridge_ports[bridge] = [port for port in vsctl_output.split('\n') if port]
+        return self.bridge_ports[bridge]
+
+    def get_ofport(self, if_name):
+        interface = self.interfaces.get(if_name)
+        if interface is None or interface["ofport"] is None:
+            return get_ofport_for_vif(if_name)
+        return str(interface["ofport"])
+
+    def get_vif_name(self, macaddress):
+        vif_name = self.vifs_by_mac.get(macaddress.lower())
+        if vif_name is None:
+            return get_vif_name_from_macaddress(macaddress)
+        return vif_name
+
+    def get_network_id(self, if_name):
+        interface = self.interfaces.get(if_name)
+        if if_name.startswith('t'):
+            if interface is None or "cloudstack-network-id" not in interface["options"]:
+                return get_network_id_for_tunnel_port(if_name)[1:-1]
+            return interface["options"]["cloudstack-network-id"]
+
+        vif_uuid = interface and interface["external_ids"].get("xs-vif-uuid")
+        if vif_uuid:
+            if self.vif_network_ids is None:
+                self.vif_network_ids = get_network_ids_for_vifs()
+            if vif_uuid in self.vif_network_ids:
+                return self.vif_network_ids[vif_uuid]
+        return get_network_id_for_vif(if_name)
+
+def get_network_ids_for_vifs():
+    """
+    Returns the cloudstack-network-id of all the VIFs, keyed by VIF uuid, from a single xe call.
+    """
+    vif_network_ids = {}
+    vif_uuid = None
+    output = do_cmd([XE_PATH, "vif-list", "params=uuid,other-config"])
+    for line in output.split('\n'):
+        fields = line.split(':', 1)
+        if len(fields) < 2:
+            continue
+        name = fields[0].split('(')[0].strip()
+        if name == "uuid":
+            vif_uuid = fields[1].strip()
+        elif name == "other-config" and vif_uuid:
+            for item in fields[1].split(';'):
+                item_fields = item.split(':', 1)
+                if len(item_fields) == 2 and item_fields[0].strip() == "cloudstack-network-id":
+                    vif_network_ids[vif_uuid] = item_fields[1].strip()
+    return vif_network_ids
+
 def add_mac_lookup_table_entry(bridge, mac_address, out_of_port):
     action = "output=%s" %out_of_port
     add_flow(bridge, priority=1100, dl_dst=mac_address, table=L2_LOOKUP_TABLE, actions=action)
@@ -295,6 +390,156 @@ def add_ip_lookup_table_entry(bridge, ip, dst_tier_gateway_mac, dst_vm_mac):
     addflow = [OFCTL_PATH, "add-flow", bridge, action_str]
     do_cmd(addflow)
 
+# Flow tables of the VPC bridges are programmed from the complete list of flows they should have. The list last
+# applied to each table is kept in /var/run/cloud, so that an update only adds, modifies and deletes the flows that
+# changed instead of flushing and re-populating the table (which drops traffic until the new flows are in).
+FLOW_STATE_DIR = "/var/run/cloud"
+
+def _split_once(text, sep):
+    # str.partition is not available on the Python 2.4 of XenServer's dom0
+    fields = text.split(sep, 1)
+    if len(fields) < 2:
+        fields.append('')
+    return fields[0], fields[1]
+
+def _split_flow(flow):
+    match, actions = _split_once(flow, "actions=")
+    match = [field for field in match.replace(',', ' ').split()
+             if not field.startswith('hard_timeout=') and not field.startswith('idle_timeout=')]
+    return " ".join(match), actions.strip()
+
+def _flow_table(match):
+    for field in match.split():
+        if field.startswith('table='):
+            return field[len('table='):]
+    return "0"
+
+def _flow_state_file(bridge, table):
+    return os.path.join(FLOW_STATE_DIR, "%s-table%s.ofstate" % (bridge, table))
+
+def _load_flow_state(bridge, table):
+    try:
+        state_file = open(_flow_state_file(bridge, table))
+        try:
+            return json.load(state_file)
+        finally:
+            state_file.close()
+    except (IOError, ValueError):
+        return None
+
+def _save_flow_state(bridge, table, sequence_no, flows):
+    state_filename = _flow_state_file(bridge, table)
+    state_file = open(state_filename + ".tmp", 'w')
+    json.dump({"sequence_no": sequence_no, "flows": flows}, state_file)
+    state_file.close()
+    os.rename(state_filename + ".tmp", state_filename)
+
+def _clear_flow_state(bridge, table):
+    if os.path.isfile(_flow_state_file(bridge, table)):
+        os.remove(_flow_state_file(bridge, table))
+
+def _table_flow_count(bridge, table):
+    output = do_cmd([OFCTL_PATH, 'dump-aggregate', bridge, 'table=%s' % table])
+    for field in output.split():
+        if field.startswith('flow_count='):
+            return int(field[len('flow_count='):])
+    return -1
+
+def _apply_flow_mods(bridge, flow_mods):
+    fd, ofspec_filename = tempfile.mkstemp(prefix=bridge + "-", suffix=".ofspec", dir=FLOW_STATE_DIR)
+    ofspec = os.fdopen(fd, 'w')
+    try:
+        ofspec.write("\n".join(flow_mods) + "\n")
+        ofspec.close()
+        logging.debug("Applying below flow changes on bridge %s:\n" % bridge + "\n".join(flow_mods))
+        try:
+            # all the changes in one OpenFlow bundle, so the tables move to the new flows atomically
+            do_cmd([OFCTL_PATH, '--bundle', 'add-flows', bridge, ofspec_filename])
+            return
+        except PluginError, e:
+            logging.debug("Failed to apply the flow changes as a bundle, applying them one by one: " + str(e))
+
+        # Open vSwitch without bundle support: flush the tables being re-synced, add/overwrite the flows, and only
+        # then delete the flows that are gone, so that unchanged traffic keeps flowing
+        deletes = []
+        adds = []
+        for flow_mod in flow_mods:
+            command, flow = _split_once(flow_mod, " ")
+            if command == "delete":
+                do_cmd([OFCTL_PATH, 'del-flows', bridge, flow])
+            elif command == "delete_strict":
+                deletes.append(flow)
+            else:
+                adds.append(flow)
+        if adds:
+            ofspec = open(ofspec_filename, 'w')
+            ofspec.write("\n".join(adds) + "\n")
+            ofspec.close()
+            do_cmd([OFCTL_PATH, 'add-flows', bridge, ofspec_filename])
+        for flow in deletes:
+            do_cmd([OFCTL_PATH, '--strict', 'del-flows', bridge, flow])
+    finally:
+        if not ofspec.closed:
+            ofspec.close()
+        os.remove(ofspec_filename)
+
+def apply_flows(bridge, tables, flows, sequence_no=None):
+    """
+    Makes the given flow tables of the bridge hold exactly 'flows'. Only the difference with the flows applied last
+    time is sent to the switch; a table is flushed and re-populated only when there is no record of what it holds, or
+    when the number of flows in the switch no longer matches the record (e.g. ovs-vswitchd restarted).
+    """
+    if not os.path.exists(FLOW_STATE_DIR):
+        os.makedirs(FLOW_STATE_DIR)
+
+    new_flows = dict((str(table), []) for table in tables)
+    for flow in flows:
+        match, actions = _split_flow(flow)
+        table_flows = new_flows.setdefault(_flow_table(match), [])
+        flow = match + " actions=" + actions
+        if flow not in table_flows:
+            table_flows.append(flow)
+
+    lock_file = open(os.path.join(FLOW_STATE_DIR, bridge + ".oflock"), 'w')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    try:
+        flow_mods = []
+        for table, table_flows in sorted(new_flows.items()):
+            state = _load_flow_state(bridge, table)
+            if state is None or _table_flow_count(bridge, table) != len(state["flows"]):
+                logging.debug("No consistent record of the flows in table %s of bridge %s, re-populating the table"
+                              % (table, bridge))
+                flow_mods.append("delete table=%s" % table)
+                flow_mods.extend("add " + flow for flow in table_flows)
+                continue
+
+            logging.debug("Updating table %s of bridge %s from the flows of sequence no %s"
+                          % (table, bridge, state["sequence_no"]))
+            old_flows = set(state["flows"])
+            added = [flow for flow in table_flows if flow not in old_flows]
+            # a flow whose actions changed is overwritten by its add, deleting it would remove the new flow
+            added_matches = set(_split_once(flow, " actions=")[0] for flow in added)
+            current_flows = set(table_flows)
+            flow_mods.extend("add " + flow for flow in added)
+            flow_mods.extend("delete_strict " + _split_once(flow, " actions=")[0] for flow in state["flows"]
+                             if flow not in current_flows and _split_once(flow, " actions=")[0] not in added_matches)
+
+        try:
+            if flow_mods:
+                _apply_flow_mods(bridge, flow_mods)
+        except:
+            # the tables are in an unknown state now, force a re-sync on the next update
+            for table in new_flows:
+                _clear_flow_state(bridge, table)
+            raise
+
+        for table, table_flows in new_flows.items():
+            _save_flow_state(bridge, table, sequence_no, table_flows)
+        return len(flow_mods)
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
 def get_vpc_vms_on_host(vpc, host_id):
     all_vms = vpc.vms
     vms_on_host = []
@@ -474,12 +719,11 @@ def configure_vpc_bridge_for_network_topology(bridge, this_host_id, json_config,
         return "FAILURE:IMPROPER_JSON_CONFG_FILE"
 
     try:
-        if not os.path.exists('/var/run/cloud'):
-            os.makedirs('/var/run/cloud')
+        # OpenFlow rules corresponding to L2 and L3 lookup table updates
+        flows = []
 
-        # create a temporary file to store OpenFlow rules corresponding to L2 and L3 lookup table updates
-        ofspec_filename = "/var/run/cloud/" + bridge + sequence_no + ".ofspec"
-        ofspec = open(ofspec_filename, 'w+')
+        # ofports, vif names and tunnels of the bridge, looked up once for all the nics
+        ovs = OvsSnapshot()
 
         # get the list of VM's in all the tiers of VPC running in this host from the JSON config
         this_host_vms = get_vpc_vms_on_host(vpconfig, this_host_id)
@@ -488,14 +732,14 @@ def configure_vpc_bridge_for_network_topology(bridge, this_host_id, json_config,
             for nic in vm.nics:
                 mac_addr = nic.macaddress
                 ip = nic.ipaddress
-                vif_name = get_vif_name_from_macaddress(mac_addr)
-                of_port  = get_ofport_for_vif(vif_name)
+                vif_name = ovs.get_vif_name(mac_addr)
+                of_port  = ovs.get_ofport(vif_name)
                 network  = get_network_details(vpconfig, nic.networkuuid)
 
                 # Add OF rule in L2 look up table, if packet's destination mac matches MAC of the VM's nic
                 # then send packet on the found OFPORT
-                ofspec.write("table=%s" %L2_LOOKUP_TABLE + " priority=1100 dl_dst=%s " %mac_addr +
-                             " actions=output:%s" %of_port + "\n")
+                flows.append("table=%s" %L2_LOOKUP_TABLE + " priority=1100 dl_dst=%s " %mac_addr +
+                             " actions=output:%s" %of_port)
 
                 # Add OF rule in L3 look up table: if packet's destination IP matches VM's IP then modify the packet
                 # to set DST MAC = VM's MAC, SRC MAC= destination tier gateway MAC and send to egress table. This step
@@ -503,18 +747,18 @@ def configure_vpc_bridge_for_network_topology(bridge, this_host_id, json_config,
                 action_str = " mod_dl_src:%s"%network.gatewaymac + ",mod_dl_dst:%s" % mac_addr \
                              + ",resubmit(,%s)"%INGRESS_ACL_TABLE
                 action_str = "table=%s"%L3_LOOKUP_TABLE + " ip nw_dst=%s"%ip + " actions=%s" %action_str
-                ofspec.write(action_str + "\n")
+                flows.append(action_str)
 
                 # Add OF rule to send intra-tier traffic from this nic of the VM to L2 lookup path (L2 switching)
                 action_str = "table=%s" %CLASSIFIER_TABLE + " priority=1200 in_port=%s " %of_port + \
                              " ip nw_dst=%s " %network.cidr + " actions=resubmit(,%s)" %L2_LOOKUP_TABLE
-                ofspec.write(action_str + "\n")
+                flows.append(action_str)
 
                 # Add OF rule to send inter-tier traffic from this nic of the VM to egress ACL table(L3 lookup path)
                 action_str = "table=%s "%CLASSIFIER_TABLE + " priority=1100 in_port=%s " %of_port +\
                              " ip dl_dst=%s " %network.gatewaymac + " nw_dst=%s " %vpconfig.cidr + \
                              " actions=resubmit(,%s)" %EGRESS_ACL_TABLE
-                ofspec.write(action_str + "\n")
+                flows.append(action_str)
 
         # get the list of hosts on which VPC spans from the JSON config
         vpc_spanning_hosts = vpconfig.hosts
@@ -536,16 +780,17 @@ def configure_vpc_bridge_for_network_topology(bridge, this_host_id, json_config,
                     tunnel_name = "t%s-%s-%s" % (gre_key, this_host_id, host.hostid)
 
                     # check if tunnel exists already, if not create a tunnel from this host to remote host
-                    if not check_tunnel_exists(bridge, tunnel_name):
+                    if tunnel_name not in ovs.get_ports(bridge):
                         create_tunnel(bridge, str(host.ipaddress), str(gre_key), this_host_id,
                                       host.hostid, network.networkuuid)
+                        ovs.get_ports(bridge).append(tunnel_name)
 
-                    of_port = get_ofport_for_vif(tunnel_name)
+                    of_port = ovs.get_ofport(tunnel_name)
 
                     # Add flow rule in L2 look up table, if packet's destination mac matches MAC of the VM's nic
                     # on the remote host then send packet on the found OFPORT corresponding to the tunnel
-                    ofspec.write("table=%s" %L2_LOOKUP_TABLE + " priority=1100 dl_dst=%s " %mac_addr +
-                                 " actions=output:%s" %of_port + "\n")
+                    flows.append("table=%s" %L2_LOOKUP_TABLE + " priority=1100 dl_dst=%s " %mac_addr +
+                                 " actions=output:%s" %of_port)
 
                     # Add flow rule in L3 look up table. if packet's destination IP matches VM's IP then modify the
                     # packet to set DST MAC = VM's MAC, SRC MAC=tier gateway MAC and send to ingress table. This step
@@ -553,28 +798,17 @@ def configure_vpc_bridge_for_network_topology(bridge, this_host_id, json_config,
                     action_str = "mod_dl_src:%s"%network.gatewaymac + ",mod_dl_dst:%s" % mac_addr + \
                                  ",resubmit(,%s)"%INGRESS_ACL_TABLE
                     action_str = "table=%s"%L3_LOOKUP_TABLE + " ip nw_dst=%s"%ip + " actions=%s" %action_str
-                    ofspec.write(action_str + "\n")
+                    flows.append(action_str)
 
         # add a default rule in L2_LOOKUP_TABLE to send unknown mac address to L2 flooding table
-        ofspec.write("table=%s "%L2_LOOKUP_TABLE + " priority=0 " + " actions=resubmit(,%s)"%L2_FLOOD_TABLE + "\n")
+        flows.append("table=%s "%L2_LOOKUP_TABLE + " priority=0 " + " actions=resubmit(,%s)"%L2_FLOOD_TABLE)
 
         # add a default rule in L3 lookup table to forward (unknown destination IP) packets to L2 lookup table. This
         # is fallback option to send the packet to VPC VR, when routing can not be performed at the host
-        ofspec.write("table=%s "%L3_LOOKUP_TABLE + " priority=0 " + " actions=resubmit(,%s)"%L2_LOOKUP_TABLE + "\n")
-
-        # First flush current L2_LOOKUP_TABLE & L3_LOOKUP_TABLE before re-applying L2 & L3 lookup entries
-        del_flows(bridge, table=L2_LOOKUP_TABLE)
-        del_flows(bridge, table=L3_LOOKUP_TABLE)
-
-        ofspec.seek(0)
-        logging.debug("Adding below flows rules in L2 & L3 lookup tables:\n" + ofspec.read())
-        ofspec.close()
-
-        # update bridge with the flow-rules for L2 lookup and L3 lookup in the file in one attempt
-        do_cmd([OFCTL_PATH, 'add-flows', bridge, ofspec_filename])
+        flows.append("table=%s "%L3_LOOKUP_TABLE + " priority=0 " + " actions=resubmit(,%s)"%L2_LOOKUP_TABLE)
 
-        # now that we updated the bridge with flow rules close and delete the file.
-        os.remove(ofspec_filename)
+        # update bridge with only the L2 lookup and L3 lookup flows that changed since the last update
+        apply_flows(bridge, [L2_LOOKUP_TABLE, L3_LOOKUP_TABLE], flows, sequence_no)
 
         return "SUCCESS: successfully configured bridge as per the VPC topology update with sequence no: %s"%sequence_no
 
@@ -582,10 +816,135 @@ def configure_vpc_bridge_for_network_topology(bridge, this_host_id, json_config,
         error_message = "An unexpected error occurred while configuring bridge " + bridge + \
                         " as per latest VPC topology update with sequence no: %s" %sequence_no
         logging.debug(error_message + " due to " + str(e))
-        if os.path.isfile(ofspec_filename):
-            os.remove(ofspec_filename)
         raise error_message
 
+# Returns the minimal list of tp_dst matches ('value/mask', or just the port when the mask is exact) that covers the
+# port range [start, end]. An empty match (None) is returned for the full 0-65535 range, as it needs no tp_dst match.
+def port_range_to_masks(start, end):
+    start = int(start)
+    end = int(end)
+    matches = []
+    while start <= end:
+        # largest power of two aligned block starting at 'start' that does not go past 'end'
+        size = start & -start or 0x10000
+        while start + size - 1 > end:
+            size >>= 1
+        mask = 0xffff & ~(size - 1)
+        if mask == 0:
+            matches.append(None)
+        elif mask == 0xffff:
+            matches.append("%s" % start)
+        else:
+            matches.append("0x%04x/0x%04x" % (start, mask))
+        start = start + size
+    return matches
+
+def _cidr_to_int(cidr):
+    if '/' in cidr:
+        address, prefix = cidr.split('/', 1)
+        prefix = int(prefix)
+    else:
+        address, prefix = cidr, 32
+    octets = [int(octet) for octet in address.split('.')]
+    if len(octets) != 4 or prefix < 0 or prefix > 32 or [o for o in octets if o < 0 or o > 255]:
+        raise ValueError(cidr)
+    net = (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+    net = net & ~((1 << (32 - prefix)) - 1) & 0xffffffff
+    return net, prefix
+
+def _int_to_cidr(net, prefix):
+    return "%d.%d.%d.%d/%d" % (net >> 24, (net >> 16) & 0xff, (net >> 8) & 0xff, net & 0xff, prefix)
+
+# Merges a list of IPv4 CIDRs into the smallest list of prefixes that covers exactly the same addresses: duplicates
+# and CIDRs contained in another one are dropped and sibling prefixes are joined into their parent. Entries that are
+# not IPv4 CIDRs are passed through as they are.
+def merge_cidrs(cidrs):
+    others = []
+    nets = []
+    for cidr in cidrs:
+        try:
+            nets.append(_cidr_to_int(str(cidr).strip()))
+        except ValueError:
+            others.append(cidr)
+
+    merged = []
+    for net, prefix in sorted(nets):
+        if merged:
+            last_net, last_prefix = merged[-1]
+            if prefix >= last_prefix and (net >> (32 - last_prefix)) == (last_net >> (32 - last_prefix)):
+                continue
+        merged.append((net, prefix))
+        # join the two top entries as long as they are the two halves of the same parent prefix
+        while len(merged) > 1:
+            (net1, prefix1), (net2, prefix2) = merged[-2], merged[-1]
+            if prefix1 != prefix2 or prefix1 == 0 or net1 ^ net2 != 1 << (32 - prefix1) or \
+                    net1 & (1 << (32 - prefix1)):
+                break
+            merged[-2:] = [(net1, prefix1 - 1)]
+
+    return [_int_to_cidr(net, prefix) for net, prefix in merged] + others
+
+# Compiles the ACL items of all the tiers of the VPC into the flow rules of the ingress and egress ACL tables. Port
+# ranges are matched with tp_dst value/mask pairs and the source CIDRs of an ACL item are merged, instead of writing
+# a flow for each port and CIDR.
+def get_vpc_acl_flows(vpconfig):
+    flows = []
+    for tier in vpconfig.tiers:
+        tier_cidr = tier.cidr
+        acl = get_acl(vpconfig, tier.aclid)
+
+        for acl_item in acl.aclitems:
+            protocol = acl_item.protocol
+            if protocol == "all":
+                protocol = "*"
+            elif protocol == "tcp":
+                protocol = "6"
+            elif protocol == "udp":
+                protocol = "17"
+            elif protocol == "icmp":
+                protocol = "1"
+            acl_priority = 1000 + acl_item.number
+            if acl_item.direction == "ingress":
+                matching_table = INGRESS_ACL_TABLE
+                resubmit_table = L2_LOOKUP_TABLE
+            elif acl_item.direction == "egress":
+                matching_table = EGRESS_ACL_TABLE
+                resubmit_table = L3_LOOKUP_TABLE
+            if acl_item.action == "deny":
+                actions = "drop"
+            elif acl_item.action == "allow":
+                actions = "resubmit(,%s)" % resubmit_table
+            else:
+                continue
+
+            if acl_item.sourceportstart is None and acl_item.sourceportend is None:
+                port_matches = [None]
+            else:
+                port_matches = port_range_to_masks(acl_item.sourceportstart, acl_item.sourceportend)
+
+            # a 0.0.0.0 source cidr matches any address, so the flows need no match on the remote address
+            source_cidrs = acl_item.sourcecidrs
+            if [cidr for cidr in source_cidrs if cidr.startswith('0.0.0.0')]:
+                source_cidrs = [None]
+            else:
+                source_cidrs = merge_cidrs(source_cidrs)
+
+            for source_cidr in source_cidrs:
+                if acl_item.direction == "ingress":
+                    nw_match = " nw_dst=%s " % tier_cidr
+                    if source_cidr is not None:
+                        nw_match = " nw_src=%s " % source_cidr + nw_match
+                else:
+                    nw_match = " nw_src=%s " % tier_cidr
+                    if source_cidr is not None:
+                        nw_match = nw_match + " nw_dst=%s " % source_cidr
+
+                for port_match in port_matches:
+                    tp_match = port_match is not None and " tp_dst=%s " % port_match or ""
+                    flows.append("table=%s " % matching_table + " priority=%s " % acl_priority + " ip " +
+                                 tp_match + nw_match + " nw_proto=%s " % protocol + " actions=%s" % actions)
+    return flows
+
 # Configures the bridge created for a VPC that is enabled for distributed firewall. Management server sends VPC routing
 # policy (network ACL applied on the tiers etc) details. Based on the VPC routing policies ingress ACL table and
 # egress ACL tables are updated by this function.
@@ -598,158 +957,17 @@ def configure_vpc_bridge_for_routing_policies(bridge, json_config, sequence_no):
 
     try:
 
-        if not os.path.exists('/var/run/cloud'):
-            os.makedirs('/var/run/cloud')
-
-        # create a temporary file to store OpenFlow rules corresponding to ingress and egress ACL table updates
-        ofspec_filename = "/var/run/cloud/" + bridge + sequence_no + ".ofspec"
-        ofspec = open(ofspec_filename, 'w+')
-
-        tiers = vpconfig.tiers
-        for tier in tiers:
-            tier_cidr = tier.cidr
-            acl = get_acl(vpconfig, tier.aclid)
-            acl_items = acl.aclitems
-
-            for acl_item in acl_items:
-                number = acl_item.number
-                action = acl_item.action
-                direction = acl_item.direction
-                source_port_start = acl_item.sourceportstart
-                source_port_end = acl_item.sourceportend
-                protocol = acl_item.protocol
-                if protocol == "all":
-                    protocol = "*"
-                elif protocol == "tcp":
-                    protocol = "6"
-                elif protocol == "udp":
-                    protocol == "17"
-                elif protocol == "icmp":
-                    protocol == "1"
-                source_cidrs = acl_item.sourcecidrs
-                acl_priority = 1000 + number
-                if direction == "ingress":
-                    matching_table = INGRESS_ACL_TABLE
-                    resubmit_table = L2_LOOKUP_TABLE
-                elif direction == "egress":
-                    matching_table = EGRESS_ACL_TABLE
-                    resubmit_table = L3_LOOKUP_TABLE
-
-                for source_cidr in source_cidrs:
-                    if source_port_start is None and source_port_end is None:
-                        if source_cidr.startswith('0.0.0.0'):
-                            if action == "deny":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_dst=%s " %tier_cidr + " nw_proto=%s " %protocol +
-                                                 " actions=drop" + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_src=%s " %tier_cidr + " nw_proto=%s " %protocol +
-                                                 " actions=drop" + "\n")
-                            if action == "allow":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_dst=%s " %tier_cidr + " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_src=%s " %tier_cidr + " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table + "\n")
-                        else:
-                            if action == "deny":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_src=%s " %source_cidr + " nw_dst=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol + " actions=drop" + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_src=%s " %tier_cidr + " nw_dst=%s " %source_cidr +
-                                                 " nw_proto=%s " %protocol + " actions=drop" + "\n")
-                            if action == "allow":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_src=%s "%source_cidr + " nw_dst=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table  + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " nw_src=%s "%tier_cidr + " nw_dst=%s " %source_cidr +
-                                                 " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table  + "\n")
-                        continue
-
-                    # add flow rule to do action (allow/deny) for flows where source IP of the packet is in
-                    # source_cidr and destination ip is in tier_cidr
-                    port = int(source_port_start)
-                    while (port <= int(source_port_end)):
-                        if source_cidr.startswith('0.0.0.0'):
-                            if action == "deny":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_dst=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol + " actions=drop"  + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_src=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol + " actions=drop" + "\n")
-                            if action == "allow":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_dst=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_src=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table + "\n")
-                        else:
-                            if action == "deny":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_src=%s " %source_cidr +
-                                                 " nw_dst=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol + " actions=drop" + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_src=%s " %tier_cidr +
-                                                 " nw_dst=%s " %source_cidr +
-                                                 " nw_proto=%s " %protocol + " actions=drop" + "\n")
-                            if action == "allow":
-                                if direction == "ingress":
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_src=%s "%source_cidr +
-                                                 " nw_dst=%s " %tier_cidr +
-                                                 " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table  + "\n")
-                                else:
-                                    ofspec.write("table=%s "%matching_table + " priority=%s " %acl_priority + " ip " +
-                                                 " tp_dst=%s " %port + " nw_src=%s "%tier_cidr +
-                                                 " nw_dst=%s " %source_cidr +
-                                                 " nw_proto=%s " %protocol +
-                                                 " actions=resubmit(,%s)"%resubmit_table  + "\n")
-                        port = port + 1
+        # OpenFlow rules corresponding to ingress and egress ACL table updates
+        flows = get_vpc_acl_flows(vpconfig)
 
         # add a default rule in egress table to allow packets (so forward packet to L3 lookup table)
-        ofspec.write("table=%s " %EGRESS_ACL_TABLE + " priority=0 actions=resubmit(,%s)" %L3_LOOKUP_TABLE + "\n")
+        flows.append("table=%s " %EGRESS_ACL_TABLE + " priority=0 actions=resubmit(,%s)" %L3_LOOKUP_TABLE)
 
         # add a default rule in ingress table to drop packets
-        ofspec.write("table=%s " %INGRESS_ACL_TABLE + " priority=0 actions=drop" + "\n")
-
-        # First flush current ingress and egress ACL's before re-applying the ACL's
-        del_flows(bridge, table=EGRESS_ACL_TABLE)
-        del_flows(bridge, table=INGRESS_ACL_TABLE)
-
-        ofspec.seek(0)
-        logging.debug("Adding below flows rules Ingress & Egress ACL tables:\n" + ofspec.read())
-        ofspec.close()
-
-        # update bridge with the flow-rules for ingress and egress ACL's added in the file in one attempt
-        do_cmd([OFCTL_PATH, 'add-flows', bridge, ofspec_filename])
+        flows.append("table=%s " %INGRESS_ACL_TABLE + " priority=0 actions=drop")
 
-        # now that we updated the bridge with flow rules delete the file.
-        os.remove(ofspec_filename)
+        # update bridge with only the ingress and egress ACL flows that changed since the last update
+        apply_flows(bridge, [EGRESS_ACL_TABLE, INGRESS_ACL_TABLE], flows, sequence_no)
 
         return "SUCCESS: successfully configured bridge as per the latest routing policies update with " \
                "sequence no: %s"%sequence_no
@@ -758,8 +976,6 @@ def configure_vpc_bridge_for_routing_policies(bridge, json_config, sequence_no):
         error_message = "An unexpected error occurred while configuring bridge " + bridge + \
                         " as per latest VPC's routing policy update with sequence number %s." %sequence_no
         logging.debug(error_message + " due to " + str(e))
-        if os.path.isfile(ofspec_filename):
-            os.remove(ofspec_filename)
         raise error_message
 
 # configures bridge L2 flooding rules stored in table=2. Single bridge is used for all the tiers of VPC. So controlled
@@ -776,24 +992,20 @@ def update_flooding_rules_on_port_plug_unplug(bridge, interface, command, if_net
                   " is %s"%command + " now.")
     try:
 
-        if not os.path.exists('/var/run/cloud'):
-            os.makedirs('/var/run/cloud')
-
-        # create a temporary file to store OpenFlow rules corresponding L2 flooding table
-        ofspec_filename = "/var/run/cloud/" + bridge + "-" +interface + "-" + command + ".ofspec"
-        ofspec = open(ofspec_filename, 'w+')
+        # OpenFlow rules corresponding L2 flooding table
+        flows = []
 
         all_tiers = dict()
 
-        vsctl_output = do_cmd([VSCTL_PATH, 'list-ports', bridge])
-        ports = vsctl_output.split('\n')
+        ovs = OvsSnapshot()
+        ports = ovs.get_ports(bridge)
 
         for port in ports:
 
-            if_ofport = do_cmd([VSCTL_PATH, 'get', 'Interface', port, 'ofport'])
+            if_ofport = ovs.get_ofport(port)
 
             if port.startswith('vif'):
-                network_id = get_network_id_for_vif(port)
+                network_id = ovs.get_network_id(port)
                 if network_id not in all_tiers.keys():
                     all_tiers[network_id] = tier_ports()
                 tier_ports_info = all_tiers[network_id]
@@ -802,7 +1014,7 @@ def update_flooding_rules_on_port_plug_unplug(bridge, interface, command, if_net
                 all_tiers[network_id] = tier_ports_info
 
             if port.startswith('t'):
-                network_id = get_network_id_for_tunnel_port(port)[1:-1]
+                network_id = ovs.get_network_id(port)
                 if network_id not in all_tiers.keys():
                     all_tiers[network_id] = tier_ports()
                 tier_ports_info = all_tiers[network_id]
@@ -817,8 +1029,8 @@ def update_flooding_rules_on_port_plug_unplug(bridge, interface, command, if_net
             # for a packet arrived from tunnel port, flood only on to VIF ports connected to bridge for this tier
             for port in tier_ports_info.tier_tunnelif_ofports:
                 action = "".join("output:%s," %ofport for ofport in tier_ports_info.tier_vif_ofports)[:-1]
-                ofspec.write("table=%s " %L2_FLOOD_TABLE + " priority=1100 in_port=%s " %port +
-                             "actions=%s " %action + "\n")
+                flows.append("table=%s " %L2_FLOOD_TABLE + " priority=1100 in_port=%s " %port +
+                             "actions=%s " %action)
 
             # for a packet arrived from VIF port send on all VIF and tunnel ports corresponding to the tier excluding
             # the port on which packet arrived
@@ -826,30 +1038,18 @@ def update_flooding_rules_on_port_plug_unplug(bridge, interface, command, if_net
                 tier_all_ofports_copy = copy.copy(tier_ports_info.tier_all_ofports)
                 tier_all_ofports_copy.remove(port)
                 action = "".join("output:%s," %ofport for ofport in tier_all_ofports_copy)[:-1]
-                ofspec.write("table=%s " %L2_FLOOD_TABLE + " priority=1100 in_port=%s " %port +
-                             "actions=%s " %action + "\n")
+                flows.append("table=%s " %L2_FLOOD_TABLE + " priority=1100 in_port=%s " %port +
+                             "actions=%s " %action)
 
         # add a default rule in L2 flood table to drop packet
-        ofspec.write("table=%s " %L2_FLOOD_TABLE + " priority=0 actions=drop")
+        flows.append("table=%s " %L2_FLOOD_TABLE + " priority=0 actions=drop")
 
-        # First flush current L2 flooding table before re-populating the tables
-        del_flows(bridge, table=L2_FLOOD_TABLE)
-
-        ofspec.seek(0)
-        logging.debug("Adding below flows rules L2 flooding table: \n" + ofspec.read())
-        ofspec.close()
-
-        # update bridge with the flow-rules for broadcast rules added in the file in one attempt
-        do_cmd([OFCTL_PATH, 'add-flows', bridge, ofspec_filename])
-
-        # now that we updated the bridge with flow rules delete the file.
-        os.remove(ofspec_filename)
+        # update bridge with only the flooding rules of the tiers whose ports changed
+        apply_flows(bridge, [L2_FLOOD_TABLE], flows)
 
         logging.debug("successfully configured bridge %s as per the latest flooding rules " %bridge)
 
     except Exception,e:
-        if os.path.isfile(ofspec_filename):
-            os.remove(ofspec_filename)
         error_message = "An unexpected error occurred while updating the flooding rules for the bridge " + \
                         bridge + " when interface " + " %s" %interface + " is %s" %command
         logging.debug(error_message + " due to " + str(e))
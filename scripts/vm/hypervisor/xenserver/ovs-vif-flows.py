@@ -93,6 +93,9 @@ def main(command, vif_raw):
 
     ovs_tunnel_network = pluginlib.is_regular_tunnel_network(xs_nw_uuid)
 
+    # ofports and external ids of all the interfaces, instead of an ovs-vsctl call per port
+    ovs = pluginlib.OvsSnapshot()
+
     # handle case where network is reguar tunnel network
     if ovs_tunnel_network == 'True':
         vlan = pluginlib.do_cmd([pluginlib.VSCTL_PATH, 'br-to-vlan', bridge])
@@ -100,14 +103,11 @@ def main(command, vif_raw):
                 # We need the REAL bridge name
                 bridge = pluginlib.do_cmd([pluginlib.VSCTL_PATH,
                                            'br-to-parent', bridge])
-        vsctl_output = pluginlib.do_cmd([pluginlib.VSCTL_PATH,
-                                         'list-ports', bridge])
-        vifs = vsctl_output.split('\n')
+        vifs = ovs.get_ports(bridge)
         vif_ofports = []
         vif_other_ofports = []
         for vif in vifs:
-            vif_ofport = pluginlib.do_cmd([pluginlib.VSCTL_PATH, 'get',
-                                           'Interface', vif, 'ofport'])
+            vif_ofport = ovs.get_ofport(vif)
             if this_vif == vif:
                 this_vif_ofport = vif_ofport
             if vif.startswith('vif'):
@@ -130,7 +130,7 @@ def main(command, vif_raw):
                 # We need the REAL bridge name
                 bridge = pluginlib.do_cmd([pluginlib.VSCTL_PATH,
                                            'br-to-parent', bridge])
-        vif_network_id = pluginlib.get_network_id_for_vif(this_vif)
+        vif_network_id = ovs.get_network_id(this_vif)
         pluginlib.update_flooding_rules_on_port_plug_unplug(bridge, this_vif, command, vif_network_id)
 
     return
@@ -19,7 +19,9 @@
 import pprint
 import XenAPI
 import urllib
-from xml.dom import minidom
+import xml.parsers.expat
+import array
+import threading
 import time
 import commands
 
@@ -93,6 +95,13 @@ class RRDUpdates:
         col = report[param]
         return self.__lookup_data(col, row)
 
+    def get_vm_data_sum(self, uuid, param, start_row, end_row):
+        """Sum of the samples of a VM variable from row start_row up to (not including) end_row"""
+        report = self.vm_reports[uuid]
+        col = report[param]
+        # the samples are stored in document (reverse chronological) order
+        return sum(self.data[col][max(self.rows - end_row, 0):max(self.rows - start_row, 0)])
+
     def get_host_uuid(self):
         report = self.host_report
         if not report:
@@ -113,19 +122,15 @@ class RRDUpdates:
     def get_row_time(self, row):
         return self.__lookup_timestamp(row)
 
-    # extract float from value (<v>) node by col,row
+    # extract float from the value array of col by row
     def __lookup_data(self, col, row):
-        # Note: the <rows> nodes are in reverse chronological order, and comprise
-        # a timestamp <t> node, followed by self.columns data <v> nodes
-        node = self.data_node.childNodes[self.rows - 1 - row].childNodes[col + 1]
-        return float(node.firstChild.toxml())  # node.firstChild should have nodeType TEXT_NODE
+        # Note: the <rows> nodes are in reverse chronological order, and the values are
+        # stored in the same order
+        return self.data[col][self.rows - 1 - row]
 
-    # extract int from value (<t>) node by row
+    # extract int from the timestamp array by row
     def __lookup_timestamp(self, row):
-        # Note: the <rows> nodes are in reverse chronological order, and comprise
-        # a timestamp <t> node, followed by self.columns data <v> nodes
-        node = self.data_node.childNodes[self.rows - 1 - row].childNodes[0]
-        return int(node.firstChild.toxml())  # node.firstChild should have nodeType TEXT_NODE
+        return self.timestamps[self.rows - 1 - row]
 
     def refresh(self, login, starttime, session, override_params):
         self.params['start'] = starttime
@@ -133,48 +138,116 @@ class RRDUpdates:
         params['session_id'] = session
         params.update(self.params)
         paramstr = "&".join(["%s=%s" % (k, params[k]) for k in params])
-        # this is better than urllib.urlopen() as it raises an Exception on http 401 'Unauthorised' error
-        # rather than drop into interactive mode
-	for host in login.host.get_all():
-		#print "http://" + str(login.host.get_address(host)) + "/rrd_updates?%s" % paramstr
-        	sock = urllib.URLopener().open("http://" + str(login.host.get_address(host)) + "/rrd_updates?%s" % paramstr)
-	        xmlsource = sock.read()
-        	sock.close()
-        	xmldoc = minidom.parseString(xmlsource)
-        	self.__parse_xmldoc(xmldoc)
-        	# Update the time used on the next run
-        	self.params['start'] = self.end_time + 1  # avoid retrieving same data twice
-
-    def __parse_xmldoc(self, xmldoc):
-        # The 1st node contains meta data (description of the data)
-        # The 2nd node contains the data
-        self.meta_node = xmldoc.firstChild.childNodes[0]
-        self.data_node = xmldoc.firstChild.childNodes[1]
-
-        def lookup_metadata_bytag(name):
-            return int(self.meta_node.getElementsByTagName(name)[0].firstChild.toxml())
-            # rows = number of samples per variable
-        # columns = number of variables
-        self.rows = lookup_metadata_bytag('rows')
-        self.columns = lookup_metadata_bytag('columns')
+        urls = ["http://" + str(host['address']) + "/rrd_updates?%s" % paramstr
+                for host in login.host.get_all_records().values()]
+        documents = [None] * len(urls)
+        errors = []
+
+        def fetch(index, url):
+            try:
+                # this is better than urllib.urlopen() as it raises an Exception on http 401 'Unauthorised' error
+                # rather than drop into interactive mode
+                sock = urllib.URLopener().open(url)
+                try:
+                    documents[index] = self.__parse(sock)
+                finally:
+                    sock.close()
+            except Exception, e:
+                errors.append(e)
+
+        # fetch the updates of all the hosts of the pool at the same time, and merge them in one report
+        threads = [threading.Thread(target=fetch, args=(index, url)) for index, url in enumerate(urls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        self.__merge(documents)
+        # Update the time used on the next run
+        self.params['start'] = self.end_time + 1  # avoid retrieving same data twice
+
+    def load(self, stream):
+        """Parses an rrd_updates document from a file like object as it is read, keeping the
+        samples of each column in a numeric array instead of building a DOM of the document"""
+        self.__merge([self.__parse(stream)])
+
+    def __parse(self, stream):
+        meta = {}
+        legend = []
+        timestamps = array.array('l')
+        data = []
+        text = []
+        row = {'col': 0}
+
+        def start_element(name, attrs):
+            del text[:]
+            if name == 'row':
+                row['col'] = 0
+
+        def end_element(name):
+            if name == 'v':
+                data[row['col']].append(float("".join(text)))
+                row['col'] += 1
+            elif name == 't':
+                timestamps.append(int("".join(text)))
+            elif name == 'entry':
+                legend.append(str("".join(text)))
+            elif name in ('start', 'step', 'end', 'rows', 'columns'):
+                meta[name] = int("".join(text))
+                if name == 'columns':
+                    # the <meta> node comes before the <data> node
+                    data.extend([array.array('d') for col in range(meta[name])])
+
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = text.append
+        while True:
+            chunk = stream.read(65536)
+            if not chunk:
+                break
+            parser.Parse(chunk, False)
+        parser.Parse("", True)
+
+        meta['legend'] = legend
+        meta['timestamps'] = timestamps
+        meta['data'] = data
+        return meta
+
+    def __merge(self, documents):
+        # rows = number of samples per variable. Rows are looked up from the most recent one, so
+        # only the rows every host has are used
+        # columns = number of variables, of all the hosts
+        self.rows = min([document['rows'] for document in documents])
+        self.columns = sum([document['columns'] for document in documents])
         # These indicate the period covered by the data
-        self.start_time = lookup_metadata_bytag('start')
-        self.step_time = lookup_metadata_bytag('step')
-        self.end_time = lookup_metadata_bytag('end')
-        # the <legend> Node describes the variables
-        self.legend = self.meta_node.getElementsByTagName('legend')[0]
+        self.start_time = min([document['start'] for document in documents])
+        self.step_time = documents[0]['step']
+        self.end_time = max([document['end'] for document in documents])
+        # the legend entries describe the variables
+        self.legend = []
+        self.data = []
+        for document in documents:
+            self.legend.extend(document['legend'])
+            self.data.extend(document['data'])
+        self.timestamps = documents[0]['timestamps']
         # vm_reports matches uuid to per VM report
         if not hasattr(self,'vm_reports'):
-		self.vm_reports = {}
-        # There is just one host_report and its uuid should not change!
-        self.host_report = None
+            self.vm_reports = {}
         # Handle each column.  (I.e. each variable)
-        for col in range(self.columns):
-            self.__handle_col(col)
+        col = 0
+        for document in documents:
+            # There is just one host_report per document and its uuid should not change!
+            self.host_report = None
+            for entry in document['legend']:
+                self.__handle_col(col)
+                col = col + 1
 
     def __handle_col(self, col):
         # work out how to interpret col from the legend
-        col_meta_data = self.legend.childNodes[col].firstChild.toxml()
+        col_meta_data = self.legend[col]
         # vm_or_host will be 'vm' or 'host'.  Note that the Control domain counts as a VM!
         (cf, vm_or_host, uuid, param) = col_meta_data.split(':')
         if vm_or_host == 'vm':
@@ -201,6 +274,15 @@ def getuuid(vm_name):
 	raise PerfMonException("Invalid vm name: %s" % vm_name)
     return output
 
+def get_vm_uuids(login):
+    """Returns the uuids of the VMs of the pool by name, from a single XenAPI call"""
+    vm_uuids = {}
+    for record in login.VM.get_all_records().values():
+        if record['is_a_template'] or record['is_control_domain']:
+            continue
+        vm_uuids[record['name_label']] = record['uuid']
+    return vm_uuids
+
 def get_vm_group_perfmon(args={}):
     login = XenAPI.xapi_local()
     login.login_with_password("","")
@@ -225,11 +307,14 @@ def get_vm_group_perfmon(args={}):
 
     rrd_updates = RRDUpdates()
     rrd_updates.refresh(login.xenapi, now * 60 - max_duration, session, {})
+    vm_uuids = get_vm_uuids(login.xenapi)
 
     #for uuid in rrd_updates.get_vm_list():
     for vm_count in xrange(1, total_vm + 1):
 	vm_name = args['vmname' + str(vm_count)]
-        vm_uuid = getuuid(vm_name)
+        vm_uuid = vm_uuids.get(vm_name)
+        if vm_uuid is None:
+            vm_uuid = getuuid(vm_name)
         #print "Got values for VM: " + str(vm_count) + " " + vm_uuid
         for counter_count in xrange(1, total_counter + 1):
 	    #refresh average
@@ -241,17 +326,16 @@ def get_vm_group_perfmon(args={}):
             duration_diff = total_row - duration
             if counter == "cpu":
 		total_cpu = rrd_updates.get_total_cpu_core(vm_uuid)
-                for row in xrange(duration_diff, total_row):
-                    for cpu in xrange(0, total_cpu):
-                        average_cpu += rrd_updates.get_vm_data(vm_uuid, "cpu" + str(cpu), row)
+                for cpu in xrange(0, total_cpu):
+                    average_cpu += rrd_updates.get_vm_data_sum(vm_uuid, "cpu" + str(cpu), duration_diff, total_row)
                 average_cpu /= (duration * total_cpu)
                 if result == "":
                     result += str(vm_count) + '.' +  str(counter_count) + ':' + str(average_cpu)
                 else:
                     result += ',' + str(vm_count) +  '.' + str(counter_count) + ':' + str(average_cpu)
             elif counter == "memory":
-                for row in xrange(duration_diff, total_row):
-                    average_memory += rrd_updates.get_vm_data(vm_uuid, "memory_target", row) / 1048576 - rrd_updates.get_vm_data(vm_uuid, "memory_internal_free", row) / 1024
+                average_memory += rrd_updates.get_vm_data_sum(vm_uuid, "memory_target", duration_diff, total_row) / 1048576 - \
+                    rrd_updates.get_vm_data_sum(vm_uuid, "memory_internal_free", duration_diff, total_row) / 1024
                 average_memory /= duration
                 if result == "":
                     result += str(vm_count) +  '.' +  str(counter_count) + ':' + str(average_memory)
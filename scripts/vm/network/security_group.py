@@ -22,10 +22,20 @@ from cloudutils.configFileOps import configFileOps
 import logging
 import sys
 import os
-import xml.dom.minidom
+import xml.parsers.expat
 from optparse import OptionParser, OptionGroup, OptParseError, BadOptionError, OptionError, OptionConflictError, OptionValueError
 import re
 import traceback
+import subprocess
+import hashlib
+import fcntl
+import signal
+import time
+import SocketServer
+import threading
+import StringIO
+import json
+import sqlite3
 import libvirt
 
 logpath = "/var/run/cloud/"        # FIXME: Logs should reside in /var/log/cloud
@@ -38,9 +48,197 @@ cfo = configFileOps("/etc/cloudstack/agent/agent.properties")
 hyper = cfo.getEntry("hypervisor.type")
 if hyper == "lxc":
     driver = "lxc:///"
+ipset_rules = cfo.getEntry("network.security.ipset").strip() == "true"
+sockpath = logpath + "security_group.sock"
+pidpath = logpath + "security_group.pid"
+ebtables_lockpath = logpath + "ebtables.lock"
+libvirt_conn = None
+domain_events = False
+domain_interfaces = {}
+rulelogdb = logpath + "security_group.db"
+rulelog_conn = None
 def execute(cmd):
     logging.debug(cmd)
     return bash("-c", cmd).stdout
+
+def restore(cmd, data):
+    logging.debug(' '.join(cmd) + "\n" + data)
+    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True)
+    out, err = p.communicate(data)
+    if p.returncode != 0:
+        e = subprocess.CalledProcessError(p.returncode, cmd)
+        e.stdout, e.stderr = out, err
+        raise e
+    return out
+
+def parse_ebtables_save(text, table="nat"):
+    """Returns the [chain declarations, rules] lines of one table of ebtables-save output"""
+    chains = []
+    rules = []
+    current = None
+    for line in text.split('\n'):
+        line = line.strip()
+        if line == "" or line.startswith('#'):
+            continue
+        if line.startswith('*'):
+            current = line[1:]
+            continue
+        if current != table:
+            continue
+        if line.startswith(':'):
+            chains.append(line)
+        elif line.startswith('-'):
+            rules.append(line)
+    return [chains, rules]
+
+class IptablesSnapshot:
+    """One iptables-save dump of the filter table, indexed by chain, bridge and bridge firewall jump target
+
+    Sweeps over many vms parse a single snapshot instead of running an iptables-save pipeline per lookup.
+    """
+    def __init__(self, text=None):
+        if text is None:
+            text = execute("iptables-save -t filter")
+        self.chains = []
+        self.rules = {}
+        self.bridges = []
+        self.jumps = {}
+        for line in text.split('\n'):
+            line = line.strip()
+            if line.startswith(':'):
+                chain = line[1:].split()[0]
+                self.chains.append(chain)
+                self.rules.setdefault(chain, [])
+            elif line.startswith('-A '):
+                self.index(line)
+
+    def index(self, rule):
+        tokens = rule.split()
+        chain = tokens[1]
+        self.rules.setdefault(chain, []).append(rule)
+        if '--physdev-is-bridged' not in tokens:
+            return
+
+        target = None
+        if '-j' in tokens and tokens.index('-j') + 1 < len(tokens):
+            target = tokens[tokens.index('-j') + 1]
+        if chain == 'FORWARD' and '-o' in tokens and target is not None and target.startswith('BF'):
+            bridge = tokens[tokens.index('-o') + 1]
+            if bridge not in [b for [b, brfw] in self.bridges]:
+                self.bridges.append([bridge, target])
+        if chain.startswith('BF') and target is not None:
+            self.jumps.setdefault(target, []).append(rule)
+
+    def brfw(self, brname):
+        for [bridge, brfw] in self.bridges:
+            if bridge == brname:
+                return brfw
+        return "BF-" + brname
+
+    def bridge(self, default="cloudbr0"):
+        if not self.bridges:
+            return default
+        return self.bridges[0][0]
+
+class IptablesBatch:
+    """Collects the chains and rules of one table and commits them with a single iptables-restore --noflush call
+
+    Chains declared through chain() are created, or flushed when they already exist, as part of the same
+    transaction, so either the whole batch is applied or the kernel keeps the rules it had before.
+    """
+    def __init__(self, table="filter"):
+        self.table = table
+        self.chains = []
+        self.rules = []
+
+    def chain(self, name):
+        if name not in self.chains:
+            self.chains.append(name)
+
+    def add(self, rule):
+        self.rules.append(rule.strip())
+
+    def dump(self):
+        lines = ["*" + self.table]
+        lines += [":%s - [0:0]" % c for c in self.chains]
+        lines += self.rules
+        lines.append("COMMIT")
+        return '\n'.join(lines) + '\n'
+
+    def commit(self):
+        try:
+            restore(["iptables-restore", "--noflush"], self.dump())
+        except subprocess.CalledProcessError, e:
+            logging.debug("iptables-restore failed, previous rules left in place: " + str(e.stderr))
+            return False
+        return True
+
+class EbtablesBatch(IptablesBatch):
+    """Same as IptablesBatch for ebtables
+
+    ebtables-restore replaces the whole table, so the batch is merged into an ebtables-save snapshot of the
+    table: chains passed to remove() or redeclared through chain(), and every rule jumping to them, are dropped
+    from the snapshot before the new chains and rules are appended.
+    """
+    def __init__(self, table="nat"):
+        IptablesBatch.__init__(self, table)
+        self.removed = []
+
+    def remove(self, chains):
+        for c in chains:
+            if c not in self.removed:
+                self.removed.append(c)
+
+    def dump(self):
+        [oldchains, oldrules] = parse_ebtables_save(ebtablessave().stdout, self.table)
+        gone = self.removed + self.chains
+
+        lines = ["*" + self.table]
+        lines += [c for c in oldchains if c[1:].split()[0] not in gone]
+        # user chains created by ebtables -N default to RETURN
+        lines += [":%s RETURN" % c for c in self.chains]
+        for rule in oldrules:
+            tokens = rule.split()
+            if tokens[1] in gone:
+                continue
+            if '-j' in tokens and tokens.index('-j') + 1 < len(tokens) and tokens[tokens.index('-j') + 1] in gone:
+                continue
+            lines.append(rule)
+        lines += self.rules
+        return '\n'.join(lines) + '\n'
+
+    def commit(self):
+        # no other change to the table may happen between the snapshot and the restore, it would be lost
+        lock = lock_ebtables()
+        try:
+            try:
+                restore(["ebtables-restore"], self.dump())
+            except subprocess.CalledProcessError, e:
+                logging.debug("ebtables-restore failed, previous rules left in place: " + str(e.stderr))
+                return False
+        finally:
+            unlock_ebtables(lock)
+        return True
+
+def lock_ebtables():
+    """Serializes the changes to the ebtables nat table made by concurrent security_group.py runs"""
+    if not os.path.exists(logpath):
+        os.makedirs(logpath)
+    lock = open(ebtables_lockpath, "a")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+def unlock_ebtables(lock):
+    fcntl.flock(lock, fcntl.LOCK_UN)
+    lock.close()
+
+def execute_ebtables(cmd):
+    lock = lock_ebtables()
+    try:
+        return execute(cmd)
+    finally:
+        unlock_ebtables(lock)
+
 def can_bridge_firewall(privnic):
     try:
         execute("which iptables")
@@ -62,32 +260,121 @@ def can_bridge_firewall(privnic):
     cleanup_rules()
 
     return True
-'''
-def ipset(ipsetname, proto, start, end, ips):
+def rule_ipset_prefix(vm_name):
+    # ipset names are limited to 31 characters
+    if len(vm_name) > 20:
+        vm_name = hashlib.md5(vm_name).hexdigest()[:20]
+    return vm_name + "-"
+
+def rule_ipset_name(vm_name, ruletype, ips):
+    """Names the set of a rule after its cidrs, so a set never changes content once a chain matches on it"""
+    # prefix (at most 21) + type + 7 hex digits + "-t" of the temporary set fits the 31 characters
+    digest = hashlib.md5(','.join(sorted(ips))).hexdigest()[:7]
+    return rule_ipset_prefix(vm_name) + ruletype.lower() + digest
+
+def load_rule_ipsets(sets):
+    """Loads the cidrs of every [name, cidrs] pair into its hash:net set with a single ipset restore call
+
+    Each set is filled under a temporary name and swapped in, so it never appears half loaded. Sets are named
+    after their content, so the swap leaves the content of a set already in use unchanged.
+    """
+    lines = []
+    for [name, ips] in sets:
+        maxelem = max(65536, len(ips))
+        lines.append("create %s hash:net family inet maxelem %d -exist" % (name, maxelem))
+        lines.append("create %s-t hash:net family inet maxelem %d -exist" % (name, maxelem))
+        lines.append("flush %s-t" % name)
+        lines += ["add %s-t %s -exist" % (name, ip) for ip in ips]
+        lines.append("swap %s-t %s" % (name, name))
+        lines.append("destroy %s-t" % name)
     try:
-        check_call(['ipset', '-N', ipsetname, 'iptreemap'])
-    except:
-        logging.debug("ipset chain already exists" + ipsetname)
+        restore(["ipset", "restore"], '\n'.join(lines) + '\n')
+    except subprocess.CalledProcessError, e:
+        logging.debug("Failed to load rule ipsets: " + str(e.stderr))
+        return False
+    return True
 
-    result = True
-    ipsettmp = ''.join(''.join(ipsetname.split('-')).split('_')) + str(int(time.time()) % 1000)
+def destroy_rule_ipsets(vm_name, sets):
+    """Destroys the rule sets of the vm other than the [name, cidrs] pairs in sets
 
+    Called once the chains of the vm no longer match on them, including after network.security.ipset has been
+    turned off or when the vm is gone.
+    """
+    keep = [name for [name, ips] in sets]
+    # numbered names are the per rule position sets of earlier versions
+    pattern = re.compile("^" + re.escape(rule_ipset_prefix(vm_name)) + "[ie][0-9a-f]+(-t)?$")
     try:
-        check_call(['ipset', '-N', ipsettmp, 'iptreemap'])
-        for ip in ips:
-            try:
-                check_call(['ipset', '-A', ipsettmp, ip])
-            except CommandException, cex:
-                if cex.reason.rfind('already in set') == -1:
-                   raise
-        check_call(['ipset', '-W', ipsettmp, ipsetname])
-        check_call(['ipset', '-X', ipsettmp])
+        existing = execute("ipset list -n").split('\n')
     except:
-        logging.debug("Failed to program ipset " + ipsetname)
-        result = False
+        existing = []
+    lines = []
+    for name in existing:
+        name = name.strip()
+        if pattern.match(name) and name not in keep:
+            lines.append("destroy " + name)
+
+    if not lines:
+        return True
+    try:
+        restore(["ipset", "restore"], '\n'.join(lines) + '\n')
+    except subprocess.CalledProcessError, e:
+        logging.debug("Failed to destroy rule ipsets of vm " + vm_name + ": " + str(e.stderr))
+        return False
+    return True
+
+def get_libvirt_connection():
+    """Returns the read-only libvirt connection shared by all helpers of this process, reopening it if it died"""
+    global libvirt_conn
+    if libvirt_conn is not None:
+        try:
+            if libvirt_conn.isAlive():
+                return libvirt_conn
+        except libvirt.libvirtError:
+            pass
+        libvirt_conn = None
+
+    libvirt_conn = libvirt.openReadOnly(driver)
+    if libvirt_conn == None:
+       print 'Failed to open connection to the hypervisor'
+       sys.exit(3)
+
+    # events of the previous connection may have been missed
+    domain_interfaces.clear()
+    if domain_events:
+        register_domain_events(libvirt_conn)
+    return libvirt_conn
+
+def domain_event_callback(conn, dom, *args):
+    domain_interfaces.pop(dom.name(), None)
+
+def register_domain_events(conn):
+    """Drops cached domain interfaces whenever libvirt reports a lifecycle or device change of the domain"""
+    for event in ['VIR_DOMAIN_EVENT_ID_LIFECYCLE', 'VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED', 'VIR_DOMAIN_EVENT_ID_DEVICE_ADDED']:
+        if hasattr(libvirt, event):
+            conn.domainEventRegisterAny(None, getattr(libvirt, event), domain_event_callback, None)
+
+def run_event_loop():
+    while True:
+        libvirt.virEventRunDefaultImpl()
+
+def virshdomains():
+    """Returns {name: [state, id]} for every domain libvirt knows about, in a single sweep"""
+    conn = get_libvirt_connection()
+    try:
+        alldomains = conn.listAllDomains(0)
+    except AttributeError:
+        alldomains = map(conn.lookupByID, conn.listDomainsID())
+        alldomains += map(conn.lookupByName, conn.listDefinedDomains())
+
+    domains = {}
+    for dom in alldomains:
+        try:
+            domains[dom.name()] = [dom.info()[0], str(dom.ID())]
+        except libvirt.libvirtError:
+            # the domain went away while we were looking at it
+            continue
+    return domains
 
-    return result
-'''
 def virshlist(*states):
 
     libvirt_states={ 'running'  : libvirt.VIR_DOMAIN_RUNNING,
@@ -101,20 +388,10 @@ def virshlist(*states):
 
     searchstates = list(libvirt_states[state] for state in states)
 
-    conn = libvirt.openReadOnly(driver)
-    if conn == None:
-       print 'Failed to open connection to the hypervisor'
-       sys.exit(3)
-
-    alldomains = map(conn.lookupByID, conn.listDomainsID())
-    alldomains += map(conn.lookupByName, conn.listDefinedDomains())
-
     domains = []
-    for domain in alldomains:
-        if domain.info()[0] in searchstates:
-            domains.append(domain.name())
-
-    conn.close()
+    for [name, [state, domid]] in virshdomains().items():
+        if state in searchstates:
+            domains.append(name)
 
     return domains
 
@@ -129,10 +406,7 @@ def virshdomstate(domain):
                      libvirt.VIR_DOMAIN_CRASHED  : 'crashed',
     }
 
-    conn = libvirt.openReadOnly(driver)
-    if conn == None:
-       print 'Failed to open connection to the hypervisor'
-       sys.exit(3)
+    conn = get_libvirt_connection()
 
     try:
         dom = (conn.lookupByName (domain))
@@ -140,16 +414,12 @@ def virshdomstate(domain):
         return None
 
     state = libvirt_states[dom.info()[0]]
-    conn.close()
 
     return state
 
 def virshdumpxml(domain):
 
-    conn = libvirt.openReadOnly(driver)
-    if conn == None:
-       print 'Failed to open connection to the hypervisor'
-       sys.exit(3)
+    conn = get_libvirt_connection()
 
     try:
         dom = (conn.lookupByName (domain))
@@ -157,20 +427,23 @@ def virshdumpxml(domain):
         return None
 
     xml = dom.XMLDesc(0)
-    conn.close()
 
     return xml
 
-def destroy_network_rules_for_vm(vm_name, vif=None):
+def destroy_network_rules_for_vm(vm_name, vif=None, snapshot=None, ebbatch=None):
     vmchain = vm_name
     vmchain_egress = egress_chain_name(vm_name)
     vmchain_default = None
 
-    delete_rules_for_vm_in_bridge_firewall_chain(vm_name)
+    delete_rules_for_vm_in_bridge_firewall_chain(vm_name, snapshot)
     if vm_name.startswith('i-') or vm_name.startswith('r-'):
         vmchain_default = '-'.join(vm_name.split('-')[:-1]) + "-def"
 
-    destroy_ebtables_rules(vmchain, vif)
+    # callers cleaning up many vms collect the ebtables chains and commit them at once
+    if ebbatch is None:
+        destroy_ebtables_rules(vmchain, vif)
+    else:
+        ebbatch.remove(ebtables_chains(vmchain))
 
     try:
         if vmchain_default != None:
@@ -211,6 +484,8 @@ def destroy_network_rules_for_vm(vm_name, vif=None):
     except:
         logging.debug("Ignoring failure to delete ipset " + vmchain)
 
+    destroy_rule_ipsets(vm_name, [])
+
     if vif is not None:
         try:
             dnats = execute("""iptables -t nat -S | awk '/%s/ { sub(/-A/, "-D", $1) ; print }'""" % vif ).split("\n")
@@ -229,117 +504,79 @@ def destroy_network_rules_for_vm(vm_name, vif=None):
 
     return 'true'
 
-def destroy_ebtables_rules(vm_name, vif):
-
-    delcmd = "ebtables -t nat -L PREROUTING | grep " + vm_name
-    delcmds = []
-    try:
-        delcmds = execute(delcmd).split('\n')
-        delcmds.pop()
-        delcmds = ["-D PREROUTING " + x for x in delcmds ]
-    except:
-        pass
-    postcmds = []
-    try:
-        postcmd = "ebtables -t nat -L POSTROUTING | grep " + vm_name
-        postcmds = execute(postcmd).split('\n')
-        postcmds.pop()
-        postcmds = ["-D POSTROUTING " + x for x in postcmds]
-    except:
-        pass
-
-    delcmds += postcmds
+def ebtables_chains(vm_name):
+    return [vm_name+"-in", vm_name+"-out", vm_name+"-in-ips", vm_name+"-out-ips"]
 
-    for cmd in delcmds:
-        try:
-            execute("ebtables -t nat " + cmd)
-        except:
-            logging.debug("Ignoring failure to delete ebtables rules for vm " + vm_name)
-    chains = [vm_name+"-in", vm_name+"-out", vm_name+"-in-ips", vm_name+"-out-ips"]
-    for chain in chains:
-        try:
-            execute("ebtables -t nat -F " + chain)
-            execute("ebtables -t nat -X " + chain)
-        except:
-            logging.debug("Ignoring failure to delete ebtables chain for vm " + vm_name)
+def destroy_ebtables_rules(vm_name, vif):
+    ebbatch = EbtablesBatch()
+    ebbatch.remove(ebtables_chains(vm_name))
+    if not ebbatch.commit():
+        logging.debug("Ignoring failure to delete ebtables rules for vm " + vm_name)
 
-def default_ebtables_rules(vm_name, vm_ip, vm_mac, vif):
+def default_ebtables_rules(vm_name, vm_ip, vm_mac, vif, sec_ips, ebbatch):
     vmchain_in = vm_name + "-in"
     vmchain_out = vm_name + "-out"
     vmchain_in_ips = vm_name + "-in-ips"
     vmchain_out_ips = vm_name + "-out-ips"
 
     for chain in [vmchain_in, vmchain_out, vmchain_in_ips, vmchain_out_ips]:
-        try:
-            execute("ebtables -t nat -N " + chain)
-        except:
-            execute("ebtables -t nat -F " + chain)
+        ebbatch.chain(chain)
 
-    try:
-        # -s ! 52:54:0:56:44:32 -j DROP
-        execute("ebtables -t nat -A PREROUTING -i " + vif + " -j " + vmchain_in)
-        execute("ebtables -t nat -A POSTROUTING -o " + vif + " -j " + vmchain_out)
-        execute("ebtables -t nat -A " + vmchain_in_ips + " -j DROP")
-        execute("ebtables -t nat -A " + vmchain_out_ips + " -j DROP")
-    except:
-        logging.debug("Failed to program default rules")
-        return 'false'
+    # -s ! 52:54:0:56:44:32 -j DROP
+    ebbatch.add("-A PREROUTING -i " + vif + " -j " + vmchain_in)
+    ebbatch.add("-A POSTROUTING -o " + vif + " -j " + vmchain_out)
 
-    try:
-        execute("ebtables -t nat -A " + vmchain_in + " -s ! " + vm_mac + " -j DROP")
-        execute("ebtables -t nat -A " + vmchain_in + " -p ARP -s ! " + vm_mac + " -j DROP")
-        execute("ebtables -t nat -A " + vmchain_in + " -p ARP --arp-mac-src ! " + vm_mac + " -j DROP")
-        if vm_ip is not None:
-            execute("ebtables -t nat -A " + vmchain_in + " -p ARP -j " + vmchain_in_ips)
-            execute("ebtables -t nat -I " + vmchain_in_ips + " -p ARP --arp-ip-src " + vm_ip + " -j RETURN")
-        execute("ebtables -t nat -A " + vmchain_in + " -p ARP --arp-op Request -j ACCEPT")
-        execute("ebtables -t nat -A " + vmchain_in + " -p ARP --arp-op Reply -j ACCEPT")
-        execute("ebtables -t nat -A " + vmchain_in + " -p ARP -j DROP")
-    except:
-        logging.exception("Failed to program default ebtables IN rules")
-        return 'false'
+    ebbatch.add("-A " + vmchain_in + " -s ! " + vm_mac + " -j DROP")
+    ebbatch.add("-A " + vmchain_in + " -p ARP -s ! " + vm_mac + " -j DROP")
+    ebbatch.add("-A " + vmchain_in + " -p ARP --arp-mac-src ! " + vm_mac + " -j DROP")
+    if vm_ip is not None:
+        ebbatch.add("-A " + vmchain_in + " -p ARP -j " + vmchain_in_ips)
+        ebbatch.add("-A " + vmchain_in_ips + " -p ARP --arp-ip-src " + vm_ip + " -j RETURN")
+    ebbatch.add("-A " + vmchain_in + " -p ARP --arp-op Request -j ACCEPT")
+    ebbatch.add("-A " + vmchain_in + " -p ARP --arp-op Reply -j ACCEPT")
+    ebbatch.add("-A " + vmchain_in + " -p ARP -j DROP")
 
-    try:
-        execute("ebtables -t nat -A " + vmchain_out + " -p ARP --arp-op Reply --arp-mac-dst ! " + vm_mac + " -j DROP")
-        if vm_ip is not None:
-            execute("ebtables -t nat -A " + vmchain_out + " -p ARP -j " + vmchain_out_ips )
-            execute("ebtables -t nat -I " + vmchain_out_ips + " -p ARP --arp-ip-dst " + vm_ip + " -j RETURN")
-        execute("ebtables -t nat -A " + vmchain_out + " -p ARP --arp-op Request -j ACCEPT")
-        execute("ebtables -t nat -A " + vmchain_out + " -p ARP --arp-op Reply -j ACCEPT")
-        execute("ebtables -t nat -A " + vmchain_out + " -p ARP -j DROP")
-    except:
-        logging.debug("Failed to program default ebtables OUT rules")
-        return 'false'
+    ebbatch.add("-A " + vmchain_out + " -p ARP --arp-op Reply --arp-mac-dst ! " + vm_mac + " -j DROP")
+    if vm_ip is not None:
+        ebbatch.add("-A " + vmchain_out + " -p ARP -j " + vmchain_out_ips )
+        ebbatch.add("-A " + vmchain_out_ips + " -p ARP --arp-ip-dst " + vm_ip + " -j RETURN")
+    ebbatch.add("-A " + vmchain_out + " -p ARP --arp-op Request -j ACCEPT")
+    ebbatch.add("-A " + vmchain_out + " -p ARP --arp-op Reply -j ACCEPT")
+    ebbatch.add("-A " + vmchain_out + " -p ARP -j DROP")
 
+    ebtables_rules_vmip(vm_name, sec_ips, "-A", ebbatch)
+    ebbatch.add("-A " + vmchain_in_ips + " -j DROP")
+    ebbatch.add("-A " + vmchain_out_ips + " -j DROP")
 
-def default_network_rules_systemvm(vm_name, localbrname):
+def default_network_rules_systemvm(vm_name, localbrname, snapshot=None):
     bridges = getBridges(vm_name)
     domid = getvmId(vm_name)
     vmchain = vm_name
 
-    delete_rules_for_vm_in_bridge_firewall_chain(vm_name)
+    if snapshot is None:
+        snapshot = IptablesSnapshot()
 
-    try:
-        execute("iptables -N " + vmchain)
-    except:
-        execute("iptables -F " + vmchain)
+    batch = IptablesBatch()
+    for cmd in rules_for_vm_in_bridge_firewall_chain(vm_name, snapshot):
+        batch.add(cmd)
+    batch.chain(vmchain)
 
     for bridge in bridges:
         if bridge != localbrname:
             if not addFWFramework(bridge):
                 return False 
-            brfw = getBrfw(bridge)
+            brfw = getBrfw(bridge, snapshot)
             vifs = getVifsForBridge(vm_name, bridge)
             for vif in vifs:
-                try:
-                    execute("iptables -A " + brfw + "-OUT" + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -j " + vmchain)
-                    execute("iptables -A " + brfw + "-IN" + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -j " + vmchain)
-                    execute("iptables -A " + vmchain + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -j RETURN")
-                except:
-                    logging.debug("Failed to program default rules")
-                    return 'false'
+                batch.add("-A " + brfw + "-OUT" + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -j " + vmchain)
+                batch.add("-A " + brfw + "-IN" + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -j " + vmchain)
+                batch.add("-A " + vmchain + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -j RETURN")
 
-    execute("iptables -A " + vmchain + " -j ACCEPT")
+    batch.add("-A " + vmchain + " -j ACCEPT")
+
+    if not batch.commit():
+        logging.debug("Failed to program default rules")
+        return 'false'
 
     if write_rule_log_for_vm(vm_name, '-1', '_ignore_', domid, '_initial_', '-1') == False:
         logging.debug("Failed to log default network rules for systemvm, ignoring")
@@ -416,15 +653,19 @@ def network_rules_vmSecondaryIp(vm_name, ip_secondary, action):
 
     return 'true'
 
-def ebtables_rules_vmip (vmname, ips, action):
+def ebtables_rules_vmip (vmname, ips, action, ebbatch=None):
     vmchain_inips = vmname + "-in-ips"
     vmchain_outips = vmname + "-out-ips"
 
     for ip in ips:
         logging.debug("ip = "+ip)
+        if ebbatch is not None:
+            ebbatch.add(action + " " + vmchain_inips + " -p ARP --arp-ip-src " + ip + " -j RETURN")
+            ebbatch.add(action + " " + vmchain_outips + " -p ARP --arp-ip-dst " + ip + " -j RETURN")
+            continue
         try:
-            execute("ebtables -t nat -I " + vmchain_inips + " -p ARP --arp-ip-src " + ip + " -j RETURN")
-            execute("ebtables -t nat -I " + vmchain_outips + " -p ARP --arp-ip-dst " + ip + " -j RETURN")
+            execute_ebtables("ebtables -t nat -I " + vmchain_inips + " -p ARP --arp-ip-src " + ip + " -j RETURN")
+            execute_ebtables("ebtables -t nat -I " + vmchain_outips + " -p ARP --arp-ip-dst " + ip + " -j RETURN")
         except:
             logging.debug("Failed to program ebtables rules for secondary ip "+ ip)
         continue
@@ -434,30 +675,13 @@ def default_network_rules(vm_name, vm_id, vm_ip, vm_mac, vif, brname, sec_ips):
         return False
 
     vmName = vm_name
-    brfw = getBrfw(brname)
+    snapshot = IptablesSnapshot()
+    brfw = getBrfw(brname, snapshot)
     domID = getvmId(vm_name)
-    delete_rules_for_vm_in_bridge_firewall_chain(vmName)
     vmchain = vm_name
     vmchain_egress = egress_chain_name(vm_name)
     vmchain_default = '-'.join(vmchain.split('-')[:-1]) + "-def"
 
-    destroy_ebtables_rules(vmName, vif)
-
-    try:
-        execute("iptables -N " + vmchain)
-    except:
-        execute("iptables -F " + vmchain)
-
-    try:
-        execute("iptables -N " + vmchain_egress)
-    except:
-        execute("iptables -F " + vmchain_egress)
-
-    try:
-        execute("iptables -N " + vmchain_default)
-    except:
-        execute("iptables -F " + vmchain_default)
-
     action = "-A"
     vmipsetName = vm_name
     #create ipset and add vm ips to that ip set
@@ -482,28 +706,41 @@ def default_network_rules(vm_name, vm_id, vm_ip, vm_mac, vif, brname, sec_ips):
         add_to_ipset(vmipsetName, ips, action)
         if write_secip_log_for_vm(vm_name, sec_ips, vm_id) == False:
             logging.debug("Failed to log default network rules, ignoring")
+    else:
+        ips = []
+
+    batch = IptablesBatch()
+    for cmd in rules_for_vm_in_bridge_firewall_chain(vmName, snapshot):
+        batch.add(cmd)
+    for chain in [vmchain, vmchain_egress, vmchain_default]:
+        batch.chain(chain)
+
+    batch.add("-A " + brfw + "-OUT" + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -j " + vmchain_default)
+    batch.add("-A " + brfw + "-IN" + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -j " + vmchain_default)
+    batch.add("-A " + vmchain_default + " -m state --state RELATED,ESTABLISHED -j ACCEPT")
+    #allow dhcp
+    batch.add("-A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -p udp --dport 67 --sport 68 -j ACCEPT")
+    batch.add("-A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -p udp --dport 68 --sport 67  -j ACCEPT")
+
+    #don't let vm spoof its ip address
+    if vm_ip is not None:
+        batch.add("-A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -m set --set " + vmipsetName + " src -p udp --dport 53  -j RETURN ")
+        batch.add("-A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -m set --set " + vmipsetName + " src -j " + vmchain_egress)
+    batch.add("-A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -j " + vmchain)
+    batch.add("-A " + vmchain + " -j DROP")
 
-    try:
-        execute("iptables -A " + brfw + "-OUT" + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -j " + vmchain_default)
-        execute("iptables -A " + brfw + "-IN" + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -j " + vmchain_default)
-        execute("iptables -A " + vmchain_default + " -m state --state RELATED,ESTABLISHED -j ACCEPT")
-        #allow dhcp
-        execute("iptables -A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -p udp --dport 67 --sport 68 -j ACCEPT")
-        execute("iptables -A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -p udp --dport 68 --sport 67  -j ACCEPT")
-
-        #don't let vm spoof its ip address
-        if vm_ip is not None:
-            execute("iptables -A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -m set --set " + vmipsetName + " src -p udp --dport 53  -j RETURN ")
-            execute("iptables -A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-in " + vif + " -m set --set " + vmipsetName + " src -j " + vmchain_egress)
-        execute("iptables -A " + vmchain_default + " -m physdev --physdev-is-bridged --physdev-out " + vif + " -j " + vmchain)
-        execute("iptables -A " + vmchain + " -j DROP")
-    except:
+    ebbatch = EbtablesBatch()
+    ebbatch.remove(ebtables_chains(vmchain))
+    #default ebtables rules, including the ones for vm secondary ips
+    default_ebtables_rules(vmchain, vm_ip, vm_mac, vif, ips, ebbatch)
+
+    if not batch.commit():
         logging.debug("Failed to program default rules for vm " + vm_name)
         return 'false'
 
-    default_ebtables_rules(vmchain, vm_ip, vm_mac, vif)
-    #default ebtables rules for vm secondary ips
-    ebtables_rules_vmip(vm_name, ips, "-I")
+    if not ebbatch.commit():
+        logging.debug("Failed to program default ebtables rules for vm " + vm_name)
+        return 'false'
 
     if vm_ip is not None:
         if write_rule_log_for_vm(vmName, vm_id, vm_ip, domID, '_initial_', '-1') == False:
@@ -527,85 +764,121 @@ def post_default_network_rules(vm_name, vm_id, vm_ip, vm_mac, vif, brname, dhcpS
         pass
 
     try:
-        execute("ebtables -t nat -I " + vmchain_in + " -p IPv4 --ip-protocol tcp --ip-destination-port 80 --ip-dst " + dhcpSvr + " -j dnat --to-destination " + hostMacAddr)
+        execute_ebtables("ebtables -t nat -I " + vmchain_in + " -p IPv4 --ip-protocol tcp --ip-destination-port 80 --ip-dst " + dhcpSvr + " -j dnat --to-destination " + hostMacAddr)
     except:
         pass
 
     try:
-        execute("ebtables -t nat -I " + vmchain_in + " 4 -p ARP --arp-ip-src ! " + vm_ip + " -j DROP")
+        execute_ebtables("ebtables -t nat -I " + vmchain_in + " 4 -p ARP --arp-ip-src ! " + vm_ip + " -j DROP")
     except:
         pass
     try:
-        execute("ebtables -t nat -I " + vmchain_out + " 2 -p ARP --arp-ip-dst ! " + vm_ip + " -j DROP")
+        execute_ebtables("ebtables -t nat -I " + vmchain_out + " 2 -p ARP --arp-ip-dst ! " + vm_ip + " -j DROP")
     except:
         pass
     if write_rule_log_for_vm(vm_name, vm_id, vm_ip, domID, '_initial_', '-1') == False:
             logging.debug("Failed to log default network rules, ignoring")
-def delete_rules_for_vm_in_bridge_firewall_chain(vmName):
+def rules_for_vm_in_bridge_firewall_chain(vmName, snapshot=None):
     vm_name = vmName
     if vm_name.startswith('i-') or vm_name.startswith('r-'):
 	vm_name = '-'.join(vm_name.split('-')[:-1]) + "-def"
 
     vmchain = vm_name
 
-    delcmd = """iptables-save | awk '/BF(.*)physdev-is-bridged(.*)%s/ { sub(/-A/, "-D", $1) ; print }'""" % vmchain
-    delcmds = execute(delcmd).split('\n')
-    delcmds.pop()
-    for cmd in delcmds:
+    if snapshot is None:
+        snapshot = IptablesSnapshot()
+    return ["-D" + rule[2:] for rule in snapshot.jumps.get(vmchain, [])]
+
+def delete_rules_for_vm_in_bridge_firewall_chain(vmName, snapshot=None):
+    for cmd in rules_for_vm_in_bridge_firewall_chain(vmName, snapshot):
         try:
             execute("iptables " + cmd)
         except:
               logging.exception("Ignoring failure to delete rules for vm " + vmName)
 
+def get_rule_log_db():
+    """Returns the connection to the rule log database, which holds one row per vm with the rules programmed for it
+
+    Rule logs of older versions, kept as one <vm>.log file per vm, are moved into the database the first time it
+    is opened.
+    """
+    global rulelog_conn
+    if rulelog_conn is not None:
+        return rulelog_conn
+
+    if not os.path.exists(logpath):
+        os.makedirs(logpath)
+    conn = sqlite3.connect(rulelogdb, timeout=60)
+    conn.text_factory = str
+    conn.execute("CREATE TABLE IF NOT EXISTS rule_log (vm_name TEXT PRIMARY KEY, vm_id TEXT, vm_ip TEXT, dom_id TEXT, signature TEXT, seqno TEXT)")
+    migrate_rule_logs(conn)
+    conn.commit()
+    rulelog_conn = conn
+    return rulelog_conn
+
+def migrate_rule_logs(conn):
+    for f in os.listdir(logpath):
+        if not f.endswith(".log"):
+            continue
+        logfilename = logpath + f
+        try:
+            log = open(logfilename).readline().rstrip().split(',')
+        except:
+            continue
+        if len(log) != 6 or log[0] != f[:-len(".log")]:
+            continue
+        logging.debug("Migrating rule log file " + logfilename)
+        conn.execute("INSERT OR IGNORE INTO rule_log VALUES (?, ?, ?, ?, ?, ?)", log)
+        os.remove(logfilename)
+
+def read_rule_log(vmName):
+    row = get_rule_log_db().execute("SELECT * FROM rule_log WHERE vm_name = ?", (vmName,)).fetchone()
+    if row is None:
+        return None
+    return list(row)
+
+def read_rule_logs():
+    logs = {}
+    for row in get_rule_log_db().execute("SELECT * FROM rule_log"):
+        logs[row[0]] = list(row)
+    return logs
+
 def rewrite_rule_log_for_vm(vm_name, new_domid):
-    logfilename = logpath + vm_name + ".log"
-    if not os.path.exists(logfilename):
+    log = read_rule_log(vm_name)
+    if log is None:
         return
-    lines = (line.rstrip() for line in open(logfilename))
-
-    [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = ['_', '-1', '_', '-1', '_', '-1']
-    for line in lines:
-        [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = line.split(',')
-        break
 
+    [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = log
     write_rule_log_for_vm(_vmName, _vmID, '0.0.0.0', new_domid, _signature, '-1')
 
-def get_rule_log_for_vm(vmName):
-    vm_name = vmName;
-    logfilename = logpath + vm_name + ".log"
-    if not os.path.exists(logfilename):
+def get_rule_log_for_vm(vmName, logs=None):
+    if logs is None:
+        log = read_rule_log(vmName)
+    else:
+        log = logs.get(vmName)
+    if log is None:
         return ''
 
-    lines = (line.rstrip() for line in open(logfilename))
-
-    [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = ['_', '-1', '_', '-1', '_', '-1']
-    for line in lines:
-        [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = line.split(',')
-        break
-
-    return ','.join([_vmName, _vmID, _vmIP, _domID, _signature, _seqno])
+    return ','.join(log)
 
-def check_domid_changed(vmName):
-    curr_domid = getvmId(vmName)
+def check_domid_changed(vmName, curr_domid=None, logs=None):
+    if curr_domid is None:
+        curr_domid = getvmId(vmName)
     if (curr_domid is None) or (not curr_domid.isdigit()):
         curr_domid = '-1'
 
-    vm_name = vmName;
-    logfilename = logpath + vm_name + ".log"
-    if not os.path.exists(logfilename):
+    if logs is None:
+        log = read_rule_log(vmName)
+    else:
+        log = logs.get(vmName)
+    if log is None:
         return ['-1', curr_domid]
 
-    lines = (line.rstrip() for line in open(logfilename))
-
-    [_vmName,_vmID,_vmIP,old_domid,_signature,_seqno] = ['_', '-1', '_', '-1', '_', '-1']
-    for line in lines:
-        [_vmName,_vmID,_vmIP,old_domid,_signature,_seqno] = line.split(',')
-        break
-
+    [_vmName,_vmID,_vmIP,old_domid,_signature,_seqno] = log
     return [curr_domid, old_domid]
-def network_rules_for_rebooted_vm(vmName):
+def network_rules_for_rebooted_vm(vmName, domid=None, snapshot=None, logs=None):
     vm_name = vmName
-    [curr_domid, old_domid] = check_domid_changed(vm_name)
+    [curr_domid, old_domid] = check_domid_changed(vm_name, domid, logs)
 
     if curr_domid == old_domid:
         return True
@@ -618,65 +891,70 @@ def network_rules_for_rebooted_vm(vmName):
 
     logging.debug("Found a rebooted VM -- reprogramming rules for " + vm_name)
 
-    delete_rules_for_vm_in_bridge_firewall_chain(vm_name)
-
-    brName = execute("iptables-save | awk -F '-j ' '/FORWARD -o(.*)physdev-is-bridged(.*)BF/ {print $2}'").strip()
-    if brName is None or brName is "":
-        brName = "cloudbr0"
-    else:
-        brName = execute("iptables-save |grep physdev-is-bridged |grep FORWARD |grep BF |grep '\-o' |awk '{print $4}' | head -1").strip()
+    if snapshot is None:
+        snapshot = IptablesSnapshot()
+    brName = snapshot.bridge()
 
     if 1 in [ vm_name.startswith(c) for c in ['r-', 's-', 'v-'] ]:
 
-        default_network_rules_systemvm(vm_name, brName)
+        default_network_rules_systemvm(vm_name, brName, snapshot)
         return True
 
     vmchain = vm_name
     vmchain_default = '-'.join(vmchain.split('-')[:-1]) + "-def"
+    brfw = snapshot.brfw(brName)
 
     vifs = getVifs(vmName)
-    logging.debug(vifs, brName)
+    logging.debug("vifs " + str(vifs) + " on " + brName)
+
+    batch = IptablesBatch()
+    for cmd in rules_for_vm_in_bridge_firewall_chain(vm_name, snapshot):
+        batch.add(cmd)
     for v in vifs:
-        execute("iptables -A " + getBrfw(brName) + "-IN " + " -m physdev --physdev-is-bridged --physdev-in " + v + " -j "+ vmchain_default)
-        execute("iptables -A " + getBrfw(brName) + "-OUT " + " -m physdev --physdev-is-bridged --physdev-out " + v + " -j "+ vmchain_default)
+        batch.add("-A " + brfw + "-IN " + " -m physdev --physdev-is-bridged --physdev-in " + v + " -j "+ vmchain_default)
+        batch.add("-A " + brfw + "-OUT " + " -m physdev --physdev-is-bridged --physdev-out " + v + " -j "+ vmchain_default)
 
     #change antispoof rule in vmchain
-    try:
-        delcmd = """iptables-save | awk '/-A %s(.*)physdev/ { sub(/-A/, "-D", $1) ; print }'""" % vmchain_default
-        inscmd = """iptables-save | awk '/-A %s(.*)physdev/ { gsub(/vnet[0-9]+/, "%s") ; sub(/-A/, "-D", $1) ; print }'""" % ( vmchain_default,vifs[0] )
-        ipts = []
-        for cmd in [delcmd, inscmd]:
-            logging.debug(cmd)
-            cmds = execute(cmd).split('\n')
-            cmds.pop()
-            for c in cmds:
-                    ipt = "iptables " + c
-                    ipts.append(ipt)
-
-        for ipt in ipts:
-            try:
-                execute(ipt)
-            except:
-                logging.debug("Failed to rewrite antispoofing rules for vm " + vm_name)
-    except:
+    if vifs and vmchain_default in snapshot.rules:
+        batch.chain(vmchain_default)
+        for rule in snapshot.rules[vmchain_default]:
+            batch.add(re.sub(r'vnet[0-9]+', vifs[0], rule))
+    else:
         logging.debug("No rules found for vm " + vm_name)
 
+    if not batch.commit():
+        logging.debug("Failed to rewrite rules for rebooted vm " + vm_name)
+
     rewrite_rule_log_for_vm(vm_name, curr_domid)
     return True
 
 def get_rule_logs_for_vms():
-    vms = virshlist('running')
+    domains = virshdomains()
 
     result = []
     try:
-        for name in vms:
+        snapshot = IptablesSnapshot()
+        logs = read_rule_logs()
+        rebooted = False
+        vms = []
+        for [name, [state, domid]] in domains.items():
+            if state != libvirt.VIR_DOMAIN_RUNNING:
+                continue
             name = name.rstrip()
             if 1 not in [ name.startswith(c) for c in ['r-', 's-', 'v-', 'i-'] ]:
                 continue
-            network_rules_for_rebooted_vm(name)
+            [curr_domid, old_domid] = check_domid_changed(name, domid, logs)
+            if curr_domid != old_domid:
+                rebooted = network_rules_for_rebooted_vm(name, domid, snapshot, logs) or rebooted
             if name.startswith('i-'):
-                log = get_rule_log_for_vm(name)
-                result.append(log)
+                vms.append(name)
+
+        # rebooted vms got their rule log rewritten
+        if rebooted:
+            logs = read_rule_logs()
+        for name in vms:
+            log = get_rule_log_for_vm(name, logs)
+            result.append(log)
     except:
         logging.debug("Failed to get rule logs, better luck next time!")
 
@@ -688,41 +966,37 @@ def cleanup_rules_for_dead_vms():
 
 def cleanup_rules():
     try:
-        chainscmd = """iptables-save | grep -P '^:(?!.*-(def|eg))' | awk '{sub(/^:/, "", $1) ; print $1}'"""
-        chains = execute(chainscmd).split('\n')
-        cleanup = []
-        for chain in chains:
-            if 1 in [ chain.startswith(c) for c in ['r-', 'i-', 's-', 'v-'] ]:
-                vm_name = chain
-
-                result = virshdomstate(vm_name)
-
-                if result == None or len(result) == 0:
-                    logging.debug("chain " + chain + " does not correspond to a vm, cleaning up iptable rules")
-                    cleanup.append(vm_name)
-                    continue
-                if not (result == "running" or result == "paused"):
-                    logging.debug("vm " + vm_name + " is not running or paused, cleaning up iptable rules")
-                    cleanup.append(vm_name)
-
-        chainscmd = """ebtables-save | awk '/:i/ { gsub(/(^:|-(in|out|ips))/, "") ; print $1}'"""
-        chains = execute(chainscmd).split('\n')
-        for chain in chains:
-            if 1 in [ chain.startswith(c) for c in ['r-', 'i-', 's-', 'v-'] ]:
-                vm_name = chain
+        domains = virshdomains()
+        snapshot = IptablesSnapshot()
+        vms = []
+        for chain in snapshot.chains:
+            if re.search('-(def|eg)$', chain):
+                continue
+            vms.append(chain)
 
-                result = virshdomstate(vm_name)
+        [ebchains, ebrules] = parse_ebtables_save(ebtablessave().stdout)
+        for chain in ebchains:
+            vm_name = re.sub('-(in|out)(-ips)?$', '', chain[1:].split()[0])
+            if vm_name not in vms:
+                vms.append(vm_name)
 
-                if result == None or len(result) == 0:
-                    logging.debug("chain " + chain + " does not correspond to a vm, cleaning up ebtable rules")
+        cleanup = []
+        for vm_name in vms:
+            if 1 in [ vm_name.startswith(c) for c in ['r-', 'i-', 's-', 'v-'] ]:
+                if vm_name not in domains:
+                    logging.debug("chain " + vm_name + " does not correspond to a vm, cleaning up rules")
                     cleanup.append(vm_name)
                     continue
-                if not (result == "running" or result == "paused"):
-                    logging.debug("vm " + vm_name + " is not running or paused, cleaning up ebtable rules")
+                if domains[vm_name][0] not in [libvirt.VIR_DOMAIN_RUNNING, libvirt.VIR_DOMAIN_PAUSED]:
+                    logging.debug("vm " + vm_name + " is not running or paused, cleaning up rules")
                     cleanup.append(vm_name)
 
-        for vmname in cleanup:
-            destroy_network_rules_for_vm(vmname)
+        if cleanup:
+            ebbatch = EbtablesBatch()
+            for vmname in cleanup:
+                destroy_network_rules_for_vm(vmname, None, snapshot, ebbatch)
+            if not ebbatch.commit():
+                logging.debug("Failed to cleanup ebtables rules")
 
         logging.debug("Cleaned up rules for " + str(len(cleanup)) + " chains")
     except:
@@ -730,55 +1004,38 @@ def cleanup_rules():
 
 def check_rule_log_for_vm(vmName, vmId, vmIP, domID, signature, seqno):
     vm_name = vmName;
-    logfilename = logpath + vm_name + ".log"
-    if not os.path.exists(logfilename):
-        return [True, True, True, True, True, True]
-
     try:
-        lines = (line.rstrip() for line in open(logfilename))
+        log = read_rule_log(vm_name)
     except:
-        logging.debug("failed to open " + logfilename)
+        logging.exception("Failed to read rule log for vm " + vm_name)
         return [True, True, True, True, True, True]
-
-    [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = ['_', '-1', '_', '-1', '_', '-1']
-    try:
-        for line in lines:
-            [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = line.split(',')
-            break
-    except:
-        logging.debug("Failed to parse log file for vm " + vm_name)
-        remove_rule_log_for_vm(vm_name)
+    if log is None:
         return [True, True, True, True, True, True]
 
+    [_vmName,_vmID,_vmIP,_domID,_signature,_seqno] = log
     return [(vm_name != _vmName), (vmId != _vmID), (vmIP != _vmIP), (domID != _domID), (signature != _signature),(seqno != _seqno)]
 
 def write_rule_log_for_vm(vmName, vmID, vmIP, domID, signature, seqno):
-    vm_name = vmName
-    logfilename = logpath + vm_name + ".log"
-    logging.debug("Writing log to " + logfilename)
-    logf = open(logfilename, 'w')
-    output = ','.join([vmName, vmID, vmIP, str(domID), signature, seqno])
+    logging.debug("Writing rule log for " + vmName)
     result = True
     try:
-        logf.write(output)
-        logf.write('\n')
+        db = get_rule_log_db()
+        db.execute("INSERT OR REPLACE INTO rule_log VALUES (?, ?, ?, ?, ?, ?)", [str(x) for x in [vmName, vmID, vmIP, domID, signature, seqno]])
+        db.commit()
     except:
-        logging.debug("Failed to write to rule log file " + logfilename)
+        logging.exception("Failed to write rule log for vm " + vmName)
         result = False
 
-    logf.close()
-
     return result
 
 def remove_rule_log_for_vm(vmName):
-    vm_name = vmName
-    logfilename = logpath + vm_name + ".log"
-
     result = True
     try:
-        os.remove(logfilename)
+        db = get_rule_log_db()
+        db.execute("DELETE FROM rule_log WHERE vm_name = ?", (vmName,))
+        db.commit()
     except:
-        logging.debug("Failed to delete rule log file " + logfilename)
+        logging.debug("Failed to delete rule log for vm " + vmName)
         result = False
 
     return result
@@ -786,35 +1043,18 @@ def remove_rule_log_for_vm(vmName):
 def egress_chain_name(vm_name):
     return vm_name + "-eg"
 
-def add_network_rules(vm_name, vm_id, vm_ip, signature, seqno, vmMac, rules, vif, brname, sec_ips):
-  try:
-    vmName = vm_name
-    domId = getvmId(vmName)
-
-    changes = []
-    changes = check_rule_log_for_vm(vmName, vm_id, vm_ip, domId, signature, seqno)
-
-    if not 1 in changes:
-        logging.debug("Rules already programmed for vm " + vm_name)
-        return 'true'
+def build_network_rules(vm_name, lines, use_ipset=False):
+    """Builds the ingress and egress chains of a vm from its rule lines
 
-    if changes[0] or changes[1] or changes[2] or changes[3]:
-        default_network_rules(vmName, vm_id, vm_ip, vmMac, vif, brname, sec_ips)
-
-    if rules == "" or rules == None:
-        lines = []
-    else:
-        lines = rules.split(';')[:-1]
-
-    logging.debug("    programming network rules for IP: " + vm_ip + " vmname=" + vm_name)
-    try:
-      vmchain = vm_name
-      execute("iptables -F " + vmchain)
-      egress_vmchain = egress_chain_name(vm_name)
-      execute("iptables -F " + egress_vmchain)
-    except:
-      logging.debug("Error flushing iptables rules for " + vmchain + ". Presuming firewall rules deleted, re-initializing." )
-      default_network_rules(vm_name, vm_id, vm_ip, vmMac, vif, brname)
+    Returns the IptablesBatch holding both chains and the [ipset name, cidrs] pairs it matches on. When use_ipset
+    is set, the cidrs of each rule are matched through one hash:net set instead of one iptables rule per cidr.
+    """
+    vmchain = vm_name
+    egress_vmchain = egress_chain_name(vm_name)
+    batch = IptablesBatch()
+    batch.chain(vmchain)
+    batch.chain(egress_vmchain)
+    sets = []
     egressrule = 0
     for line in lines:
 
@@ -842,41 +1082,89 @@ def add_network_rules(vm_name, vm_id, vm_ip, signature, seqno, vmMac, rules, vif
             i = ips.index('0.0.0.0/0')
             del ips[i]
             allow_any = True
+        if use_ipset and ips:
+            setname = rule_ipset_name(vm_name, ruletype, ips)
+            if setname not in [name for [name, cidrs] in sets]:
+                sets.append([setname, ips])
+            matches = ["-m set --match-set " + setname + (direction == "-s" and " src" or " dst")]
+        else:
+            matches = [direction + " " + ip for ip in ips]
         range = start + ":" + end
-        if ips:
+        if matches:
             if protocol == 'all':
-                for ip in ips:
-                    execute("iptables -I " + vmchain + " -m state --state NEW " + direction + " " + ip + " -j "+action)
+                for match in matches:
+                    batch.add("-I " + vmchain + " -m state --state NEW " + match + " -j "+action)
             elif protocol != 'icmp':
-                for ip in ips:
-                    execute("iptables -I " + vmchain + " -p " + protocol + " -m " + protocol + " --dport " + range + " -m state --state NEW " + direction + " " + ip + " -j "+ action)
+                for match in matches:
+                    batch.add("-I " + vmchain + " -p " + protocol + " -m " + protocol + " --dport " + range + " -m state --state NEW " + match + " -j "+ action)
             else:
                 range = start + "/" + end
                 if start == "-1":
                     range = "any"
-                for ip in ips:
-                    execute("iptables -I " + vmchain + " -p icmp --icmp-type " + range + " " + direction + " " + ip + " -j "+ action)
+                for match in matches:
+                    batch.add("-I " + vmchain + " -p icmp --icmp-type " + range + " " + match + " -j "+ action)
 
         if allow_any and protocol != 'all':
             if protocol != 'icmp':
-                execute("iptables -I " + vmchain + " -p " + protocol + " -m " + protocol + " --dport " + range + " -m state --state NEW -j "+ action)
+                batch.add("-I " + vmchain + " -p " + protocol + " -m " + protocol + " --dport " + range + " -m state --state NEW -j "+ action)
             else:
                 range = start + "/" + end
                 if start == "-1":
                     range = "any"
-                execute("iptables -I " + vmchain + " -p icmp --icmp-type " + range + " -j "+action)
+                batch.add("-I " + vmchain + " -p icmp --icmp-type " + range + " -j "+action)
 
     egress_vmchain = egress_chain_name(vm_name)
     if egressrule == 0 :
-        iptables = "iptables -A " + egress_vmchain + " -j RETURN"
-        execute(iptables)
+        batch.add("-A " + egress_vmchain + " -j RETURN")
+    else:
+        batch.add("-A " + egress_vmchain + " -j DROP")
+
+    vmchain = vm_name
+    batch.add("-A " + vmchain + " -j DROP")
+
+    return [batch, sets]
+
+def add_network_rules(vm_name, vm_id, vm_ip, signature, seqno, vmMac, rules, vif, brname, sec_ips):
+  try:
+    vmName = vm_name
+    domId = getvmId(vmName)
+
+    changes = []
+    changes = check_rule_log_for_vm(vmName, vm_id, vm_ip, domId, signature, seqno)
+
+    if not 1 in changes:
+        logging.debug("Rules already programmed for vm " + vm_name)
+        return 'true'
+
+    if changes[0] or changes[1] or changes[2] or changes[3]:
+        default_network_rules(vmName, vm_id, vm_ip, vmMac, vif, brname, sec_ips)
+
+    if rules == "" or rules == None:
+        lines = []
     else:
-        iptables = "iptables -A " + egress_vmchain + " -j DROP"
-        execute(iptables)
+        lines = rules.split(';')[:-1]
 
+    logging.debug("    programming network rules for IP: " + vm_ip + " vmname=" + vm_name)
     vmchain = vm_name
-    iptables = "iptables -A " + vmchain + " -j DROP"
-    execute(iptables)
+    egress_vmchain = egress_chain_name(vm_name)
+    try:
+      execute("iptables -n -L " + vmchain)
+      execute("iptables -n -L " + egress_vmchain)
+    except:
+      logging.debug("Error listing iptables rules for " + vmchain + ". Presuming firewall rules deleted, re-initializing." )
+      default_network_rules(vm_name, vm_id, vm_ip, vmMac, vif, brname, sec_ips)
+
+    # Both chains are rebuilt in memory and swapped in by a single iptables-restore call, once the sets they
+    # match on are fully loaded
+    [batch, sets] = build_network_rules(vm_name, lines, ipset_rules)
+    if sets and not load_rule_ipsets(sets):
+        return 'false'
+
+    if not batch.commit():
+        logging.debug("Failed to program network rules for vm " + vm_name + ", keeping previous rules")
+        return 'false'
+
+    destroy_rule_ipsets(vm_name, sets)
 
     if write_rule_log_for_vm(vmName, vm_id, vm_ip, domId, signature, seqno) == False:
         return 'false'
@@ -886,74 +1174,69 @@ def add_network_rules(vm_name, vm_id, vm_ip, signature, seqno, vmMac, rules, vif
     exceptionText = traceback.format_exc()
     logging.debug("Failed to network rule !: " + exceptionText)
 
-def getVifs(vmName):
-    vifs = []
+def getInterfaces(vmName):
+    """Returns [vif, bridge, mac] for every interface of a domain
+
+    The domain XML is only fetched and parsed once, later queries are answered from domain_interfaces until the
+    domain changes (daemon mode) or the process exits.
+    """
+    if vmName in domain_interfaces:
+        return domain_interfaces[vmName]
+
     xmlfile = virshdumpxml(vmName)
     if xmlfile == None:
-        return vifs
+        return []
+
+    interfaces = []
+    current = []
+    def start_element(name, attrs):
+        if name == 'interface':
+            current.append({})
+        elif current and name in ['target', 'source', 'mac'] and name not in current[-1]:
+            current[-1][name] = attrs
+    def end_element(name):
+        if name == 'interface':
+            nic = current.pop()
+            interfaces.append([str(nic.get('target', {}).get('dev', '').strip()),
+                               str(nic.get('source', {}).get('bridge', '').strip()),
+                               str(nic.get('mac', {}).get('address', '').strip())])
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.Parse(xmlfile, True)
+
+    domain_interfaces[vmName] = interfaces
+    return interfaces
 
-    dom = xml.dom.minidom.parseString(xmlfile)
-    for network in dom.getElementsByTagName("interface"):
-        target = network.getElementsByTagName('target')[0]
-        nicdev = target.getAttribute("dev").strip()
-        vifs.append(nicdev)
-    return vifs
+def getVifs(vmName):
+    return [vif for [vif, bridge, mac] in getInterfaces(vmName)]
 
 def getVifsForBridge(vmName, brname):
-    vifs = []
-    xmlfile = virshdumpxml(vmName)
-    if xmlfile == None:
-        return vifs
-
-    dom = xml.dom.minidom.parseString(xmlfile)
-    for network in dom.getElementsByTagName("interface"):
-        source = network.getElementsByTagName('source')[0]
-        bridge = source.getAttribute("bridge").strip()
-        if bridge == brname:
-            target = network.getElementsByTagName('target')[0]
-            nicdev = target.getAttribute("dev").strip()
-            vifs.append(nicdev)
-    return list(set(vifs))
+    return list(set([vif for [vif, bridge, mac] in getInterfaces(vmName) if bridge == brname]))
 
 def getBridges(vmName):
-    bridges = []
-    xmlfile = virshdumpxml(vmName)
-    if xmlfile == None:
-        return bridges
-
-    dom = xml.dom.minidom.parseString(xmlfile)
-    for network in dom.getElementsByTagName("interface"):
-        for source in network.getElementsByTagName('source'):
-            bridge = source.getAttribute("bridge").strip()
-            bridges.append(bridge)
-    return list(set(bridges))
+    return list(set([bridge for [vif, bridge, mac] in getInterfaces(vmName)]))
 
 def getvmId(vmName):
 
-    conn = libvirt.openReadOnly(driver)
-    if conn == None:
-       print 'Failed to open connection to the hypervisor'
-       sys.exit(3)
+    conn = get_libvirt_connection()
 
     try:
         dom = (conn.lookupByName (vmName))
     except libvirt.libvirtError:
         return None
 
-    conn.close()
-
     res = dom.ID()
     if isinstance(res, int):
         res = str(res)
     return res
 
-def getBrfw(brname):
-    cmd = "iptables-save |grep physdev-is-bridged |grep FORWARD |grep BF |grep '\-o' | grep -w " + brname  + "|awk '{print $9}' | head -1"
-    brfwname = bash("-c", cmd).stdout.strip()
-    if brfwname == "":
-        brfwname = "BF-" + brname
-    return brfwname
-    
+def getBrfw(brname, snapshot=None):
+    if snapshot is None:
+        snapshot = IptablesSnapshot()
+    return snapshot.brfw(brname)
+
 def addFWFramework(brname):
     try:
         cfo = configFileOps("/etc/sysctl.conf")
@@ -1007,8 +1290,105 @@ def addFWFramework(brname):
             return False
         return False
 
-if __name__ == '__main__':
-    logging.basicConfig(filename="/var/log/cloudstack/agent/security_group.log", format="%(asctime)s - %(message)s", level=logging.DEBUG)
+class CommandHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        args = json.loads(self.rfile.readline())
+        [status, output] = run_in_daemon(args)
+        self.wfile.write(json.dumps({'status': status, 'output': output}) + '\n')
+
+def run_in_daemon(args):
+    logging.debug("Running " + ' '.join(args))
+    out = StringIO.StringIO()
+    status = 0
+    sys.stdout = out
+    if not domain_events:
+        domain_interfaces.clear()
+    try:
+        try:
+            run_command(args)
+        except SystemExit, e:
+            status = e.code or 0
+        except:
+            logging.exception("Failed to run " + ' '.join(args))
+            status = 1
+    finally:
+        sys.stdout = sys.__stdout__
+    return [status, out.getvalue()]
+
+def stop_daemon():
+    """Stops the daemon started by an earlier run_daemon, if it is still running"""
+    try:
+        pid = int(open(pidpath).read().strip())
+        cmdline = open("/proc/%d/cmdline" % pid).read()
+    except (IOError, ValueError):
+        return
+    if "security_group.py" not in cmdline or pid == os.getpid():
+        return
+    logging.debug("Stopping security group daemon " + str(pid))
+    try:
+        os.kill(pid, signal.SIGTERM)
+        for i in range(50):
+            os.kill(pid, 0)
+            time.sleep(0.1)
+        os.kill(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+def daemonize():
+    """Detaches from the caller, which exits once the daemon writes to the returned pipe"""
+    [r, w] = os.pipe()
+    if os.fork() > 0:
+        os.close(w)
+        ready = os.read(r, 1)
+        if ready != '1':
+            os._exit(1)
+        os._exit(0)
+    os.close(r)
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    os.chdir("/")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in [0, 1, 2]:
+        os.dup2(devnull, fd)
+    os.close(devnull)
+    return w
+
+def run_daemon():
+    """Serves commands sent by security_group_client.py one at a time, keeping libvirt connection and state across them.
+    Replaces a daemon that is already running and returns once the new one is listening."""
+    global domain_events
+    stop_daemon()
+    ready = daemonize()
+    try:
+        libvirt.virEventRegisterDefaultImpl()
+        get_libvirt_connection()
+        register_domain_events(libvirt_conn)
+        t = threading.Thread(target=run_event_loop)
+        t.setDaemon(True)
+        t.start()
+        domain_events = True
+    except:
+        logging.exception("Unable to watch libvirt domain events, domain interfaces are cached per command")
+
+    if not os.path.exists(logpath):
+        os.makedirs(logpath)
+    if os.path.exists(sockpath):
+        os.remove(sockpath)
+    SocketServer.UnixStreamServer.request_queue_size = 128
+    server = SocketServer.UnixStreamServer(sockpath, CommandHandler)
+    os.chmod(sockpath, 0600)
+    open(pidpath, "w").write(str(os.getpid()))
+    logging.debug("Security group daemon listening on " + sockpath)
+    os.write(ready, '1')
+    os.close(ready)
+    try:
+        server.serve_forever()
+    finally:
+        os.remove(sockpath)
+        os.remove(pidpath)
+
+def run_command(argv):
     parser = OptionParser()
     parser.add_option("--vmname", dest="vmName")
     parser.add_option("--vmip", dest="vmIP")
@@ -1025,7 +1405,7 @@ if __name__ == '__main__':
     parser.add_option("--hostMacAddr", dest="hostMacAddr")
     parser.add_option("--nicsecips", dest="nicSecIps")
     parser.add_option("--action", dest="action")
-    (option, args) = parser.parse_args()
+    (option, args) = parser.parse_args(argv)
     if len(args) == 0:
         logging.debug("No command to execute")
         sys.exit(1)
@@ -1051,3 +1431,11 @@ if __name__ == '__main__':
     else:
         logging.debug("Unknown command: " + cmd)
         sys.exit(1)
+
+if __name__ == '__main__':
+    logging.basicConfig(filename="/var/log/cloudstack/agent/security_group.log", format="%(asctime)s - %(message)s", level=logging.DEBUG)
+    args = sys.argv[1:]
+    if args == ["daemon"]:
+        run_daemon()
+    else:
+        run_command(args)
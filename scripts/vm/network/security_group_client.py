@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+# Thin client for 'security_group.py daemon': forwards its arguments over the
+# daemon's socket and only starts security_group.py itself when no daemon answers.
+# Keep the imports to the standard library, this runs once per agent call.
+
+import logging
+import sys
+import os
+import socket
+import json
+
+sockpath = "/var/run/cloud/security_group.sock"
+connect_timeout = 5
+reply_timeout = 600
+
+def send_to_daemon(args):
+    """Runs a command through the daemon, returns [status, output] or None when no daemon answered"""
+    if not os.path.exists(sockpath):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    data = []
+    try:
+        try:
+            s.settimeout(connect_timeout)
+            s.connect(sockpath)
+            s.settimeout(reply_timeout)
+            s.sendall(json.dumps(args) + '\n')
+            while True:
+                d = s.recv(65536)
+                if not d:
+                    break
+                data.append(d)
+        except socket.error, e:
+            logging.debug("Security group daemon did not answer: " + str(e))
+            return None
+    finally:
+        s.close()
+
+    try:
+        reply = json.loads(''.join(data))
+        return [reply['status'], reply['output']]
+    except (ValueError, KeyError, TypeError):
+        logging.debug("Bad reply from security group daemon: " + repr(''.join(data)))
+        return None
+
+if __name__ == '__main__':
+    logging.basicConfig(filename="/var/log/cloudstack/agent/security_group.log", format="%(asctime)s - %(message)s", level=logging.DEBUG)
+    args = sys.argv[1:]
+    result = send_to_daemon(args)
+    if result is None:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "security_group.py")
+        os.execv(sys.executable, [sys.executable, script] + args)
+    [status, output] = result
+    sys.stdout.write(output)
+    sys.exit(status)
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+# Compares per-cidr iptables rules with ipset backed rules for security groups
+# with 10, 1k and 10k cidrs: the number of rules a packet has to traverse in
+# the vm chain, and the time taken to build and (with --apply, as root) to
+# program the chains on this host. security_group.py is loaded from
+# scripts/vm/network of this source tree.
+
+import logging
+import os
+import sys
+import time
+from optparse import OptionParser
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                                'scripts', 'vm', 'network'))
+import security_group as sg
+
+bench_vm = "i-0-0-BENCH"
+
+def make_rules(count):
+    cidrs = ["10.%d.%d.0/24" % (i / 256 % 256, i % 256) for i in range(count)]
+    return ["I:tcp:22:22:" + ",".join(cidrs) + ","]
+
+def chain_length(batch, chain):
+    return len([r for r in batch.rules if r.split()[1] == chain])
+
+def cleanup():
+    for chain in [bench_vm, sg.egress_chain_name(bench_vm)]:
+        try:
+            sg.execute("iptables -F " + chain)
+            sg.execute("iptables -X " + chain)
+        except:
+            pass
+    sg.destroy_rule_ipsets(bench_vm, [])
+
+def program_legacy(lines):
+    [batch, sets] = sg.build_network_rules(bench_vm, lines)
+    for chain in batch.chains:
+        sg.execute("iptables -N " + chain)
+    for rule in batch.rules:
+        sg.execute("iptables " + rule)
+
+def program(lines, use_ipset):
+    [batch, sets] = sg.build_network_rules(bench_vm, lines, use_ipset)
+    if sets and not sg.load_rule_ipsets(sets):
+        raise Exception("failed to load ipsets")
+    if not batch.commit():
+        raise Exception("iptables-restore failed")
+    sg.destroy_rule_ipsets(bench_vm, sets)
+
+def timed(f, *args):
+    start = time.time()
+    f(*args)
+    return time.time() - start
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("--apply", dest="apply", action="store_true", default=False, help="program the rules on this host (needs root)")
+    parser.add_option("--legacy", dest="legacy", action="store_true", default=False, help="also time one iptables call per rule")
+    parser.add_option("--sizes", dest="sizes", default="10,1000,10000")
+    (option, args) = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print "%8s %-8s %12s %10s %12s" % ("cidrs", "mode", "chain rules", "build(s)", "program(s)")
+    for count in [int(n) for n in option.sizes.split(',')]:
+        lines = make_rules(count)
+        for mode in ["per-cidr", "ipset"]:
+            use_ipset = (mode == "ipset")
+            start = time.time()
+            [batch, sets] = sg.build_network_rules(bench_vm, lines, use_ipset)
+            build = time.time() - start
+
+            programming = "-"
+            if option.apply:
+                cleanup()
+                programming = "%.3f" % timed(program, lines, use_ipset)
+                cleanup()
+            print "%8d %-8s %12d %10.3f %12s" % (count, mode, chain_length(batch, bench_vm), build, programming)
+
+        if option.apply and option.legacy:
+            cleanup()
+            programming = "%.3f" % timed(program_legacy, lines)
+            cleanup()
+            print "%8d %-8s %12d %10s %12s" % (count, "legacy", count + 1, "-", programming)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+# Parses a synthetic rrd_updates document (as returned by a host with --vms VMs) with the minidom based parser
+# perfmon.py used to have and with the current streaming parser, and reports the time taken to parse the document
+# and compute the cpu/memory window averages of every VM, and the peak memory of the process doing it.
+# perfmon.py is loaded from scripts/vm/hypervisor/xenserver of this source tree.
+
+import os
+import sys
+import random
+import resource
+import time
+from StringIO import StringIO
+from optparse import OptionParser
+from xml.dom import minidom
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                                'scripts', 'vm', 'hypervisor', 'xenserver'))
+import perfmon
+
+vm_params = ["cpu0", "cpu1", "cpu2", "cpu3", "memory", "memory_target", "memory_internal_free",
+             "vif_0_rx", "vif_0_tx", "vbd_xvda_read", "vbd_xvda_write", "vbd_xvda_read_latency"]
+host_params = ["cpu%d" % i for i in range(16)] + ["memory_total_kib", "memory_free_kib", "loadavg",
+               "pif_eth0_rx", "pif_eth0_tx", "pif_eth1_rx", "pif_eth1_tx", "xapi_memory_usage_kib"]
+
+def make_document(vms, rows, step=60):
+    random.seed(vms)
+    legend = ["AVERAGE:vm:%08d-0000-0000-0000-000000000000:%s" % (vm, param) for vm in range(vms) for param in vm_params]
+    legend += ["AVERAGE:host:ffffffff-0000-0000-0000-000000000000:%s" % param for param in host_params]
+    end = int(time.time()) / step * step
+    doc = ["<xport><meta><start>%d</start><step>%d</step><end>%d</end><rows>%d</rows><columns>%d</columns><legend>"
+           % (end - rows * step, step, end, rows, len(legend))]
+    doc.extend("<entry>%s</entry>" % entry for entry in legend)
+    doc.append("</legend></meta><data>")
+    for row in range(rows):
+        doc.append("<row><t>%d</t>" % (end - row * step))
+        doc.extend("<v>%.10e</v>" % random.random() for col in legend)
+        doc.append("</row>")
+    doc.append("</data></xport>")
+    return "".join(doc)
+
+# window averages of every VM, as get_vm_group_perfmon computes them
+def averages(rrd, rows, lookup):
+    result = []
+    for uuid in sorted(rrd.vm_reports.keys()):
+        report = rrd.vm_reports[uuid]
+        cpus = [report[param] for param in report if param.startswith("cpu")]
+        cpu = sum([lookup(col, row) for col in cpus for row in range(rows)]) / (rows * len(cpus))
+        memory = sum([lookup(report["memory_target"], row) / 1048576 -
+                      lookup(report["memory_internal_free"], row) / 1024 for row in range(rows)]) / rows
+        result.append((cpu, memory))
+    return result
+
+def legacy(document, rows):
+    xmldoc = minidom.parseString(document)
+    meta_node = xmldoc.firstChild.childNodes[0]
+    data_node = xmldoc.firstChild.childNodes[1]
+    nrows = int(meta_node.getElementsByTagName('rows')[0].firstChild.toxml())
+    rrd = perfmon.RRDUpdates()
+    rrd.vm_reports = {}
+    for col, entry in enumerate(meta_node.getElementsByTagName('legend')[0].childNodes):
+        (cf, vm_or_host, uuid, param) = entry.firstChild.toxml().split(':')
+        if vm_or_host == 'vm':
+            rrd.vm_reports.setdefault(uuid, perfmon.VMReport(uuid))[param] = col
+    def lookup(col, row):
+        return float(data_node.childNodes[nrows - 1 - row].childNodes[col + 1].firstChild.toxml())
+    return averages(rrd, rows, lookup)
+
+def streaming(document, rows):
+    rrd = perfmon.RRDUpdates()
+    rrd.load(StringIO(document))
+    return averages(rrd, rows, rrd._RRDUpdates__lookup_data)
+
+def run(f, document, rows):
+    # fork, so that the peak memory of each parser is measured on its own
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        start = time.time()
+        result = f(document, rows)
+        elapsed = time.time() - start
+        os.write(write_fd, repr((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, hash(str(result)))))
+        os._exit(0)
+    os.close(write_fd)
+    output = os.read(read_fd, 4096)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return eval(output)
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("--vms", dest="vms", type="int", default=150)
+    parser.add_option("--rows", dest="rows", type="int", default=60)
+    parser.add_option("--window", dest="window", type="int", default=10, help="rows averaged per counter")
+    (option, args) = parser.parse_args()
+
+    document = make_document(option.vms, option.rows)
+    print "%d vms, %d columns, %d rows, %.1f MB document" % (option.vms, option.vms * len(vm_params) + len(host_params),
+                                                            option.rows, len(document) / 1048576.0)
+    print "%-10s %10s %16s" % ("parser", "time(s)", "peak rss(MB)")
+    results = []
+    for name, f in [("minidom", legacy), ("streaming", streaming)]:
+        elapsed, maxrss, result = run(f, document, option.window)
+        results.append(result)
+        print "%-10s %10.3f %16.1f" % (name, elapsed, maxrss / 1024.0)
+    if results[0] != results[1]:
+        print "WARNING: the parsers computed different averages"
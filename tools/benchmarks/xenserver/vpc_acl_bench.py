@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+# Compares the number of flows the ingress/egress ACL tables of a distributed routing VPC bridge need when every
+# port of a port range and every source cidr gets its own flow, with the tp_dst value/mask and merged cidr flows
+# generated by cloudstack_pluginlib. With --bridge, also times 'ovs-ofctl add-flows' of both sets on that (scratch)
+# bridge. cloudstack_pluginlib is loaded from scripts/vm/hypervisor/xenserver of this source tree.
+
+import os
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                                'scripts', 'vm', 'hypervisor', 'xenserver'))
+import cloudstack_pluginlib as lib
+
+def acl_item(number, action, direction, protocol, start, end, cidrs):
+    return {"number": number, "action": action, "direction": direction, "protocol": protocol,
+            "sourceportstart": start, "sourceportend": end, "sourcecidrs": cidrs}
+
+# ACL sets as they show up in practice: a handful of well known ports, some application port ranges, a few office
+# networks given as adjacent /24s and a full 'allow everything from the vpc' range.
+def acl_sets():
+    office = ["192.168.%d.0/24" % i for i in range(16)]
+    partners = ["203.0.113.%d/32" % i for i in range(0, 64)]
+    return [
+        ("web", [acl_item(1, "allow", "ingress", "tcp", 80, 80, ["0.0.0.0/0"]),
+                 acl_item(2, "allow", "ingress", "tcp", 443, 443, ["0.0.0.0/0"]),
+                 acl_item(3, "allow", "ingress", "tcp", 22, 22, office)]),
+        ("app", [acl_item(1, "allow", "ingress", "tcp", 8000, 8999, office),
+                 acl_item(2, "allow", "ingress", "udp", 30000, 32767, partners),
+                 acl_item(3, "deny", "egress", "tcp", 6000, 6063, ["0.0.0.0/0"])]),
+        ("intra-vpc", [acl_item(1, "allow", "ingress", "tcp", 1, 65535, ["10.1.0.0/24", "10.1.1.0/24"]),
+                       acl_item(2, "allow", "egress", "tcp", 1024, 65535, ["10.1.0.0/24", "10.1.1.0/24"])]),
+    ]
+
+def vpc_config(items):
+    return lib.jsonLoader({"tiers": [{"cidr": "10.1.2.0/24", "aclid": "acl"}],
+                           "acls": [{"id": "acl", "aclitems": items}]})
+
+# per port and per cidr expansion, as the ACL tables used to be programmed
+def legacy_flows(vpconfig):
+    protocols = {"tcp": 6, "udp": 17}
+    flows = []
+    for tier in vpconfig.tiers:
+        for item in lib.get_acl(vpconfig, tier.aclid).aclitems:
+            table = item.direction == "ingress" and lib.INGRESS_ACL_TABLE or lib.EGRESS_ACL_TABLE
+            for cidr in item.sourcecidrs:
+                for port in range(int(item.sourceportstart), int(item.sourceportend) + 1):
+                    flows.append("table=%s priority=%s ip tp_dst=%s nw_src=%s nw_dst=%s nw_proto=%s actions=drop"
+                                 % (table, 1000 + item.number, port, cidr, tier.cidr, protocols[item.protocol]))
+    return flows
+
+def add_flows(bridge, flows):
+    lib.del_flows(bridge, table=lib.EGRESS_ACL_TABLE)
+    lib.del_flows(bridge, table=lib.INGRESS_ACL_TABLE)
+    fd, ofspec_filename = tempfile.mkstemp(suffix=".ofspec")
+    ofspec = os.fdopen(fd, 'w')
+    ofspec.write("\n".join(flows) + "\n")
+    ofspec.close()
+    start = time.time()
+    try:
+        lib.do_cmd([lib.OFCTL_PATH, 'add-flows', bridge, ofspec_filename])
+    finally:
+        os.remove(ofspec_filename)
+    return time.time() - start
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option("--bridge", dest="bridge", default=None, help="scratch bridge to time add-flows on")
+    (option, args) = parser.parse_args()
+
+    print "%-10s %-8s %8s %10s %14s" % ("acl", "mode", "flows", "build(s)", "add-flows(s)")
+    for name, items in acl_sets():
+        vpconfig = vpc_config(items)
+        for mode, build in [("legacy", legacy_flows), ("masked", lib.get_vpc_acl_flows)]:
+            start = time.time()
+            flows = build(vpconfig)
+            elapsed = time.time() - start
+            programming = "-"
+            if option.bridge:
+                programming = "%.3f" % add_flows(option.bridge, flows)
+            print "%-10s %-8s %8d %10.3f %14s" % (name, mode, len(flows), elapsed, programming)
+    sys.exit(0)
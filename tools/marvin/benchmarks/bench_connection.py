@@ -0,0 +1,125 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+'''
+Micro-benchmark of API calls/sec against a local stub management server:
+a new connection per call (plain requests.get, as CSConnection used to do)
+versus CSConnection.marvinRequest over its pooled keep-alive session.
+
+    python bench_connection.py [--calls N] [--threads N]
+'''
+
+import BaseHTTPServer
+import SocketServer
+import copy
+import logging
+import threading
+import time
+from optparse import OptionParser
+
+import requests
+from marvin.cloudstackConnection import CSConnection
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    body = '{"listzonesresponse": {"count": 1, "zone": [{"id": "1"}]}}'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class mgmtDetails(object):
+
+    def __init__(self, port):
+        self.mgtSvrIp = "127.0.0.1"
+        self.port = port
+        self.apiKey = "apikey"
+        self.securityKey = "secretkey"
+        self.user = None
+        self.passwd = None
+        self.useHttps = "False"
+        self.certCAPath = "NA"
+        self.certPath = "NA"
+
+
+class listZonesCmd(object):
+
+    def __init__(self):
+        self.isAsync = "false"
+        self.required = []
+
+
+def run(threads, calls, f):
+    def work():
+        for i in range(calls / threads):
+            f()
+    workers = [threading.Thread(target=work) for i in range(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return calls / (time.time() - start)
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("--calls", dest="calls", type="int", default=2000)
+    parser.add_option("--threads", dest="threads", type="int", default=1)
+    (options, args) = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    t = threading.Thread(target=server.serve_forever)
+    t.setDaemon(True)
+    t.start()
+
+    logger = logging.getLogger("bench")
+    logger.setLevel(logging.CRITICAL)
+    conn = CSConnection(mgmtDetails(server.server_address[1]), logger=logger,
+                        poolSize=options.threads)
+    url = conn.baseUrl
+    payload = {"command": "listZones", "response": "json"}
+
+    unpooled = run(options.threads, options.calls,
+                   lambda: requests.get(url, params=payload))
+    connections = [copy.copy(conn) for i in range(options.threads)]
+    local = threading.local()
+
+    def pooled():
+        if not hasattr(local, "conn"):
+            local.conn = connections.pop()
+        local.conn.marvinRequest(listZonesCmd())
+    pooled = run(options.threads, options.calls, pooled)
+
+    print "threads=%d calls=%d" % (options.threads, options.calls)
+    print "new connection per call : %8.1f calls/sec" % unpooled
+    print "pooled CSConnection     : %8.1f calls/sec" % pooled
+    server.shutdown()
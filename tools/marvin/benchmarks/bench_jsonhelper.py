@@ -0,0 +1,146 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+'''
+Memory/time benchmark of jsonHelper.getResultObj on a large list response
+(listVirtualMachines with N entries): the previous eager jsonLoader, which
+built an object per nested dict up front, against the lazy slot based one.
+
+Each loader is timed for parsing the body and building the result, reading
+.id of every entry and then a nested attribute (nic[0].ipaddress) of every
+entry. Memory is the size of the object graph reachable from the parsed
+body and the result while both are alive (peak), and from the result alone
+once every entry has been read.
+
+    python bench_jsonhelper.py [--items N] [--rounds N]
+'''
+
+import gc
+import json
+import sys
+import time
+from optparse import OptionParser
+
+from marvin import jsonHelper
+
+
+class eagerLoader(object):
+
+    '''jsonLoader as it was before it became lazy.'''
+
+    def __init__(self, obj):
+        for k in obj:
+            v = obj[k]
+            if isinstance(v, dict):
+                setattr(self, k, eagerLoader(v))
+            elif isinstance(v, (list, tuple)):
+                if len(v) > 0 and isinstance(v[0], dict):
+                    setattr(self, k, [eagerLoader(elem) for elem in v])
+                else:
+                    setattr(self, k, v)
+            else:
+                setattr(self, k, v)
+
+    def __getattr__(self, val):
+        if val in self.__dict__:
+            return self.__dict__[val]
+        else:
+            return None
+
+
+def makeResponse(items):
+    vms = []
+    for i in range(items):
+        vms.append({
+            "id": "d2e4d724-e089-4e59-be8e-%012d" % i,
+            "name": "i-2-%d-TEST" % i, "displayname": "i-2-%d-TEST" % i,
+            "account": "admin", "domainid": "8cfafe79", "domain": "ROOT",
+            "created": "2012-01-15T18:30:11+0530", "state": "Running",
+            "haenable": False, "zoneid": "30a397e2",
+            "zonename": "Sandbox-simulator", "hostid": "cc0105aa",
+            "templateid": "d92570fa", "serviceofferingid": "3734d632",
+            "cpunumber": 1, "cpuspeed": 100, "memory": 128,
+            "securitygroup": [{"id": "1", "name": "default",
+                               "description": "Default Security Group"}],
+            "nic": [{"id": "4d3ab903-%d" % i, "networkid": "faeb7f24",
+                     "netmask": "255.255.240.0", "gateway": "10.6.240.1",
+                     "ipaddress": "10.6.%d.%d" % (i / 256 % 256, i % 256),
+                     "traffictype": "Guest", "type": "Isolated",
+                     "isdefault": True, "macaddress": "02:00:04:74:00:09"}],
+            "tags": [],
+            "hypervisor": "Simulator"})
+    return json.dumps({"listvirtualmachinesresponse":
+                       {"count": items, "virtualmachine": vms}})
+
+
+def graphSize(obj):
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, type):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        stack.extend(gc.get_referents(o))
+    return size
+
+
+def run(loader, hook, body, rounds):
+    jsonHelper.jsonLoader = loader
+    timings = {"build": 0.0, "ids": 0.0, "nested": 0.0}
+    for i in range(rounds):
+        start = time.time()
+        parsed = json.loads(body, object_pairs_hook=hook)
+        vms = jsonHelper.getResultObj(parsed, None)
+        timings["build"] += time.time() - start
+        peakSize = graphSize([parsed, vms])
+        del parsed
+
+        start = time.time()
+        [vm.id for vm in vms]
+        timings["ids"] += time.time() - start
+
+        start = time.time()
+        [vm.nic[0].ipaddress for vm in vms]
+        timings["nested"] += time.time() - start
+        size = graphSize(vms)
+    for k in timings:
+        timings[k] = timings[k] / rounds
+    return timings, peakSize, size
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("--items", dest="items", type="int", default=10000)
+    parser.add_option("--rounds", dest="rounds", type="int", default=5)
+    (options, args) = parser.parse_args()
+
+    lazyLoader = jsonHelper.jsonLoader
+    body = makeResponse(options.items)
+    print "%d virtual machines, %d bytes of JSON" % (options.items, len(body))
+    print "%-6s %10s %10s %10s %14s %14s" % ("loader", "build(ms)",
+                                            "ids(ms)", "nested(ms)",
+                                            "mem peak(KB)", "mem read(KB)")
+    for name, loader, hook in [("eager", eagerLoader, None),
+                               ("lazy", lazyLoader, jsonHelper.internKeys)]:
+        timings, peakSize, size = run(loader, hook, body, options.rounds)
+        print "%-6s %10.1f %10.1f %10.1f %14d %14d" % (
+            name, timings["build"] * 1000, timings["ids"] * 1000,
+            timings["nested"] * 1000, peakSize / 1024, size / 1024)
+    jsonHelper.jsonLoader = lazyLoader
@@ -0,0 +1,110 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+'''
+Micro-benchmark of the request signing cost in CSConnection: the previous
+zip/sort/lower/quote implementation against the current one, and the
+signature cache hit for repeated (e.g. queryAsyncJobResult) payloads.
+
+    python bench_signing.py [--requests N]
+'''
+
+import base64
+import hashlib
+import hmac
+import time
+import urllib
+from optparse import OptionParser
+
+from marvin.cloudstackConnection import CSConnection
+
+
+class mgmtDetails(object):
+
+    def __init__(self):
+        self.mgtSvrIp = "127.0.0.1"
+        self.port = 8080
+        self.apiKey = "mQYzBEsU0ZUq2AZcPtDAYDuu4BUxA9uUrZbhHKxNaijXZq7XsvFr" \
+                      "WcZ5xvDIYLFkKWHZxmF5MKnhnDHo4zw5Jw"
+        self.securityKey = "lB8dNUO2NIMq9HzGH6AMeHuyEVYpuFNVQfEJeh2jAeoVkr" \
+                           "BCb7JxJ5N-cjr0nRrR6OcYmGsy6yhFq91jrjdKQQ"
+        self.user = None
+        self.passwd = None
+        self.useHttps = "False"
+        self.certCAPath = "NA"
+        self.certPath = "NA"
+
+
+def legacySign(securityKey, payload):
+    params = zip(payload.keys(), payload.values())
+    params.sort(key=lambda k: str.lower(k[0]))
+    hash_str = "&".join(
+        ["=".join(
+            [str.lower(r[0]),
+             str.lower(
+                 urllib.quote_plus(str(r[1]))
+            ).replace("+", "%20")]
+        ) for r in params]
+    )
+    return base64.encodestring(hmac.new(
+        securityKey, hash_str, hashlib.sha1).digest()).strip()
+
+
+def payloads(n):
+    for i in range(n):
+        yield {"command": "deployVirtualMachine", "response": "json",
+               "apiKey": "key", "zoneid": "zone-%d" % i,
+               "serviceofferingid": "f7c0e2b4-1f3a-4c4b-9d5e-2c1f0a6b7e8d",
+               "templateid": "a1b2c3d4-0000-1111-2222-333344445555",
+               "displayname": "vm %d" % i, "name": "vm-%d" % i}
+
+
+def timed(n, f):
+    start = time.time()
+    for payload in payloads(n):
+        f(payload)
+    return (time.time() - start) / n * 1e6
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("--requests", dest="requests", type="int",
+                      default=100000)
+    (options, args) = parser.parse_args()
+    n = options.requests
+
+    details = mgmtDetails()
+    conn = CSConnection(details)
+    sign = conn._CSConnection__sign
+    for payload in payloads(10):
+        assert sign(dict(payload)) == legacySign(details.securityKey,
+                                                 payload)
+
+    print "legacy signing          : %6.2f us/request" % \
+        timed(n, lambda p: legacySign(details.securityKey, p))
+    print "current signing         : %6.2f us/request" % timed(n, sign)
+
+    poll = {"command": "queryAsyncJobResult", "response": "json",
+            "apiKey": "key", "jobid": "b4f6d6a4-8e0b-4d8e-9f5c-3a2d1e0f9a8b"}
+    for version in [None, 3]:
+        conn = CSConnection(details, signatureVersion=version)
+        signPayload = conn._CSConnection__signPayload
+        start = time.time()
+        for i in range(n):
+            signPayload(dict(poll))
+        print "repeated poll, sigv%-4s : %6.2f us/request" % \
+            (version or 2, (time.time() - start) / n * 1e6)
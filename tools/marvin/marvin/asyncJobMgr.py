@@ -40,7 +40,6 @@ class jobStatus(object):
         self.startTime = None
         self.endTime = None
         self.duration = None
-        self.jobId = None
         self.responsecls = None
 
     def __str__(self):
@@ -50,80 +49,57 @@ class jobStatus(object):
 
 class workThread(threading.Thread):
 
-    def __init__(self, in_queue, outqueue, apiClient, db=None, lock=None):
+    def __init__(self, in_queue, outqueue, apiClient):
         threading.Thread.__init__(self)
         self.inqueue = in_queue
         self.output = outqueue
+        '''
+        every worker talks to the management server over its own copy of
+        the connection, so requests of different workers run in parallel
+        and no lock is held around them
+        '''
         self.connection = apiClient.connection.__copy__()
-        self.db = None
-        self.lock = lock
-
-    def queryAsynJob(self, job):
-        if job.jobId is None:
-            return job
-
-        try:
-            self.lock.acquire()
-            result = self.connection.poll(job.jobId, job.responsecls).jobresult
-        except cloudstackException.CloudstackAPIException as e:
-            result = str(e)
-        finally:
-            self.lock.release()
-
-        job.result = result
-        return job
 
     def executeCmd(self, job):
         cmd = job.cmd
 
         jobstatus = jobStatus()
-        jobId = None
+        jobstatus.startTime = datetime.datetime.now()
+        start = time.time()
         try:
-            self.lock.acquire()
-
-            if cmd.isAsync == "false":
-                jobstatus.startTime = datetime.datetime.now()
-
-                result = self.connection.marvin_request(cmd)
-                jobstatus.result = result
-                jobstatus.endTime = datetime.datetime.now()
-                jobstatus.duration =\
-                    time.mktime(jobstatus.endTime.timetuple()) - time.mktime(
-                        jobstatus.startTime.timetuple())
-            else:
-                result = self.connection.marvinRequest(cmd)
-                if result is None:
-                    jobstatus.status = False
-                else:
-                    jobId = result.jobid
-                    jobstatus.jobId = jobId
-                    try:
-                        responseName =\
-                            cmd.__class__.__name__.replace("Cmd", "Response")
-                        jobstatus.responsecls =\
-                            jsonHelper.getclassFromName(cmd, responseName)
-                    except:
-                        pass
-                    jobstatus.status = True
+            if cmd.isAsync == "true":
+                try:
+                    responseName =\
+                        cmd.__class__.__name__.replace("Cmd", "Response")
+                    jobstatus.responsecls =\
+                        jsonHelper.getclassFromName(cmd, responseName)
+                except:
+                    pass
+            '''
+            marvinRequest returns the job result of async commands once the
+            job completed
+            '''
+            jobstatus.result = self.connection.marvinRequest(
+                cmd, response_type=jobstatus.responsecls)
+            jobstatus.status = True
         except cloudstackException.CloudstackAPIException as e:
             jobstatus.result = str(e)
             jobstatus.status = False
         except:
             jobstatus.status = False
             jobstatus.result = sys.exc_info()
-        finally:
-            self.lock.release()
+        jobstatus.endTime = datetime.datetime.now()
+        jobstatus.duration = time.time() - start
 
         return jobstatus
 
     def run(self):
-        while self.inqueue.qsize() > 0:
-            job = self.inqueue.get()
-            if isinstance(job, jobStatus):
-                jobstatus = self.queryAsynJob(job)
-            else:
-                jobstatus = self.executeCmd(job)
-
+        while True:
+            try:
+                job = self.inqueue.get_nowait()
+            except Queue.Empty:
+                break
+            jobstatus = self.executeCmd(job)
             self.output.put(jobstatus)
             self.inqueue.task_done()
 
@@ -162,6 +138,7 @@ class asyncJobMgr(object):
         self.outqueue = Queue.Queue()
         self.apiClient = apiClient
         self.db = db
+        self.latencyPercentiles = {}
 
     def submitCmds(self, cmds):
         if not self.inqueue.empty():
@@ -177,38 +154,19 @@ class asyncJobMgr(object):
             ids.append(id)
         return ids
 
-    def updateTimeStamp(self, jobstatus):
-        jobId = jobstatus.jobId
-        if jobId is not None and self.db is not None:
-            result = self.db.execute(
-                "select job_status, created, last_updated from async_job where\
- id='%s'" % str(jobId))
-            if result is not None and len(result) > 0:
-                if result[0][0] == 1:
-                    jobstatus.status = True
-                else:
-                    jobstatus.status = False
-                    jobstatus.startTime = result[0][1]
-                    jobstatus.endTime = result[0][2]
-                    delta = jobstatus.endTime - jobstatus.startTime
-                    jobstatus.duration = delta.total_seconds()
-
-    def waitForComplete(self, workers=10):
+    def waitForComplete(self):
+        '''
+            wait until every submitted command completed, the results are
+            collected in self.outqueue by the workers
+        '''
         self.inqueue.join()
-        lock = threading.Lock()
-        resultQueue = Queue.Queue()
-        '''intermediate result is stored in self.outqueue'''
-        for i in range(workers):
-            worker = workThread(self.outqueue, resultQueue, self.apiClient,
-                                self.db, lock)
-            worker.start()
-
-        self.outqueue.join()
 
         asyncJobResult = []
-        while resultQueue.qsize() > 0:
-            jobstatus = resultQueue.get()
-            self.updateTimeStamp(jobstatus)
+        while True:
+            try:
+                jobstatus = self.outqueue.get_nowait()
+            except Queue.Empty:
+                break
             asyncJobResult.append(jobstatus)
 
         return asyncJobResult
@@ -216,16 +174,41 @@ class asyncJobMgr(object):
     def submitCmdsAndWait(self, cmds, workers=10):
         '''
             put commands into a queue at first, then start workers numbers
-            threads to execute this commands
+            threads to execute this commands concurrently. The latency
+            percentiles of the commands are logged and kept in
+            self.latencyPercentiles
         '''
         self.submitCmds(cmds)
-        lock = threading.Lock()
-        for i in range(workers):
-            worker = workThread(self.inqueue, self.outqueue, self.apiClient,
-                                self.db, lock)
+        for i in range(max(1, min(workers, len(cmds)))):
+            worker = workThread(self.inqueue, self.outqueue, self.apiClient)
+            worker.setDaemon(True)
             worker.start()
 
-        return self.waitForComplete(workers)
+        asyncJobResult = self.waitForComplete()
+        self.latencyPercentiles = self.getLatencyPercentiles(asyncJobResult)
+        logger = self.apiClient.connection.logger
+        if logger is not None and self.latencyPercentiles:
+            logger.debug("Latency of %d commands on %d workers: %s" % (
+                len(asyncJobResult), workers,
+                ", ".join("p%d %.3fs" % (p, self.latencyPercentiles[p])
+                          for p in sorted(self.latencyPercentiles))))
+        return asyncJobResult
+
+    def getLatencyPercentiles(self, jobstatuses,
+                              percentiles=(50, 90, 95, 99, 100)):
+        '''
+            returns {percentile: seconds} over the durations of the given
+            jobs, as returned by submitCmdsAndWait
+        '''
+        durations = sorted(j.duration for j in jobstatuses
+                           if j.duration is not None)
+        result = {}
+        if not durations:
+            return result
+        for p in percentiles:
+            index = int(round(p / 100.0 * (len(durations) - 1)))
+            result[p] = durations[index]
+        return result
 
     def submitJobExecuteNtimes(self, job, ntimes=1, nums_threads=1,
                                interval=1):
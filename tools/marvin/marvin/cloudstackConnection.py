@@ -16,15 +16,20 @@
 # under the License.
 
 import requests
+from requests.adapters import HTTPAdapter
 import urllib
 import base64
 import hmac
 import hashlib
 import time
-from cloudstackAPI import queryAsyncJobResult
+import copy
+import threading
+import Queue
+from cloudstackAPI import queryAsyncJobResult, listAsyncJobs
 import jsonHelper
 from marvin.codes import (
     FAILED,
+    JOB_INPROGRESS,
     JOB_FAILED,
     JOB_CANCELLED,
     JOB_SUCCEEDED
@@ -34,6 +39,162 @@ from marvin.cloudstackException import (
     GetDetailExceptionInfo)
 
 
+class AsyncJobFuture(object):
+
+    '''
+    @Desc: Result of an async job handed out by AsyncJobPoller, completed
+           by the poller thread once the job left the in progress state
+    '''
+
+    def __init__(self, jobid):
+        self.jobid = jobid
+        self.__event = threading.Event()
+        self.__result = None
+        self.__error = None
+
+    def setResult(self, result):
+        self.__result = result
+        self.__event.set()
+
+    def setError(self, error):
+        self.__error = error
+        self.__event.set()
+
+    def wait(self, timeout=None):
+        '''
+        @Name : wait
+        @Desc : Waits for the job to complete
+        @Output: True if the job completed within timeout, else False
+        '''
+        self.__event.wait(timeout)
+        return self.__event.isSet()
+
+    def result(self):
+        if self.__error is not None:
+            raise self.__error
+        return self.__result
+
+
+class AsyncJobPoller(object):
+
+    '''
+    @Desc: Polls all outstanding async jobs of the connections sharing it
+           from a single thread. Every cycle checks all job ids with one
+           listAsyncJobs call and only queries the result of the jobs
+           which completed (or are missing from the listing). The interval
+           between cycles starts at minInterval, doubles up to maxInterval
+           while no job completes and is reset by new or completed jobs.
+           The listing is limited to jobs created since the oldest
+           outstanding submission, less clockSkew seconds for the
+           difference between this host's and the server's clocks.
+    '''
+
+    def __init__(self, connection, minInterval=0.2, maxInterval=5,
+                 clockSkew=300):
+        self.connection = connection
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.clockSkew = clockSkew
+        self.__interval = minInterval
+        self.__jobs = {}
+        self.__cond = threading.Condition()
+        self.__thread = None
+
+    def submit(self, jobid, response_cls):
+        '''
+        @Name : submit
+        @Desc : Starts tracking jobid
+        @Output: AsyncJobFuture completed with the queryAsyncJobResult
+                 response of the job, parsed with response_cls
+        '''
+        future = AsyncJobFuture(jobid)
+        self.__cond.acquire()
+        try:
+            self.__jobs[jobid] = (future, response_cls, time.time())
+            self.__interval = self.minInterval
+            if self.__thread is None or not self.__thread.isAlive():
+                self.__thread = threading.Thread(target=self.__run)
+                self.__thread.setDaemon(True)
+                self.__thread.start()
+            self.__cond.notify()
+        finally:
+            self.__cond.release()
+        return future
+
+    def cancel(self, jobid):
+        self.__cond.acquire()
+        try:
+            self.__jobs.pop(jobid, None)
+        finally:
+            self.__cond.release()
+
+    def __run(self):
+        while True:
+            self.__cond.acquire()
+            try:
+                while not self.__jobs:
+                    self.__cond.wait()
+                self.__cond.wait(self.__interval)
+                jobs = dict(self.__jobs)
+            finally:
+                self.__cond.release()
+
+            completed = self.__pollOnce(jobs)
+
+            self.__cond.acquire()
+            try:
+                for jobid in completed:
+                    self.__jobs.pop(jobid, None)
+                if completed:
+                    self.__interval = self.minInterval
+                else:
+                    self.__interval = min(self.__interval * 2,
+                                          self.maxInterval)
+            finally:
+                self.__cond.release()
+
+    def __pollOnce(self, jobs):
+        '''
+        @Name : __pollOnce
+        @Desc : Checks the given {jobid: (future, response_cls,
+                submitted)} jobs and completes the futures of the ones
+                which are done
+        @Output: list of the completed job ids
+        '''
+        listed = {}
+        try:
+            # listAsyncJobs has no status filter, narrow it down by date
+            submitted = min([job[2] for job in jobs.values()])
+            cmd = listAsyncJobs.listAsyncJobsCmd()
+            cmd.startdate = time.strftime(
+                "%Y-%m-%dT%H:%M:%S+0000",
+                time.gmtime(submitted - self.clockSkew))
+            response = self.connection.marvinRequest(cmd)
+            for job in response or []:
+                if job.jobid in jobs:
+                    listed[job.jobid] = job.jobstatus
+        except Exception as e:
+            self.connection.logger.debug(
+                "listAsyncJobs failed, querying jobs one by one: %s" % e)
+
+        completed = []
+        for jobid, (future, response_cls, submitted) in jobs.items():
+            if listed.get(jobid, None) == JOB_INPROGRESS:
+                continue
+            try:
+                cmd = queryAsyncJobResult.queryAsyncJobResultCmd()
+                cmd.jobid = jobid
+                response = self.connection.marvinRequest(
+                    cmd, response_type=response_cls)
+                if response.jobstatus == JOB_INPROGRESS:
+                    continue
+                future.setResult(response)
+            except Exception as e:
+                future.setError(e)
+            completed.append(jobid)
+        return completed
+
+
 class CSConnection(object):
 
     '''
@@ -44,7 +205,8 @@ class CSConnection(object):
     '''
 
     def __init__(self, mgmtDet, asyncTimeout=3600, logger=None,
-                 path='client/api'):
+                 path='client/api', poolSize=10, timeout=None,
+                 signatureVersion=None, signatureExpiry=600):
         self.apiKey = mgmtDet.apiKey
         self.securityKey = mgmtDet.securityKey
         self.mgtSvr = mgmtDet.mgtSvrIp
@@ -68,48 +230,114 @@ class CSConnection(object):
         self.httpsFlag = True if self.protocol == "https" else False
         self.baseUrl = "%s://%s:%d/%s"\
                        % (self.protocol, self.mgtSvr, self.port, self.path)
+        self.poolSize = poolSize
+        self.timeout = timeout if timeout is not None else asyncTimeout
+        self.signatureVersion = signatureVersion
+        self.signatureExpiry = signatureExpiry
+        self.__hmac = None
+        if self.securityKey is not None:
+            self.__hmac = hmac.new(str(self.securityKey),
+                                   digestmod=hashlib.sha1)
+        self.__signatures = {}
+        self.__session = None
+        self.__poller = None
 
-    def __copy__(self):
-        return CSConnection(self.mgtDetails,
+    def __newConnection(self):
+        '''
+        @Name : __newConnection
+        @Desc : Returns a new connection with the settings of this one,
+                sharing its pooled HTTP session. The management server
+                details are copied because test clients share them and
+                overwrite their keys for user api clients
+        '''
+        mgmtDet = copy.copy(self.mgtDetails)
+        mgmtDet.apiKey = self.apiKey
+        mgmtDet.securityKey = self.securityKey
+        conn = CSConnection(mgmtDet,
                             self.asyncTimeout,
                             self.logger,
-                            self.path)
+                            self.path,
+                            self.poolSize,
+                            self.timeout,
+                            self.signatureVersion,
+                            self.signatureExpiry)
+        conn.__session = self.__getSession()
+        return conn
+
+    def __copy__(self):
+        conn = self.__newConnection()
+        conn.__poller = self.__getPoller()
+        return conn
+
+    def __getSession(self):
+        '''
+        @Name : __getSession
+        @Desc : Returns the requests Session shared by this connection and
+                its copies. It keeps up to poolSize connections to the
+                management server alive and retries failed connection
+                attempts self.retries times with exponential backoff.
+                Requests which reached the server are never retried.
+        '''
+        if self.__session is None:
+            try:
+                from requests.packages.urllib3.util.retry import Retry
+                retries = Retry(total=self.retries, connect=self.retries,
+                                read=0, backoff_factor=0.5)
+            except ImportError:
+                # urllib3 < 1.9 only retries failed connection attempts
+                retries = self.retries
+            adapter = HTTPAdapter(pool_connections=1,
+                                  pool_maxsize=self.poolSize,
+                                  max_retries=retries)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.__session = session
+        return self.__session
+
+    def __getPoller(self):
+        '''
+        @Name : __getPoller
+        @Desc : Returns the AsyncJobPoller shared by this connection and
+                its copies, it polls over a connection of its own
+        '''
+        if self.__poller is None:
+            self.__poller = AsyncJobPoller(self.__newConnection())
+        return self.__poller
 
     def __poll(self, jobid, response_cmd):
         '''
         @Name : __poll
-        @Desc: polls for the completion of a given jobid
+        @Desc: waits for the completion of a given jobid, which is polled
+               by the AsyncJobPoller shared with the copies of this
+               connection
         @Input 1. jobid: Monitor the Jobid for CS
                2. response_cmd:response command for request cmd
         @return: FAILED if jobid is cancelled,failed
                  Else return async_response
         '''
         try:
-            cmd = queryAsyncJobResult.queryAsyncJobResultCmd()
-            cmd.jobid = jobid
-            timeout = self.asyncTimeout
             start_time = time.time()
-            end_time = time.time()
-            async_response = FAILED
             self.logger.debug("=== Jobid: %s Started ===" % (str(jobid)))
-            while timeout > 0:
+            poller = self.__getPoller()
+            future = poller.submit(jobid, response_cmd)
+            if future.wait(self.asyncTimeout):
+                async_response = future.result()
+            else:
+                poller.cancel(jobid)
+                self.logger.debug("=== JobId:%s did not complete within %s "
+                                  "seconds ====" % (str(jobid),
+                                                    str(self.asyncTimeout)))
+                cmd = queryAsyncJobResult.queryAsyncJobResultCmd()
+                cmd.jobid = jobid
                 async_response = self.\
                     marvinRequest(cmd, response_type=response_cmd)
-                if async_response != FAILED:
-                    job_status = async_response.jobstatus
-                    if job_status in [JOB_CANCELLED,
-                                      JOB_SUCCEEDED]:
-                        break
-                    elif job_status == JOB_FAILED:
-                        raise Exception("Job failed: %s"\
-                                         % async_response)
-                time.sleep(5)
-                timeout -= 5
-                self.logger.debug("=== JobId:%s is Still Processing, "
-                                  "Will TimeOut in:%s ====" % (str(jobid),
-                                                               str(timeout)))
+            if async_response != FAILED and \
+                    async_response.jobstatus == JOB_FAILED:
+                raise Exception("Job failed: %s"\
+                                 % async_response)
             end_time = time.time()
-            tot_time = int(start_time - end_time)
+            tot_time = int(end_time - start_time)
             self.logger.debug(
                 "===Jobid:%s ; StartTime:%s ; EndTime:%s ; "
                 "TotalTime:%s===" %
@@ -137,19 +365,51 @@ class CSConnection(object):
         @Input: payload: dictionary of params be signed
         @Output: the signature of the payload
         """
-        params = zip(payload.keys(), payload.values())
-        params.sort(key=lambda k: str.lower(k[0]))
-        hash_str = "&".join(
-            ["=".join(
-                [str.lower(r[0]),
-                 str.lower(
-                     urllib.quote_plus(str(r[1]))
-                ).replace("+", "%20")]
-            ) for r in params]
-        )
-        signature = base64.encodestring(hmac.new(
-            self.securityKey, hash_str, hashlib.sha1).digest()).strip()
-        return signature
+        params = [(str(k).lower(),
+                   urllib.quote_plus(str(v)).lower().replace("+", "%20"))
+                  for k, v in payload.iteritems()]
+        params.sort(key=lambda p: p[0])
+        mac = self.__hmac.copy()
+        mac.update("&".join([k + "=" + v for k, v in params]))
+        return base64.b64encode(mac.digest())
+
+    def __signPayload(self, payload):
+        """
+        @Name : __signPayload
+        @Desc : Adds the signature (and with signatureVersion 3 the
+                expires and signatureversion params) to the payload.
+                Signatures are cached per payload, with signatureVersion 3
+                until signatureExpiry/2 seconds before they expire, so
+                repeated requests such as job polls are not signed again.
+        @Input: payload: dictionary of params to be signed
+        """
+        if self.signatureVersion == 3:
+            payload["signatureversion"] = "3"
+        try:
+            key = tuple(sorted(payload.items()))
+        except TypeError:
+            key = None
+        now = time.time()
+        cached = self.__signatures.get(key) if key is not None else None
+        if cached is not None and \
+                (cached[0] is None or
+                 cached[0] - now > self.signatureExpiry / 2):
+            expiry, expires, signature = cached
+        else:
+            expiry = expires = None
+            if self.signatureVersion == 3:
+                expiry = now + self.signatureExpiry
+                expires = time.strftime("%Y-%m-%dT%H:%M:%S+0000",
+                                        time.gmtime(expiry))
+                payload["expires"] = expires
+            signature = self.__sign(payload)
+            if key is not None:
+                if len(self.__signatures) >= 1024:
+                    self.__signatures.clear()
+                self.__signatures[key] = (expiry, expires, signature)
+        if expires is not None:
+            payload["expires"] = expires
+        payload["signature"] = signature
 
     def __sendPostReqToCS(self, url, payload):
         '''
@@ -161,10 +421,12 @@ class CSConnection(object):
                  else FAILED
         '''
         try:
-            response = requests.post(url,
-                                     params=payload,
-                                     cert=self.certPath,
-                                     verify=self.httpsFlag)
+            session = self.__getSession()
+            response = session.post(url,
+                                    params=payload,
+                                    cert=self.certPath,
+                                    verify=self.httpsFlag,
+                                    timeout=self.timeout)
             return response
         except Exception as e:
             self.__lastError = e
@@ -183,10 +445,12 @@ class CSConnection(object):
                  else FAILED
         '''
         try:
-            response = requests.get(url,
-                                    params=payload,
-                                    cert=self.certPath,
-                                    verify=self.httpsFlag)
+            session = self.__getSession()
+            response = session.get(url,
+                                   params=payload,
+                                   cert=self.certPath,
+                                   verify=self.httpsFlag,
+                                   timeout=self.timeout)
             return response
         except Exception as e:
             self.__lastError = e
@@ -212,7 +476,7 @@ class CSConnection(object):
 
             if auth:
                 payload["apiKey"] = self.apiKey
-                payload["signature"] = self.__sign(payload)
+                self.__signPayload(payload)
 
             # Verify whether protocol is "http" or "https", then send the
             # request
@@ -304,7 +568,8 @@ class CSConnection(object):
         try:
             try:
                 ret = jsonHelper.getResultObj(
-                    cmd_response.json(),
+                    cmd_response.json(
+                        object_pairs_hook=jsonHelper.internKeys),
                     response_cls)
             except TypeError:
                 ret = jsonHelper.getResultObj(cmd_response.json, response_cls)
@@ -326,6 +591,68 @@ class CSConnection(object):
                 exception("Exception:%s" % GetDetailExceptionInfo(e))
             return FAILED
 
+    def __fetchPage(self, conn, cmd, page, pagesize, method):
+        '''
+        @Name : __fetchPage
+        @Desc : Requests one page of the list command cmd over conn in a
+                background thread
+        @Output: Queue receiving (items, None) or (None, exception)
+        '''
+        page_cmd = copy.copy(cmd)
+        page_cmd.page = page
+        page_cmd.pagesize = pagesize
+        result = Queue.Queue(1)
+
+        def fetch():
+            try:
+                result.put((conn.marvinRequest(page_cmd, method=method), None))
+            except Exception as e:
+                result.put((None, e))
+        thread = threading.Thread(target=fetch)
+        thread.setDaemon(True)
+        thread.start()
+        return result
+
+    def marvinPagedRequest(self, cmd, pagesize=500, method='GET'):
+        """
+        @Name : marvinPagedRequest
+        @Desc : Iterates over the items listed by a list command, driving
+                its page and pagesize parameters. While the items of a
+                page are yielded the next page is already being fetched,
+                over a connection sharing this one's session and api
+                keys, so pages are always listed as the account this
+                connection belongs to. The caller may stop at any point,
+                the page in flight is then dropped.
+                Commands without paging parameters are sent once.
+        @Input  cmd: marvin's list command from cloudstackAPI, cmd.page
+                     gives the first page to fetch (defaults to 1)
+                pagesize: number of items requested per page, at most the
+                          default.page.size of the management server
+                method: HTTP GET/POST, defaults to GET
+        @Output: generator of the listed items
+                 Exception in case of Error\Exception
+        """
+        if not hasattr(cmd, "pagesize"):
+            for item in self.marvinRequest(cmd, method=method) or []:
+                yield item
+            return
+
+        conn = self.__newConnection()
+        page = cmd.page or 1
+        pending = self.__fetchPage(conn, cmd, page, pagesize, method)
+        while pending is not None:
+            items, error = pending.get()
+            if error is not None:
+                raise error
+            if not items:
+                return
+            pending = None
+            if len(items) >= pagesize:
+                page += 1
+                pending = self.__fetchPage(conn, cmd, page, pagesize, method)
+            for item in items:
+                yield item
+
     def marvinRequest(self, cmd, response_type=None, method='GET', data=''):
         """
         @Name : marvinRequest
@@ -419,7 +419,8 @@ class CSTestClient(object):
 
     def submitCmdsAndWait(self, cmds, workers=1, apiclient=None):
         '''
-        @Desc : FixME, httplib has issue if more than one thread submitted
+        @Desc : Runs cmds concurrently on workers threads, each with its
+                own connection, and waits for all of them to complete
         '''
         if not apiclient:
             apiclient = self.__apiClient
@@ -230,6 +230,15 @@ class CodeGenerator(object):
         body += self.space * 2 + 'self._id = identifier' + self.newline
         body += self.newline
 
+        body += self.space
+        body += 'def paginate(self, command, pagesize=500, method="GET"):\n'
+        body += self.space + self.space
+        body += '"""Iterates over the items of a list command, page by page"""\n'
+        body += self.space + self.space
+        body += 'return self.connection.marvinPagedRequest(command,'
+        body += ' pagesize=pagesize, method=method)\n'
+        body += self.newline
+
         for cmdName in self.cmdsName:
             body += self.space
             body += 'def %s(self, command, method="GET"):\n' % cmdName
@@ -22,34 +22,77 @@ from marvin.cloudstackAPI import *
 
 class jsonLoader(object):
 
-    '''The recursive class for building and representing objects with.'''
+    '''Attribute view over a parsed JSON object.
+
+    The parsed dict is kept as is and nested objects, and lists of
+    objects, are wrapped only when an attribute is first read; the
+    wrapper is then stored back in place of the raw value. Instances
+    carry a single slot, so a list of thousands of entries costs one
+    small record per entry rather than an object graph per entry.
+    Reading a missing attribute returns None.'''
+
+    __slots__ = ('_data',)
 
     def __init__(self, obj):
-        for k in obj:
-            v = obj[k]
-            if isinstance(v, dict):
-                setattr(self, k, jsonLoader(v))
-            elif isinstance(v, (list, tuple)):
-                if len(v) > 0 and isinstance(v[0], dict):
-                    setattr(self, k, [jsonLoader(elem) for elem in v])
-                else:
-                    setattr(self, k, v)
-            else:
-                setattr(self, k, v)
+        object.__setattr__(self, '_data', obj)
+
+    @property
+    def __dict__(self):
+        return self._data
 
     def __getattr__(self, val):
-        if val in self.__dict__:
-            return self.__dict__[val]
-        else:
+        if val.startswith('__'):
+            raise AttributeError(val)
+        data = self._data
+        if val not in data:
             return None
+        v = data[val]
+        if isinstance(v, dict):
+            v = data[val] = jsonLoader(v)
+        elif isinstance(v, (list, tuple)):
+            if len(v) > 0 and isinstance(v[0], dict):
+                v = data[val] = [jsonLoader(elem) for elem in v]
+        return v
+
+    def __setattr__(self, key, value):
+        self._data[key] = value
+
+    def __delattr__(self, key):
+        del self._data[key]
+
+    def __getstate__(self):
+        return self._data
+
+    def __setstate__(self, state):
+        object.__setattr__(self, '_data', state)
 
     def __repr__(self):
-        return '{%s}' % str(', '.join('%s : %s' % (k, repr(v)) for (k, v)
-                                      in self.__dict__.iteritems()))
+        return '{%s}' % str(', '.join('%s : %s' % (k, repr(getattr(self, k)))
+                                      for k in self._data))
 
     def __str__(self):
-        return '{%s}' % str(', '.join('%s : %s' % (k, repr(v)) for (k, v)
-                                      in self.__dict__.iteritems()))
+        return self.__repr__()
+
+
+def internKeys(pairs):
+    '''
+    @Name : internKeys
+    @Desc : object_pairs_hook for json.loads; builds each JSON object with
+            one shared str per key name instead of a unicode copy of the
+            key per object, which is what jsonLoader keeps hold of.
+            Keys which are not ASCII, as user supplied details or tag
+            names may be, are kept as unicode
+    @Input: pairs : (key, value) pairs of a JSON object
+    @Output: dict of the pairs
+    '''
+    obj = {}
+    for k, v in pairs:
+        try:
+            k = intern(k.encode('ascii'))
+        except UnicodeError:
+            pass
+        obj[k] = v
+    return obj
 
 
 class jsonDump(object):
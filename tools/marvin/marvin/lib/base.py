@@ -77,12 +77,14 @@ class Domain:
         apiclient.deleteDomain(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists domains"""
         cmd = listDomains.listDomainsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listDomains(cmd))
 
 
@@ -132,7 +134,7 @@ class Account:
         apiclient.deleteAccount(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists accounts and provides detailed account information for
         listed accounts"""
 
@@ -140,6 +142,8 @@ class Account:
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listAccounts(cmd))
 
     def disable(self, apiclient, lock=False):
@@ -182,7 +186,7 @@ class User:
         apiclient.deleteUser(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists users and provides detailed account information for
         listed users"""
 
@@ -190,6 +194,8 @@ class User:
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listUsers(cmd))
 
     @classmethod
@@ -711,13 +717,15 @@ class VirtualMachine:
         return apiclient.changeServiceForVirtualMachine(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all VMs matching criteria"""
 
         cmd = listVirtualMachines.listVirtualMachinesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVirtualMachines(cmd))
 
     def resetPassword(self, apiclient):
@@ -866,13 +874,15 @@ class Volume:
         apiclient.deleteVolume(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all volumes matching criteria"""
 
         cmd = listVolumes.listVolumesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVolumes(cmd))
 
     def resize(self, apiclient, **kwargs):
@@ -986,13 +996,15 @@ class Snapshot:
         apiclient.deleteSnapshot(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all snapshots matching criteria"""
 
         cmd = listSnapshots.listSnapshotsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listSnapshots(cmd))
 
     def validateState(self, apiclient, snapshotstate, timeout=600):
@@ -1268,13 +1280,15 @@ class Template:
         return apiclient.copyTemplate(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all templates matching criteria"""
 
         cmd = listTemplates.listTemplatesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listTemplates(cmd))
 
 
@@ -1399,13 +1413,15 @@ class Iso:
         return apiclient.copyIso(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all available ISO files."""
 
         cmd = listIsos.listIsosCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listIsos(cmd))
 
 
@@ -1458,13 +1474,15 @@ class PublicIPAddress:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Public IPs matching criteria"""
 
         cmd = listPublicIpAddresses.listPublicIpAddressesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listPublicIpAddresses(cmd))
 
 
@@ -1520,13 +1538,15 @@ class NATRule:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all NAT rules matching criteria"""
 
         cmd = listPortForwardingRules.listPortForwardingRulesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listPortForwardingRules(cmd))
 
 
@@ -1583,13 +1603,15 @@ class StaticNATRule:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all IP forwarding rules matching criteria"""
 
         cmd = listIpForwardingRules.listIpForwardingRulesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listIpForwardingRules(cmd))
 
     @classmethod
@@ -1650,13 +1672,15 @@ class EgressFireWallRule:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Egress Firewall Rules matching criteria"""
 
         cmd = listEgressFirewallRules.listEgressFirewallRulesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listEgressFirewallRules(cmd))
 
 
@@ -1697,13 +1721,15 @@ class FireWallRule:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Firewall Rules matching criteria"""
 
         cmd = listFirewallRules.listFirewallRulesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listFirewallRules(cmd))
 
 class Autoscale:
@@ -1935,13 +1961,15 @@ class ServiceOffering:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all available service offerings."""
 
         cmd = listServiceOfferings.listServiceOfferingsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listServiceOfferings(cmd))
 
 
@@ -1993,13 +2021,15 @@ class DiskOffering:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all available disk offerings."""
 
         cmd = listDiskOfferings.listDiskOfferingsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listDiskOfferings(cmd))
 
 
@@ -2072,13 +2102,15 @@ class NetworkOffering:
         return(apiclient.updateNetworkOffering(cmd))
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all available network offerings."""
 
         cmd = listNetworkOfferings.listNetworkOfferingsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listNetworkOfferings(cmd))
 
 
@@ -2107,13 +2139,15 @@ class SnapshotPolicy:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists snapshot policies."""
 
         cmd = listSnapshotPolicies.listSnapshotPoliciesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listSnapshotPolicies(cmd))
 
 class Hypervisor:
@@ -2123,13 +2157,15 @@ class Hypervisor:
         self.__dict__.update(items)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists hypervisors"""
 
         cmd = listHypervisors.listHypervisorsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listHypervisors(cmd))
 
 
@@ -2255,13 +2291,15 @@ class LoadBalancerRule:
         return apiclient.listLBStickinessPolicies(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Load balancing rules matching criteria"""
 
         cmd = listLoadBalancerRules.listLoadBalancerRulesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listLoadBalancerRules(cmd))
 
     @classmethod
@@ -2320,13 +2358,15 @@ class Cluster:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Clusters matching criteria"""
 
         cmd = listClusters.listClustersCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listClusters(cmd))
 
 
@@ -2437,13 +2477,15 @@ class Host:
         return apiclient.cancelHostMaintenance(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Hosts matching criteria"""
 
         cmd = listHosts.listHostsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listHosts(cmd))
 
     @classmethod
@@ -2549,13 +2591,15 @@ class StoragePool:
         return apiclient.enableStorageMaintenance(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all storage pools matching criteria"""
 
         cmd = listStoragePools.listStoragePoolsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listStoragePools(cmd))
 
     @classmethod
@@ -2660,13 +2704,15 @@ class Network:
         return(apiclient.restartNetwork(cmd))
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Networks matching criteria"""
 
         cmd = listNetworks.listNetworksCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listNetworks(cmd))
 
 
@@ -2737,13 +2783,15 @@ class NetworkACL:
         return apiclient.deleteNetworkACL(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List Network ACLs"""
 
         cmd = listNetworkACLs.listNetworkACLsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listNetworkACLs(cmd))
 
 
@@ -2784,13 +2832,15 @@ class NetworkACLList:
         return apiclient.deleteNetworkACLList(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List Network ACL lists"""
 
         cmd = listNetworkACLLists.listNetworkACLListsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listNetworkACLLists(cmd))
 
 
@@ -2871,13 +2921,15 @@ class Vpn:
         apiclient.deleteRemoteAccessVpn(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all VPN matching criteria"""
 
         cmd = listRemoteAccessVpns.listRemoteAccessVpnsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listRemoteAccessVpns(cmd))
 
 
@@ -2917,13 +2969,15 @@ class VpnUser:
         apiclient.removeVpnUser(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all VPN Users matching criteria"""
 
         cmd = listVpnUsers.listVpnUsersCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVpnUsers(cmd))
 
 
@@ -2969,13 +3023,15 @@ class Zone:
         return apiclient.updateZone(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all Zones matching criteria"""
 
         cmd = listZones.listZonesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listZones(cmd))
 
 
@@ -3006,13 +3062,15 @@ class Pod:
         apiclient.deletePod(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         "Returns a default pod for specified zone"
 
         cmd = listPods.listPodsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return apiclient.listPods(cmd)
 
 
@@ -3047,13 +3105,15 @@ class PublicIpRange:
         apiclient.deleteVlanIpRange(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all VLAN IP ranges."""
 
         cmd = listVlanIpRanges.listVlanIpRangesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVlanIpRanges(cmd))
 
     @classmethod
@@ -3107,13 +3167,15 @@ class PortablePublicIpRange:
         apiclient.deletePortableIpRange(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all portable public IP ranges."""
 
         cmd = listPortableIpRanges.listPortableIpRangesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listPortableIpRanges(cmd))
 
 class SecondaryStagingStore:
@@ -3145,11 +3207,13 @@ class SecondaryStagingStore:
         apiclient.deleteSecondaryStagingStore(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         cmd = listSecondaryStagingStores.listSecondaryStagingStoresCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listSecondaryStagingStores(cmd))
 
 
@@ -3182,11 +3246,13 @@ class ImageStore:
         apiclient.deleteImageStore(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         cmd = listImageStores.listImageStoresCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listImageStores(cmd))
 
 
@@ -3379,13 +3445,15 @@ class SecurityGroup:
         return apiclient.revokeSecurityGroupEgress(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all security groups."""
 
         cmd = listSecurityGroups.listSecurityGroupsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listSecurityGroups(cmd))
 
 
@@ -3452,13 +3520,15 @@ class VpnCustomerGateway:
         apiclient.deleteVpnCustomerGateway(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all VPN customer Gateway"""
 
         cmd = listVpnCustomerGateways.listVpnCustomerGatewaysCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVpnCustomerGateways(cmd))
 
 
@@ -3541,13 +3611,15 @@ class Project:
         return(apiclient.listProjectAccounts(cmd))
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists all projects."""
 
         cmd = listProjects.listProjectsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listProjects(cmd))
 
 
@@ -3579,13 +3651,15 @@ class ProjectInvitation:
         return apiclient.deleteProjectInvitation(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists project invitations"""
 
         cmd = listProjectInvitations.listProjectInvitationsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listProjectInvitations(cmd))
 
 
@@ -3602,13 +3676,15 @@ class Configurations:
         apiclient.updateConfiguration(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists configurations"""
 
         cmd = listConfigurations.listConfigurationsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listConfigurations(cmd))
 
     @classmethod
@@ -3678,13 +3754,15 @@ class NetScaler:
         return(apiclient.configureNetscalerLoadBalancer(cmd))
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List already registered netscaler devices"""
 
         cmd = listNetscalerLoadBalancers.listNetscalerLoadBalancersCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listNetscalerLoadBalancers(cmd))
 
 
@@ -3730,13 +3808,15 @@ class NetworkServiceProvider:
         return apiclient.updateNetworkServiceProvider(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List network service providers"""
 
         cmd = listNetworkServiceProviders.listNetworkServiceProvidersCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listNetworkServiceProviders(cmd))
 
 
@@ -3785,13 +3865,15 @@ class Router:
         return apiclient.changeServiceForRouter(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List routers"""
 
         cmd = listRouters.listRoutersCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listRouters(cmd))
 
 
@@ -3831,13 +3913,15 @@ class Tag:
         apiclient.deleteTags(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all tags matching the criteria"""
 
         cmd = listTags.listTagsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listTags(cmd))
 
 
@@ -3887,13 +3971,15 @@ class VpcOffering:
         return apiclient.updateVPCOffering(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List the VPC offerings based on criteria specified"""
 
         cmd = listVPCOfferings.listVPCOfferingsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVPCOfferings(cmd))
 
     def delete(self, apiclient):
@@ -3958,13 +4044,15 @@ class VPC:
         return apiclient.restartVPC(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List VPCs"""
 
         cmd = listVPCs.listVPCsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVPCs(cmd))
 
 
@@ -4000,13 +4088,15 @@ class PrivateGateway:
         return apiclient.deletePrivateGateway(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List private gateways"""
 
         cmd = listPrivateGateways.listPrivateGatewaysCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listPrivateGateways(cmd))
 
 
@@ -4035,11 +4125,13 @@ class AffinityGroup:
         return apiclient.deleteAffinityGroup(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         cmd = listAffinityGroups.listAffinityGroupsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return apiclient.listAffinityGroups(cmd)
 
 class StaticRoute:
@@ -4064,13 +4156,15 @@ class StaticRoute:
         return apiclient.deleteStaticRoute(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List static route"""
 
         cmd = listStaticRoutes.listStaticRoutesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listStaticRoutes(cmd))
 
 
@@ -4098,13 +4192,15 @@ class VNMC:
         return apiclient.deleteCiscoVnmcResource(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List VNMC appliances"""
 
         cmd = listCiscoVnmcResources.listCiscoVnmcResourcesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listCiscoVnmcResources(cmd))
 
 
@@ -4143,12 +4239,14 @@ class SSHKeyPair:
         apiclient.deleteSSHKeyPair(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all SSH key pairs"""
         cmd = listSSHKeyPairs.listSSHKeyPairsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listSSHKeyPairs(cmd))
 
 
@@ -4156,13 +4254,15 @@ class Capacities:
     """Manage Capacities"""
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists capacities"""
 
         cmd = listCapacity.listCapacityCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listCapacity(cmd))
 
 
@@ -4170,13 +4270,15 @@ class Alert:
     """Manage alerts"""
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists alerts"""
 
         cmd = listAlerts.listAlertsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listAlerts(cmd))
 
 
@@ -4217,12 +4319,14 @@ class InstanceGroup:
         return (apiclient.updateInstanceGroup(cmd))
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all instance groups"""
         cmd = listInstanceGroups.listInstanceGroupsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return (apiclient.listInstanceGroups(cmd))
 
     def startInstances(self, apiclient):
@@ -4290,13 +4394,15 @@ class ASA1000V:
         return apiclient.deleteCiscoAsa1000vResource(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List ASA 1000v appliances"""
 
         cmd = listCiscoAsa1000vResources.listCiscoAsa1000vResourcesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listCiscoAsa1000vResources(cmd))
 
 class VmSnapshot:
@@ -4318,11 +4424,13 @@ class VmSnapshot:
         return VmSnapshot(apiclient.createVMSnapshot(cmd).__dict__)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         cmd = listVMSnapshot.listVMSnapshotCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listVMSnapshot(cmd))
 
     @classmethod
@@ -4461,12 +4569,14 @@ class ApplicationLoadBalancer:
         return
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List all appln load balancers"""
         cmd = listLoadBalancers.listLoadBalancersCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listLoadBalancerRules(cmd))
 
 class Resources:
@@ -4476,13 +4586,15 @@ class Resources:
         self.__dict__.update(items)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """Lists resource limits"""
 
         cmd = listResourceLimits.listResourceLimitsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listResourceLimits(cmd))
 
     @classmethod
@@ -4523,13 +4635,15 @@ class NIC:
         return(apiclient.addIpToNic(cmd))
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         """List NICs belonging to a virtual machine"""
 
         cmd = listNics.listNicsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return(apiclient.listNics(cmd))
 
 class IAMGroup:
@@ -4556,11 +4670,13 @@ class IAMGroup:
         return apiclient.deleteIAMGroup(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         cmd = listIAMGroups.listIAMGroupsCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return apiclient.listIAMGroups(cmd)
 
     def addAccount(self, apiclient, accts):
@@ -4619,11 +4735,13 @@ class IAMPolicy:
         return apiclient.deleteIAMPolicy(cmd)
 
     @classmethod
-    def list(cls, apiclient, **kwargs):
+    def list(cls, apiclient, stream=False, **kwargs):
         cmd = listIAMPolicies.listIAMPoliciesCmd()
         [setattr(cmd, k, v) for k, v in kwargs.items()]
         if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
             cmd.listall = True
+        if stream:
+            return apiclient.paginate(cmd)
         return apiclient.listIAMPoliciesCmd(cmd)
 
     def addPermission(self, apiclient, permission):
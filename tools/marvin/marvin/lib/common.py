@@ -538,207 +538,247 @@ def update_resource_limit(apiclient, resourcetype, account=None,
     return
 
 
-def list_os_types(apiclient, **kwargs):
+def list_os_types(apiclient, stream=False, **kwargs):
     """List all os types matching criteria"""
 
     cmd = listOsTypes.listOsTypesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listOsTypes(cmd))
 
 
-def list_routers(apiclient, **kwargs):
+def list_routers(apiclient, stream=False, **kwargs):
     """List all Routers matching criteria"""
 
     cmd = listRouters.listRoutersCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listRouters(cmd))
 
 
-def list_zones(apiclient, **kwargs):
+def list_zones(apiclient, stream=False, **kwargs):
     """List all Zones matching criteria"""
 
     cmd = listZones.listZonesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listZones(cmd))
 
 
-def list_networks(apiclient, **kwargs):
+def list_networks(apiclient, stream=False, **kwargs):
     """List all Networks matching criteria"""
 
     cmd = listNetworks.listNetworksCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listNetworks(cmd))
 
 
-def list_clusters(apiclient, **kwargs):
+def list_clusters(apiclient, stream=False, **kwargs):
     """List all Clusters matching criteria"""
 
     cmd = listClusters.listClustersCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listClusters(cmd))
 
 
-def list_ssvms(apiclient, **kwargs):
+def list_ssvms(apiclient, stream=False, **kwargs):
     """List all SSVMs matching criteria"""
 
     cmd = listSystemVms.listSystemVmsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listSystemVms(cmd))
 
 
-def list_storage_pools(apiclient, **kwargs):
+def list_storage_pools(apiclient, stream=False, **kwargs):
     """List all storage pools matching criteria"""
 
     cmd = listStoragePools.listStoragePoolsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listStoragePools(cmd))
 
 
-def list_virtual_machines(apiclient, **kwargs):
+def list_virtual_machines(apiclient, stream=False, **kwargs):
     """List all VMs matching criteria"""
 
     cmd = listVirtualMachines.listVirtualMachinesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listVirtualMachines(cmd))
 
 
-def list_hosts(apiclient, **kwargs):
+def list_hosts(apiclient, stream=False, **kwargs):
     """List all Hosts matching criteria"""
 
     cmd = listHosts.listHostsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listHosts(cmd))
 
 
-def list_configurations(apiclient, **kwargs):
+def list_configurations(apiclient, stream=False, **kwargs):
     """List configuration with specified name"""
 
     cmd = listConfigurations.listConfigurationsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listConfigurations(cmd))
 
 
-def list_publicIP(apiclient, **kwargs):
+def list_publicIP(apiclient, stream=False, **kwargs):
     """List all Public IPs matching criteria"""
 
     cmd = listPublicIpAddresses.listPublicIpAddressesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listPublicIpAddresses(cmd))
 
 
-def list_nat_rules(apiclient, **kwargs):
+def list_nat_rules(apiclient, stream=False, **kwargs):
     """List all NAT rules matching criteria"""
 
     cmd = listPortForwardingRules.listPortForwardingRulesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listPortForwardingRules(cmd))
 
 
-def list_lb_rules(apiclient, **kwargs):
+def list_lb_rules(apiclient, stream=False, **kwargs):
     """List all Load balancing rules matching criteria"""
 
     cmd = listLoadBalancerRules.listLoadBalancerRulesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listLoadBalancerRules(cmd))
 
 
-def list_lb_instances(apiclient, **kwargs):
+def list_lb_instances(apiclient, stream=False, **kwargs):
     """List all Load balancing instances matching criteria"""
 
     cmd = listLoadBalancerRuleInstances.listLoadBalancerRuleInstancesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listLoadBalancerRuleInstances(cmd))
 
 
-def list_firewall_rules(apiclient, **kwargs):
+def list_firewall_rules(apiclient, stream=False, **kwargs):
     """List all Firewall Rules matching criteria"""
 
     cmd = listFirewallRules.listFirewallRulesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listFirewallRules(cmd))
 
 
-def list_volumes(apiclient, **kwargs):
+def list_volumes(apiclient, stream=False, **kwargs):
     """List all volumes matching criteria"""
 
     cmd = listVolumes.listVolumesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listVolumes(cmd))
 
 
-def list_isos(apiclient, **kwargs):
+def list_isos(apiclient, stream=False, **kwargs):
     """Lists all available ISO files."""
 
     cmd = listIsos.listIsosCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listIsos(cmd))
 
 
-def list_snapshots(apiclient, **kwargs):
+def list_snapshots(apiclient, stream=False, **kwargs):
     """List all snapshots matching criteria"""
 
     cmd = listSnapshots.listSnapshotsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listSnapshots(cmd))
 
 
-def list_templates(apiclient, **kwargs):
+def list_templates(apiclient, stream=False, **kwargs):
     """List all templates matching criteria"""
 
     cmd = listTemplates.listTemplatesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listTemplates(cmd))
 
 
-def list_domains(apiclient, **kwargs):
+def list_domains(apiclient, stream=False, **kwargs):
     """Lists domains"""
 
     cmd = listDomains.listDomainsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listDomains(cmd))
 
 
-def list_accounts(apiclient, **kwargs):
+def list_accounts(apiclient, stream=False, **kwargs):
     """Lists accounts and provides detailed account information for
     listed accounts"""
 
@@ -746,10 +786,12 @@ def list_accounts(apiclient, **kwargs):
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listAccounts(cmd))
 
 
-def list_users(apiclient, **kwargs):
+def list_users(apiclient, stream=False, **kwargs):
     """Lists users and provides detailed account information for
     listed users"""
 
@@ -757,116 +799,140 @@ def list_users(apiclient, **kwargs):
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listUsers(cmd))
 
 
-def list_snapshot_policy(apiclient, **kwargs):
+def list_snapshot_policy(apiclient, stream=False, **kwargs):
     """Lists snapshot policies."""
 
     cmd = listSnapshotPolicies.listSnapshotPoliciesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listSnapshotPolicies(cmd))
 
 
-def list_events(apiclient, **kwargs):
+def list_events(apiclient, stream=False, **kwargs):
     """Lists events"""
 
     cmd = listEvents.listEventsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listEvents(cmd))
 
 
-def list_disk_offering(apiclient, **kwargs):
+def list_disk_offering(apiclient, stream=False, **kwargs):
     """Lists all available disk offerings."""
 
     cmd = listDiskOfferings.listDiskOfferingsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listDiskOfferings(cmd))
 
 
-def list_service_offering(apiclient, **kwargs):
+def list_service_offering(apiclient, stream=False, **kwargs):
     """Lists all available service offerings."""
 
     cmd = listServiceOfferings.listServiceOfferingsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listServiceOfferings(cmd))
 
 
-def list_vlan_ipranges(apiclient, **kwargs):
+def list_vlan_ipranges(apiclient, stream=False, **kwargs):
     """Lists all VLAN IP ranges."""
 
     cmd = listVlanIpRanges.listVlanIpRangesCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listVlanIpRanges(cmd))
 
 
-def list_usage_records(apiclient, **kwargs):
+def list_usage_records(apiclient, stream=False, **kwargs):
     """Lists usage records for accounts"""
 
     cmd = listUsageRecords.listUsageRecordsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listUsageRecords(cmd))
 
 
-def list_nw_service_prividers(apiclient, **kwargs):
+def list_nw_service_prividers(apiclient, stream=False, **kwargs):
     """Lists Network service providers"""
 
     cmd = listNetworkServiceProviders.listNetworkServiceProvidersCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listNetworkServiceProviders(cmd))
 
 
-def list_virtual_router_elements(apiclient, **kwargs):
+def list_virtual_router_elements(apiclient, stream=False, **kwargs):
     """Lists Virtual Router elements"""
 
     cmd = listVirtualRouterElements.listVirtualRouterElementsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listVirtualRouterElements(cmd))
 
 
-def list_network_offerings(apiclient, **kwargs):
+def list_network_offerings(apiclient, stream=False, **kwargs):
     """Lists network offerings"""
 
     cmd = listNetworkOfferings.listNetworkOfferingsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listNetworkOfferings(cmd))
 
 
-def list_resource_limits(apiclient, **kwargs):
+def list_resource_limits(apiclient, stream=False, **kwargs):
     """Lists resource limits"""
 
     cmd = listResourceLimits.listResourceLimitsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listResourceLimits(cmd))
 
 
-def list_vpc_offerings(apiclient, **kwargs):
+def list_vpc_offerings(apiclient, stream=False, **kwargs):
     """ Lists VPC offerings """
 
     cmd = listVPCOfferings.listVPCOfferingsCmd()
     [setattr(cmd, k, v) for k, v in kwargs.items()]
     if 'account' in kwargs.keys() and 'domainid' in kwargs.keys():
         cmd.listall=True
+    if stream:
+        return apiclient.paginate(cmd)
     return(apiclient.listVPCOfferings(cmd))
 
 